@@ -0,0 +1,107 @@
+import torch
+
+
+class AudioBuffer:
+    """
+    预分配的 float32 音频缓冲区。
+    追加时直接写入预分配的存储，容量不足时按倍数扩容，追加的均摊代价与写入长度成正比；
+    view() 返回底层存储的切片，不产生拷贝。
+    """
+    def __init__(self, capacity: int, growable: bool = True):
+        """
+        :param capacity: 初始容量（采样点数）。
+        :param growable: 容量不足时是否允许扩容，不允许时超出容量会抛出 ValueError。
+        """
+        self._data = torch.empty(max(1, capacity), dtype=torch.float32)
+        self._size = 0
+        self.growable = growable
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def capacity(self) -> int:
+        return len(self._data)
+
+    def _reserve(self, size: int):
+        if size <= len(self._data):
+            return
+        if not self.growable:
+            raise ValueError(f'AudioBuffer 容量不足: 需要 {size}，容量 {len(self._data)}')
+        new_data = torch.empty(max(size, 2 * len(self._data)), dtype=torch.float32)
+        new_data[:self._size].copy_(self._data[:self._size])
+        self._data = new_data
+
+    def append(self, samples: torch.Tensor):
+        """追加一段采样点。"""
+        n = len(samples)
+        self._reserve(self._size + n)
+        self._data[self._size:self._size + n].copy_(samples)
+        self._size += n
+
+    def view(self, start: int = 0, end: int = None) -> torch.Tensor:
+        """返回 [start, end) 范围内已写入数据的零拷贝视图。"""
+        if end is None or end > self._size:
+            end = self._size
+        return self._data[start:end]
+
+    def discard_front(self, n: int):
+        """丢弃最前面的 n 个采样点，剩余数据移动到缓冲区开头。"""
+        remaining = self._size - n
+        if remaining > 0:
+            self._data[:remaining].copy_(self._data[n:self._size].clone())
+            self._size = remaining
+        else:
+            self._size = 0
+
+    def clear(self):
+        self._size = 0
+
+
+class AudioRingBuffer:
+    """
+    固定容量的 float32 环形缓冲区，写满后覆盖最旧的采样点。
+    用于保存说话开始前的前置音频。
+    """
+    def __init__(self, capacity: int):
+        self._data = torch.zeros(max(1, capacity), dtype=torch.float32)
+        self._start = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, samples: torch.Tensor):
+        """追加一段采样点，超出容量的部分覆盖最旧的数据。"""
+        capacity = len(self._data)
+        n = len(samples)
+        if n >= capacity:
+            self._data.copy_(samples[n - capacity:])
+            self._start = 0
+            self._size = capacity
+            return
+
+        end = (self._start + self._size) % capacity
+        first = min(n, capacity - end)
+        self._data[end:end + first].copy_(samples[:first])
+        if first < n:
+            self._data[:n - first].copy_(samples[first:])
+
+        overflow = self._size + n - capacity
+        if overflow > 0:
+            self._start = (self._start + overflow) % capacity
+            self._size = capacity
+        else:
+            self._size += n
+
+    def copy_to(self, dest: AudioBuffer):
+        """按时间顺序将缓冲区内容追加到 dest。"""
+        capacity = len(self._data)
+        first = min(self._size, capacity - self._start)
+        dest.append(self._data[self._start:self._start + first])
+        if first < self._size:
+            dest.append(self._data[:self._size - first])
+
+    def clear(self):
+        self._start = 0
+        self._size = 0
@@ -1,5 +1,5 @@
 import asyncio
-from silero_vad import load_silero_vad, get_speech_timestamps
+from silero_vad import get_speech_timestamps
 import torch
 import torchaudio
 from enum import Enum
@@ -7,12 +7,14 @@ import time
 import datetime
 import os
 import logging
-import io
 import uuid
-import numpy as np
-import soundfile as sf
+import functools
 from pathlib import Path
-from collections import deque
+from audio_buffer import AudioBuffer, AudioRingBuffer
+from audio_format import PCMAudio
+from data_storage import DataStorageModule
+from messages import Message, TurnTracker, Utterance
+from vad_executor import decode_audio
 
 logging.basicConfig(
     filename=Path('./log.txt'),
@@ -25,39 +27,251 @@ class DetectionState(Enum):
     DURING_SPEECH = 2
     AFTER_SPEECH = 3
 
+class VADEvent(Enum):
+    SPEECH_START = 1
+    SPEECH_END = 2
+    SPEECH_CUT = 3  # 语音时长达到上限被切分，用户仍在说话
+
+class Endpointer:
+    """
+    端点检测引擎。
+    根据逐帧的语音概率跟踪尾部静音时长（毫秒），判定一句话的开始与结束：
+    - 概率不低于 start_threshold 视为语音，低于 end_threshold 视为静音，两者之间为滞回区，不改变静音计时；
+    - 尾部静音达到 min_silence_ms 时判定结束；
+    - 语音时长达到 max_utterance_ms 时只切分（SPEECH_CUT），仍处于语音中，后续音频属于同一句话；
+    - 自适应模式下，若语音已足够长且尾部静音足够“干净”（平均概率很低），认为这句话已说完，
+      只需等待更短的 adaptive_min_silence_ms。
+    """
+    def __init__(self,
+                 frame_ms: float,
+                 start_threshold=0.5,
+                 end_threshold=0.35,
+                 min_silence_ms=500,
+                 max_utterance_ms=30000,
+                 adaptive=False,
+                 adaptive_min_silence_ms=200,
+                 adaptive_min_utterance_ms=1000,
+                 adaptive_silence_prob=0.1):
+        """
+        :param frame_ms: 每帧时长（毫秒）。
+        :param start_threshold: 进入语音的概率阈值。
+        :param end_threshold: 视为静音的概率阈值，应不高于 start_threshold。
+        :param min_silence_ms: 判定结束所需的尾部静音时长。
+        :param max_utterance_ms: 单个语音片段的最长时长，超过后切分。
+        :param adaptive: 是否开启自适应端点检测。
+        :param adaptive_min_silence_ms: 自适应模式下缩短后的静音等待时长。
+        :param adaptive_min_utterance_ms: 启用缩短等待所需的最短语音时长。
+        :param adaptive_silence_prob: 尾部静音帧平均概率低于该值时视为说完。
+        """
+        if end_threshold > start_threshold:
+            raise ValueError('end_threshold 不能高于 start_threshold')
+        self.frame_ms = frame_ms
+        self.start_threshold = start_threshold
+        self.end_threshold = end_threshold
+        self.min_silence_ms = min_silence_ms
+        self.max_utterance_ms = max_utterance_ms
+        self.adaptive = adaptive
+        self.adaptive_min_silence_ms = adaptive_min_silence_ms
+        self.adaptive_min_utterance_ms = adaptive_min_utterance_ms
+        self.adaptive_silence_prob = adaptive_silence_prob
+        self.reset()
+
+    def reset(self):
+        self.in_speech = False
+        self.utterance_ms = 0.0
+        self.trailing_silence_ms = 0.0
+        self._silence_prob_sum = 0.0
+        self._silence_frames = 0
+
+    def required_silence_ms(self) -> float:
+        """当前判定结束所需的尾部静音时长。"""
+        if self.adaptive and self._silence_frames:
+            speech_ms = self.utterance_ms - self.trailing_silence_ms
+            mean_prob = self._silence_prob_sum / self._silence_frames
+            if speech_ms >= self.adaptive_min_utterance_ms and mean_prob <= self.adaptive_silence_prob:
+                return self.adaptive_min_silence_ms
+        return self.min_silence_ms
+
+    def update(self, speech_prob: float):
+        """
+        输入一帧的语音概率。
+
+        :return: VADEvent 或 None
+        """
+        if not self.in_speech:
+            if speech_prob >= self.start_threshold:
+                self.reset()
+                self.in_speech = True
+                self.utterance_ms = self.frame_ms
+                return VADEvent.SPEECH_START
+            return None
+
+        self.utterance_ms += self.frame_ms
+        if speech_prob >= self.start_threshold:
+            self.trailing_silence_ms = 0.0
+            self._silence_prob_sum = 0.0
+            self._silence_frames = 0
+        elif speech_prob < self.end_threshold:
+            self.trailing_silence_ms += self.frame_ms
+            self._silence_prob_sum += speech_prob
+            self._silence_frames += 1
+
+        if self.trailing_silence_ms >= self.required_silence_ms():
+            logging.info(f'尾部静音 {self.trailing_silence_ms:.0f} 毫秒，判定语音结束')
+            self.in_speech = False
+            return VADEvent.SPEECH_END
+        if self.utterance_ms >= self.max_utterance_ms:
+            # 不退出语音状态，否则下一帧语音会作为新的一句话开始并打断本轮
+            logging.info(f'语音时长达到上限 {self.max_utterance_ms} 毫秒，切分为后续片段')
+            self.utterance_ms = self.trailing_silence_ms
+            return VADEvent.SPEECH_CUT
+        return None
+
+class StreamingVAD:
+    """
+    帧级流式 VAD。
+    每次输入一帧（16kHz 下 512 个采样点），模型隐状态在帧之间保持，
+    语音概率交给 Endpointer，在帧粒度上输出语音开始/结束事件。
+    """
+    def __init__(self, model, endpointer: Endpointer = None, sampling_rate=16000, executor=None):
+        """
+        :param model: silero_vad 模型或 VADSession。
+        :param endpointer: 端点检测引擎，默认使用 Endpointer 的默认参数。
+        :param sampling_rate: 采样率，仅支持 8000 和 16000。
+        :param executor: VADExecutor，配置后推理在事件循环之外进行。
+        """
+        if sampling_rate not in (8000, 16000):
+            raise ValueError('StreamingVAD 仅支持 8000 和 16000 采样率')
+        self.model = model
+        self.sampling_rate = sampling_rate
+        self.frame_size = 512 if sampling_rate == 16000 else 256
+        self.frame_ms = self.frame_size * 1000 / sampling_rate
+        self.endpointer = endpointer or Endpointer(frame_ms=self.frame_ms)
+        self.executor = executor
+        self.reset()
+
+    def reset(self):
+        """清空模型隐状态和端点状态，开始新的一段检测。"""
+        self.model.reset_states()
+        self.endpointer.reset()
+
+    def process_frame(self, frame: torch.Tensor):
+        """
+        处理一帧音频。
+
+        :param frame: 长度为 frame_size 的 float32 张量。
+        :return: (语音概率, VADEvent 或 None)
+        """
+        speech_prob = self.model(frame, self.sampling_rate).item()
+        return speech_prob, self.endpointer.update(speech_prob)
+
+    async def speech_probs(self, frames: torch.Tensor):
+        """
+        对一批连续帧依次推理，模型隐状态在帧之间保持。
+        端点状态不在这里更新，由调用方逐帧调用 endpointer.update。
+
+        :param frames: 形状为 (帧数, frame_size) 的张量。
+        :return: 每帧的语音概率列表。
+        """
+        if self.executor:
+            return await self.executor.speech_probs(self.model, frames, self.sampling_rate)
+        return [self.model(frame, self.sampling_rate).item() for frame in frames]
+
 class AudioDetectionModule:
     def __init__(self,
                  model, 
                  audio_queue: asyncio.Queue, 
                  detected_audio_queue: asyncio.Queue,
                  send_text_queue: asyncio.Queue,
-                 history_audio_queue: asyncio.Queue,
+                 data_storage: DataStorageModule,
                  reset_callback, 
                  orig_sample_rate=16000, 
                  target_sample_rate=16000, 
                  buffer_duration=1.0,
                  silence_duration=3.0,
-                 history_maxlen=1):  # 默认存储1个前置音频块
+                 barge_in=True,
+                 history_maxlen=1,  # 默认存储1个前置音频块
+                 max_utterance_duration=30.0,
+                 streaming_vad=False,
+                 vad_threshold=0.5,
+                 vad_end_threshold=0.35,
+                 buffer_vad_threshold=0.95,
+                 min_silence_duration_ms=500,
+                 adaptive_endpointing=False,
+                 adaptive_min_silence_ms=200,
+                 executor=None,
+                 turns: TurnTracker = None,
+                 end_of_speech_callback=None,
+                 streaming_asr=None,
+                 partial_callback=None):
         """
         初始化语音检测模块。
+        状态机：BEFORE_SPEECH -> DURING_SPEECH -> AFTER_SPEECH（静默窗口）-> BEFORE_SPEECH，
+        所有状态下都持续从 audio_queue 消费音频，不会阻塞检测循环。
+
+        :param silence_duration: 语音结束后的静默窗口时长（秒），窗口内仍持续检测音频。
+        :param barge_in: 静默窗口内检测到语音时是否立即开始新的语音片段；否则窗口内的音频只被消费不触发检测。
+        :param max_utterance_duration: 单句最长时长（秒），流式模式下超过后切分为同一轮次的多个片段；同时用于预分配语音收集缓冲区。
+        :param streaming_vad: 是否使用帧级流式 VAD；否则每 buffer_duration 秒对缓冲区整体检测一次。
+        :param vad_threshold: 流式 VAD 进入语音的概率阈值。
+        :param vad_end_threshold: 流式 VAD 视为静音的概率阈值（滞回下限）。
+        :param buffer_vad_threshold: 缓冲模式下 get_speech_timestamps 的阈值。
+        :param min_silence_duration_ms: 流式 VAD 判定语音结束所需的尾部静音时长（毫秒）。
+        :param adaptive_endpointing: 是否开启自适应端点检测，语音看起来已说完时缩短等待。
+        :param adaptive_min_silence_ms: 自适应端点检测缩短后的静音等待时长（毫秒）。
+        :param executor: VADExecutor，配置后解码、重采样和 VAD 推理都在事件循环之外进行。
+        :param turns: 会话的轮次计数器，每次开始说话时开启新轮次。
+        :param end_of_speech_callback: 一句话结束时调用的协程函数，参数为轮次 ID，用于播放填充音频等。
+        :param streaming_asr: 流式 ASR（BaseASR），配置后说话期间即持续送入音频并推送中间结果，
+            一句话结束时只需等待最终结果。
+        :param partial_callback: 收到流式识别中间结果时调用的协程函数，参数为轮次 ID 和识别文本，用于投机执行等。
         """
         self.model = model
         self.audio_queue = audio_queue
         self.detected_audio_queue = detected_audio_queue
         self.send_text_queue = send_text_queue
-        self.history_audio_queue = history_audio_queue
+        self.data_storage = data_storage
         self.reset_callback = reset_callback
+        self.turns = turns or TurnTracker()
+        self.end_of_speech_callback = end_of_speech_callback
+        self.streaming_asr = streaming_asr
+        self.partial_callback = partial_callback
+        self.asr_stream = None
+        self.asr_fed = 0  # collected_audio 中已送入流式 ASR 的采样点数
+        self.segment_seq = 0  # 本轮已交给下游的语音片段数
         self.orig_sample_rate = orig_sample_rate
         self.target_sample_rate = target_sample_rate
         self.buffer_size = int(target_sample_rate * buffer_duration)
-        self.buffer = torch.tensor([], dtype=torch.float32)
+        # 滚动 VAD 缓冲区与语音收集缓冲区均预分配，避免热路径上反复 torch.cat
+        self.buffer = AudioBuffer(self.buffer_size * 2)
         self.silence_duration = silence_duration
+        self.hangover_samples = int(target_sample_rate * silence_duration)
+        self.hangover_remaining = 0
+        self.barge_in = barge_in
         self.state = DetectionState.BEFORE_SPEECH
-        self.collected_audio = torch.tensor([], dtype=torch.float32)
+        self.collected_audio = AudioBuffer(int(target_sample_rate * max_utterance_duration))
         self.last_speech_time = None
 
-        # 历史缓冲区：存储多个前置缓冲区
-        self.history_buffers = deque(maxlen=history_maxlen)
+        self.buffer_vad_threshold = buffer_vad_threshold
+        self.executor = executor
+        if streaming_vad:
+            frame_size = 512 if target_sample_rate == 16000 else 256
+            endpointer = Endpointer(
+                frame_ms=frame_size * 1000 / target_sample_rate,
+                start_threshold=vad_threshold,
+                end_threshold=vad_end_threshold,
+                min_silence_ms=min_silence_duration_ms,
+                max_utterance_ms=max_utterance_duration * 1000,
+                adaptive=adaptive_endpointing,
+                adaptive_min_silence_ms=adaptive_min_silence_ms
+            )
+            self.streaming_vad = StreamingVAD(model, endpointer, sampling_rate=target_sample_rate, executor=executor)
+            logging.info('使用帧级流式 VAD')
+        else:
+            self.streaming_vad = None
+
+        # 历史缓冲区：以环形缓冲区存储 history_maxlen 个缓冲区时长的前置音频
+        self.history_buffers = AudioRingBuffer(history_maxlen * self.buffer_size)
         logging.info(f'历史缓冲区已设置，最多存储 {history_maxlen} 个前置缓冲区')
 
         # 如果原始采样率与目标采样率不同，初始化重采样器
@@ -82,11 +296,16 @@ class AudioDetectionModule:
             await self.send_text_queue.put(message)
         logging.info(message)
         
-    async def save_audio_async(self, audio_bytes: bytes, save_dir: str):
+    @staticmethod
+    def _write_wav(save_path: str, audio: PCMAudio):
+        with open(save_path, 'wb') as f:
+            audio.write_wav(f)
+
+    async def save_audio_async(self, audio: PCMAudio, save_dir: str):
         """
         异步保存音频文件。
 
-        :param audio_bytes: 要保存的音频字节数据
+        :param audio: 要保存的 PCM 音频
         :param save_dir: 保存目录
         """
         now = datetime.datetime.now()
@@ -95,44 +314,39 @@ class AudioDetectionModule:
 
         # 使用 asyncio.to_thread 异步执行保存操作
         try:
-            async with asyncio.Lock():
-                with open(save_path, 'wb') as f:
-                    f.write(audio_bytes)
+            await asyncio.to_thread(self._write_wav, save_path, audio)
             save_log = f"已异步保存检测到的语音到文件: {save_path}"
             logging.info(save_log)
         except Exception as e:
             error_message = f"异步保存音频时出错: {e}"
             await self.log(error_message)
 
-    async def _handle_after_speech(self):
+    async def _end_hangover(self):
         """
-        处理进入 AFTER_SPEECH 状态后的操作。
+        AFTER_SPEECH 的静默窗口结束，回到 BEFORE_SPEECH 状态。
         """
-        try:
-            await asyncio.sleep(self.silence_duration)
-            self.buffer = torch.tensor([], dtype=torch.float32)
-            logging.info("缓冲区已清空。")
+        self.state = DetectionState.BEFORE_SPEECH
+        self.hangover_remaining = 0
+        if self.streaming_vad:
+            # 未开启打断时窗口内的语音不会触发状态切换，重置后持续的语音可以重新触发开始事件
+            self.streaming_vad.reset()
+        await self.log("进入状态1：说话前")
+
+    async def _after_speech(self, audio: torch.Tensor, speech_detected: bool):
+        """
+        处理 AFTER_SPEECH 状态下的一段音频。
+        静默窗口内持续消费并检测音频：检测到语音且允许打断时立即进入 DURING_SPEECH，
+        否则扣减窗口剩余时长，窗口耗尽后回到 BEFORE_SPEECH。
+        """
+        if speech_detected and self.barge_in:
+            logging.info("静默窗口内检测到语音，立即打断并开始新的语音片段。")
+            await self._start_speech(audio)
+            return
+
+        self.hangover_remaining -= len(audio)
+        if self.hangover_remaining <= 0:
+            await self._end_hangover()
 
-            cleared = 0
-            while not self.audio_queue.empty():
-                try:
-                    self.audio_queue.get_nowait()
-                    self.audio_queue.task_done()
-                    cleared += 1
-                except:
-                    break
-            logging.info(f"清空 audio_queue，共清除 {cleared} 个音频块。")
-
-            # Reset state to BEFORE_SPEECH
-            self.state = DetectionState.BEFORE_SPEECH
-            await self.log("进入状态1：说话前")
-
-            # 清空历史缓冲区
-            self.history_buffers.clear()
-            logging.info("历史缓冲区已清空。")
-        except Exception as e:
-            await self.log(f"处理 AFTER_SPEECH 时出错: {e}")
-            
     async def periodic_logger(self):
         """每隔60秒记录一次日志，表明 run 函数仍在运行。"""
         try:
@@ -142,137 +356,270 @@ class AudioDetectionModule:
         except asyncio.CancelledError:
             pass
 
-    async def run(self):
-        # 启动定期日志记录协程
-        logger_task = asyncio.create_task(self.periodic_logger())
-        logging.info('开始运行 AudioDetectionModule')
-        await self.log(f'开始运行 AudioDetectionModule，初始状态: {self.state.name}')
-        while True:
+    async def _decode_audio(self, audio_data):
+        """
+        将音频块转换为归一化的 float32 张量，必要时重采样。
+        配置了执行器时在工作线程/进程中完成。格式不支持或处理失败时返回 None。
+        """
+        try:
+            if self.executor:
+                return await self.executor.decode(audio_data, self.resampler)
+            return decode_audio(audio_data, self.resampler)
+        except ValueError as e:
+            await self.log(f"{e}，跳过当前音频块。")
+        except Exception as e:
+            await self.log(f"解码或重采样时出错: {e}")
+        return None
+
+    async def _start_speech(self, audio: torch.Tensor):
+        """
+        进入 DURING_SPEECH 状态：重置下游流水线，并以前置音频加当前音频开始收集。
+        """
+        self.state = DetectionState.DURING_SPEECH
+        # 开启新轮次，之前轮次尚未处理完的消息在各阶段被丢弃
+        self.turns.begin()
+
+        # Call reset_callback before processing
+        try:
+            await self.reset_callback()
+            await self.send_text_queue.put('$clear$')
+            # await self.reset_callback()
+            logging.info(f"调用 reset_callback 成功")
+        except Exception as e:
+            await self.log(f"调用 reset_callback 时出错: {e}")
+
+        # 包含所有历史缓冲区
+        self.collected_audio.clear()
+        self.history_buffers.copy_to(self.collected_audio)
+        self.collected_audio.append(audio)
+        logging.debug(f"包含 {len(self.history_buffers)} 个前置采样点到 collected_audio。")
+        self.segment_seq = 0
+        await self._open_asr_stream()
+
+        self.last_speech_time = time.time()
+        log_message = "你继续说，我在听..."
+        await self.log(log_message)
+
+    async def _open_asr_stream(self):
+        """为当前语音片段开启流式识别，并送入已收集的音频。"""
+        if not self.streaming_asr:
+            return
+        if self.asr_stream:
+            await self.asr_stream.cancel()
+        try:
+            on_partial = functools.partial(self._on_partial, self.turns.current)
+            self.asr_stream = self.streaming_asr.open_stream(self.target_sample_rate, on_partial=on_partial)
+        except Exception as e:
+            self.asr_stream = None
+            await self.log(f"开启流式识别时出错: {e}")
+        self.asr_fed = 0
+        self._feed_asr()
+
+    @staticmethod
+    def _to_pcm(samples: torch.Tensor) -> memoryview:
+        """float32 采样转换为 16 位 PCM 字节。"""
+        pcm = samples.clamp(-1.0, 1.0).mul(32767.0).to(torch.int16).numpy()
+        return memoryview(pcm).cast('B')
+
+    def _feed_asr(self):
+        """把 collected_audio 中尚未送出的音频送入流式识别。"""
+        if self.asr_stream and len(self.collected_audio) > self.asr_fed:
+            self.asr_stream.feed(self._to_pcm(self.collected_audio.view(self.asr_fed)))
+            self.asr_fed = len(self.collected_audio)
+
+    async def _on_partial(self, turn_id: int, text: str):
+        """把流式识别的中间结果推送给客户端，并交给 partial_callback。"""
+        await self.send_text_queue.put(f'ASR中间结果：{text}')
+        if self.partial_callback:
+            await self.partial_callback(turn_id, text)
+
+    async def _emit_segment(self, end_of_turn: bool) -> PCMAudio:
+        """将收集到的语音转换为 16 位 PCM，作为本轮的一个片段交给下游。"""
+        # float32 -> int16 只转换一次，PCM 数据直接引用转换结果，不再经过 soundfile 编码
+        audio = PCMAudio(self._to_pcm(self.collected_audio.view()), self.target_sample_rate)
+
+        # 流式识别已在说话期间收到大部分音频，这里只补齐剩余部分并在后台等待最终结果
+        transcript = None
+        if self.asr_stream:
+            self._feed_asr()
+            transcript = asyncio.create_task(self.asr_stream.finish())
+            self.asr_stream = None
+
+        message = Message(self.turns.current, self.segment_seq, Utterance(audio, transcript), end_of_turn=end_of_turn)
+        self.segment_seq += 1
+        await self.detected_audio_queue.put(message)
+        return audio
+
+    async def _cut_speech(self):
+        """
+        语音时长达到上限：已收集的音频作为本轮的前段交给下游先行识别，保持 DURING_SPEECH 继续收集，
+        不开启新轮次，说完后与最后一段合并回复。
+        """
+        audio = await self._emit_segment(end_of_turn=False)
+        logging.info("语音时长达到上限，已将前段放入 detected_audio_queue。")
+        self.data_storage.add_user_audio(audio)
+        self.collected_audio.clear()
+        await self._open_asr_stream()
+
+    async def _finish_speech(self):
+        """
+        进入 AFTER_SPEECH 状态：将收集到的语音交给下游，并开启静默窗口。
+        WAV 编码由需要的消费者按需进行。
+        """
+        self.state = DetectionState.AFTER_SPEECH
+        self.hangover_remaining = self.hangover_samples
+        self.last_speech_time = time.time()
+        log_message = "让我想想怎么回答..."
+        await self.send_text_queue.put(log_message)
+
+        audio = await self._emit_segment(end_of_turn=True)
+        logging.info("检测到完整语音片段，已放入 detected_audio_queue。")
+        if self.end_of_speech_callback:
             try:
-                audio_data = await self.audio_queue.get()
-            except asyncio.TimeoutError:
-                # 如果在一段时间内没有音频数据，继续循环
-                continue
-
-            logging.info(f'接收到音频数据，长度: {len(audio_data)}')
-            sample_rate = self.orig_sample_rate
-
-            # 处理16位PCM数据：转换为torch.Tensor并归一化
-            if isinstance(audio_data, bytes):
-                # 假设音频数据是bytes类型的16位PCM
-                audio_array = np.frombuffer(audio_data, dtype=np.int16).copy()
-                audio_tensor = torch.tensor(audio_array, dtype=torch.float32) / 32768.0     ## numpy 数组转换为 PyTorch 张量，并将其标准化为浮点数范围 [−1.0,1.0][−1.0,1.0]
-            elif isinstance(audio_data, torch.Tensor):
-                if audio_data.dtype == torch.int16:
-                    audio_tensor = audio_data.float() / 32768.0  ## 转换为浮点数并标准化
-                elif audio_data.dtype == torch.float32:
-                    audio_tensor = audio_data
-                else:
-                    await self.log("不支持的Tensor数据类型，跳过当前音频块。")
-                    self.audio_queue.task_done()
-                    continue
-            else:
-                await self.log("audio_data格式不支持，跳过当前音频块。")
-                self.audio_queue.task_done()
-                continue
+                await self.end_of_speech_callback(self.turns.current)
+            except Exception as e:
+                logging.error(f"调用 end_of_speech_callback 时出错: {e}")
+        self.data_storage.add_user_audio(audio)
+        logging.info("检测到完整语音片段，已存入对话历史。")
 
-            if self.resampler:
-                logging.info("音频块采样率不匹配，开始重采样。")
-                try:
-                    audio_tensor = self.resampler(audio_tensor)
-                    logging.info("音频块重采样成功。")
-                except Exception as e:
-                    await self.log(f"重采样时出错: {e}")
-                    self.audio_queue.task_done()
-                    continue
+        # 异步保存音频文件
+        save_dir = "XXX/speaker_wav"
+        await self.save_audio_async(audio, save_dir)
 
-            # 追加到缓冲区
-            self.buffer = torch.cat((self.buffer, audio_tensor))
-            logging.info(f"追加到缓冲区，当前缓冲区长度: {len(self.buffer)}")
+    async def _process_buffer(self, audio_tensor: torch.Tensor):
+        """
+        缓冲模式：累积 buffer_duration 的音频后，对整个缓冲区调用 get_speech_timestamps。
+        """
+        # 追加到缓冲区
+        self.buffer.append(audio_tensor)
+        logging.info(f"追加到缓冲区，当前缓冲区长度: {len(self.buffer)}")
 
-            # 当缓冲区足够大时，进行 VAD
-            if len(self.buffer) >= self.buffer_size:
-                logging.info("缓冲区大小达到阈值，开始进行语音活动检测。")
-                try:
+        # 当缓冲区足够大时，进行 VAD
+        if len(self.buffer) >= self.buffer_size:
+            logging.info("缓冲区大小达到阈值，开始进行语音活动检测。")
+            try:
+                if self.executor:
+                    speech_timestamps = await self.executor.speech_timestamps(
+                        self.buffer.view(),
+                        self.model,
+                        sampling_rate=self.target_sample_rate,
+                        threshold=self.buffer_vad_threshold
+                    )
+                else:
                     speech_timestamps = get_speech_timestamps(
-                        self.buffer, 
+                        self.buffer.view(), 
                         self.model, 
                         sampling_rate=self.target_sample_rate,
-                        threshold=0.95  # 调整阈值以控制敏感度
+                        threshold=self.buffer_vad_threshold  # 调整阈值以控制敏感度
                     )
-                except Exception as e:
-                    await self.log(f"VAD处理时出错: {e}")
-                    self.audio_queue.task_done()
-                    continue
+            except Exception as e:
+                await self.log(f"VAD处理时出错: {e}")
+                return
+
+            if self.state == DetectionState.AFTER_SPEECH:
+                await self._after_speech(self.buffer.view(), bool(speech_timestamps))
+            elif speech_timestamps:
+                if self.state == DetectionState.BEFORE_SPEECH:
+                    # Transition to DURING_SPEECH
+                    await self._start_speech(self.buffer.view())
+                elif self.state == DetectionState.DURING_SPEECH:
+                    self.collected_audio.append(self.buffer.view())
+                    self._feed_asr()
+                    self.last_speech_time = time.time()
+                    log_message = "持续说话中..."
+                    await self.log(log_message)
+            else:
+                if self.state == DetectionState.DURING_SPEECH:
+                    # Transition to AFTER_SPEECH
+                    self.collected_audio.append(self.buffer.view())
+                    await self._finish_speech()
+
+            # 在这里将当前缓冲区添加到历史缓冲区
+            if self.state != DetectionState.DURING_SPEECH:
+                self.history_buffers.append(self.buffer.view())
+                logging.debug(f"更新历史缓冲区，目前存储 {len(self.history_buffers)} 个前置采样点。")
+
+            # 重置缓冲区
+            self.buffer.clear()
+            logging.info("缓冲区已重置。")
+
+    async def _process_stream(self, audio_tensor: torch.Tensor):
+        """
+        流式模式：将音频切分为固定长度的帧逐帧送入模型，按帧粒度切换状态。
+        """
+        self.buffer.append(audio_tensor)
+        frame_size = self.streaming_vad.frame_size
+        num_frames = len(self.buffer) // frame_size
+        if num_frames == 0:
+            return
 
-                current_time = time.time()
-
-                if speech_timestamps:
-                    if self.state == DetectionState.BEFORE_SPEECH:
-                        # Transition to DURING_SPEECH
-                        self.state = DetectionState.DURING_SPEECH
-
-                        # Call reset_callback before processing
-                        try:
-                            await self.reset_callback()
-                            await self.send_text_queue.put('$clear$')
-                            # await self.reset_callback()
-                            logging.info(f"调用 reset_callback 成功")
-                        except Exception as e:
-                            await self.log(f"调用 reset_callback 时出错: {e}")
-
-                        # 包含所有历史缓冲区
-                        if len(self.history_buffers) > 0:
-                            historical_audio = torch.cat(list(self.history_buffers))
-                            self.collected_audio = torch.cat((historical_audio, self.buffer.clone()))
-                            logging.debug("包含所有历史缓冲区到 collected_audio。")
-                        else:
-                            self.collected_audio = self.buffer.clone()
-                            logging.debug("无历史缓冲区，仅包含当前缓冲区到 collected_audio。")
-                        
-                        self.last_speech_time = current_time
-                        log_message = "你继续说，我在听..."
-                        await self.log(log_message)
-                    elif self.state == DetectionState.DURING_SPEECH:
-                        self.collected_audio = torch.cat((self.collected_audio, self.buffer.clone()))
-                        self.last_speech_time = current_time
-                        log_message = "持续说话中..."
-                        await self.log(log_message)
+        # 整块音频的所有帧一次提交推理，端点状态再逐帧更新
+        frames = self.buffer.view(0, num_frames * frame_size).view(num_frames, frame_size)
+        try:
+            speech_probs = await self.streaming_vad.speech_probs(frames)
+        except Exception as e:
+            await self.log(f"VAD处理时出错: {e}")
+            self.buffer.discard_front(num_frames * frame_size)
+            return
+
+        for i, speech_prob in enumerate(speech_probs):
+            frame = frames[i]
+            event = self.streaming_vad.endpointer.update(speech_prob)
+
+            if self.state == DetectionState.BEFORE_SPEECH:
+                if event == VADEvent.SPEECH_START:
+                    await self._start_speech(frame)
                 else:
-                    if self.state == DetectionState.DURING_SPEECH:
-                        # Transition to AFTER_SPEECH
-                        self.state = DetectionState.AFTER_SPEECH
-                        self.collected_audio = torch.cat((self.collected_audio, self.buffer.clone()))
-                        self.last_speech_time = current_time
-                        log_message = "让我想想怎么回答..."
-                        await self.send_text_queue.put(log_message)
-
-                        audio_bytes_io = io.BytesIO()
-                        # 转换为正确的形状（需要是 (num_samples, num_channels)）
-                        audio_np = self.collected_audio.cpu().numpy()
-                        if audio_np.ndim == 1:
-                            audio_np = np.expand_dims(audio_np, axis=1)
-                        sf.write(audio_bytes_io, audio_np, self.target_sample_rate, format='WAV')
-                        audio_bytes = audio_bytes_io.getvalue()
-
-                        await self.detected_audio_queue.put(audio_bytes)
-                        logging.info("检测到完整语音片段，已放入 detected_audio_queue。")
-                        await self.history_audio_queue.put(audio_bytes)
-                        logging.info("检测到完整语音片段，已放入 history_audio_queue。")
-
-                        # 异步保存音频文件
-                        save_dir = "XXX/speaker_wav"
-                        await self.save_audio_async(audio_bytes, save_dir)
-
-                        # 直接在 run 方法中处理 AFTER_SPEECH，阻塞 run 函数
-                        await self._handle_after_speech()
-
-                # 在这里将当前缓冲区添加到历史缓冲区
-                self.history_buffers.append(self.buffer.clone())
-                logging.debug(f"更新历史缓冲区，目前存储 {len(self.history_buffers)} 个前置缓冲区。")
-
-                # 重置缓冲区
-                self.buffer = torch.tensor([], dtype=torch.float32)
-                logging.info("缓冲区已重置。")
-
-            self.audio_queue.task_done()
+                    self.history_buffers.append(frame)
+            elif self.state == DetectionState.DURING_SPEECH:
+                self.collected_audio.append(frame)
+                if event == VADEvent.SPEECH_END:
+                    await self._finish_speech()
+                elif event == VADEvent.SPEECH_CUT:
+                    await self._cut_speech()
+                else:
+                    self.last_speech_time = time.time()
+            else:
+                await self._after_speech(frame, event == VADEvent.SPEECH_START)
+                if self.state != DetectionState.DURING_SPEECH:
+                    self.history_buffers.append(frame)
+
+        if self.state == DetectionState.DURING_SPEECH:
+            self._feed_asr()
+
+        # 保留不足一帧的剩余采样点
+        self.buffer.discard_front(num_frames * frame_size)
+
+    async def close(self):
+        """关闭未结束的流式识别会话，释放其后台任务和后端 WebSocket 连接。"""
+        if self.asr_stream:
+            asr_stream, self.asr_stream = self.asr_stream, None
+            await asr_stream.cancel()
+
+    async def run(self):
+        # 启动定期日志记录协程
+        logger_task = asyncio.create_task(self.periodic_logger())
+        logging.info('开始运行 AudioDetectionModule')
+        await self.log(f'开始运行 AudioDetectionModule，初始状态: {self.state.name}')
+        try:
+            while True:
+                try:
+                    audio_data = await self.audio_queue.get()
+                except asyncio.TimeoutError:
+                    # 如果在一段时间内没有音频数据，继续循环
+                    continue
+
+                logging.info(f'接收到音频数据，长度: {len(audio_data)}')
+
+                audio_tensor = await self._decode_audio(audio_data)
+                if audio_tensor is not None:
+                    if self.streaming_vad:
+                        await self._process_stream(audio_tensor)
+                    else:
+                        await self._process_buffer(audio_tensor)
+
+                self.audio_queue.task_done()
+        finally:
+            # 检测任务结束（如连接断开时被取消）时，说话中途开启的流式识别会话随之关闭
+            logger_task.cancel()
+            await self.close()
@@ -0,0 +1,151 @@
+import struct
+
+WAV_HEADER_SIZE = 44
+
+
+def wav_header(data_size: int, sample_rate: int, channels: int = 1, sample_width: int = 2) -> bytes:
+    """
+    生成 PCM WAV 文件头。
+
+    :param data_size: PCM 数据字节数。
+    :param sample_rate: 采样率。
+    :param channels: 声道数。
+    :param sample_width: 每个采样点的字节数。
+    :return: 44 字节的 WAV 头。
+    """
+    byte_rate = sample_rate * channels * sample_width
+    block_align = channels * sample_width
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + data_size, b'WAVE',
+        b'fmt ', 16, 1, channels, sample_rate, byte_rate, block_align, sample_width * 8,
+        b'data', data_size
+    )
+
+
+class PCMAudio:
+    """
+    16 位 PCM 音频片段。
+    WAV 头在构造时一次生成，不经过编解码器；完整的 WAV 字节只在消费者需要时才拼接。
+    """
+    __slots__ = ('pcm', 'sample_rate', 'channels', 'header', '_wav')
+
+    def __init__(self, pcm, sample_rate: int, channels: int = 1):
+        """
+        :param pcm: int16 小端 PCM 数据（bytes 或 memoryview）。
+        :param sample_rate: 采样率。
+        :param channels: 声道数。
+        """
+        self.pcm = pcm
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.header = wav_header(len(pcm), sample_rate, channels)
+        self._wav = None
+
+    def __len__(self):
+        return len(self.pcm)
+
+    @property
+    def duration(self) -> float:
+        """音频时长（秒）。"""
+        return len(self.pcm) / (self.sample_rate * self.channels * 2)
+
+    def to_wav(self) -> bytes:
+        """返回完整的 WAV 字节，首次调用时拼接并缓存。"""
+        if self._wav is None:
+            self._wav = self.header + self.pcm
+        return self._wav
+
+    def write_wav(self, f):
+        """将 WAV 写入已打开的二进制文件，不拼接整段数据。"""
+        f.write(self.header)
+        f.write(self.pcm)
+
+
+class WavStreamReframer:
+    """
+    将流式 TTS 返回的 WAV 字节流重新切分为自包含的 PCMAudio 片段。
+    流的开头是 WAV 头（数据长度通常不可信），之后都是 PCM；
+    解析一次头部后，按抖动缓冲时长攒够 PCM 就输出一段，每段都带有正确的 WAV 头，可单独播放。
+    """
+    def __init__(self, jitter_ms=200, sample_rate: int = 16000, channels: int = 1):
+        """
+        :param jitter_ms: 每段的最短时长（毫秒），None 表示只在 flush() 时整体输出。
+        :param sample_rate: 流不带 WAV 头（裸 PCM）时使用的采样率。
+        :param channels: 流不带 WAV 头时使用的声道数。
+        """
+        self.jitter_ms = jitter_ms
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self._header_parsed = False
+        self._buffer = bytearray()
+        self._min_bytes = 0
+        self._block_align = 2 * channels
+
+    def _parse_header(self) -> bool:
+        """从缓冲区开头解析 WAV 头，数据不足时返回 False。"""
+        data = self._buffer
+        if len(data) < 12:
+            if data[:4] != b'RIFF'[:len(data)]:
+                self._set_format(self.sample_rate, self.channels, 0)
+                return True
+            return False
+        if data[:4] != b'RIFF' or data[8:12] != b'WAVE':
+            # 裸 PCM
+            self._set_format(self.sample_rate, self.channels, 0)
+            return True
+
+        offset = 12
+        sample_rate, channels = self.sample_rate, self.channels
+        while True:
+            if len(data) < offset + 8:
+                return False
+            chunk_id, chunk_size = struct.unpack_from('<4sI', data, offset)
+            if chunk_id == b'data':
+                self._set_format(sample_rate, channels, offset + 8)
+                return True
+            if len(data) < offset + 8 + chunk_size:
+                return False
+            if chunk_id == b'fmt ':
+                _, channels, sample_rate, _, _, bits = struct.unpack_from('<HHIIHH', data, offset + 8)
+                if bits != 16:
+                    raise ValueError(f'只支持 16 位 PCM WAV，收到 {bits} 位')
+            offset += 8 + chunk_size + (chunk_size & 1)
+
+    def _set_format(self, sample_rate: int, channels: int, header_size: int):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self._block_align = 2 * channels
+        del self._buffer[:header_size]
+        self._header_parsed = True
+        if self.jitter_ms is not None:
+            min_bytes = int(sample_rate * self._block_align * self.jitter_ms / 1000)
+            self._min_bytes = max(self._block_align, min_bytes - min_bytes % self._block_align)
+
+    def _take(self, size: int) -> PCMAudio:
+        pcm = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return PCMAudio(pcm, self.sample_rate, self.channels)
+
+    def feed(self, data) -> list:
+        """追加一块流数据，返回已攒够抖动缓冲时长的片段。"""
+        self._buffer.extend(data)
+        if not self._header_parsed and not self._parse_header():
+            return []
+        if self.jitter_ms is None or len(self._buffer) < self._min_bytes:
+            return []
+        # 只输出整帧，剩余的不完整采样点留到下一段
+        size = len(self._buffer) - len(self._buffer) % self._block_align
+        return [self._take(size)]
+
+    def flush(self):
+        """输出剩余的 PCM，没有数据时返回 None。"""
+        if not self._header_parsed:
+            self._parse_header()
+        size = len(self._buffer) - len(self._buffer) % self._block_align
+        if not self._header_parsed or size == 0:
+            self._buffer.clear()
+            return None
+        audio = self._take(size)
+        self._buffer.clear()
+        return audio
@@ -6,6 +6,11 @@ from models.LLM.deepseek_llm import DeepSeekLLM
 from models.ASR.sense_asr import SenseASR
 from pathlib import Path
 import logging
+from audio_format import PCMAudio
+from data_storage import DataStorageModule
+from messages import Message, TurnChannel, TurnTracker
+from speculation import Speculation, SpeculationStats
+from turn_scheduler import AdmissionLimiter, TurnScheduler
 
 logging.basicConfig(
     filename=Path('./log.txt'),
@@ -14,12 +19,21 @@ logging.basicConfig(
 )
 
 class AudioProcessingModule:
-    def __init__(self, audio_queue: asyncio.Queue, text_queue: asyncio.Queue, history_audio_queue: asyncio.Queue, history_text_queue: asyncio.Queue, send_text_queue: asyncio.Queue):
+    def __init__(self, audio_queue: asyncio.Queue, text_queue: asyncio.Queue, data_storage: DataStorageModule, send_text_queue: asyncio.Queue,
+                 turns: TurnTracker = None, speculation_stable_ms: float = None,
+                 max_concurrent_turns: int = 1, admission: AdmissionLimiter = None):
+        """
+        :param turns: 会话的轮次计数器。
+        :param speculation_stable_ms: 流式识别的中间结果保持不变超过该时长（毫秒）后即以其提前请求 LLM，
+            最终结果一致时直接采用，否则放弃重新请求；None 表示不投机执行。
+        :param max_concurrent_turns: 会话内同时处理的轮次上限，新轮次到达时取消旧轮次。
+        :param admission: 进程级准入限制（AdmissionLimiter），所有会话共享。
+        """
         self.audio_queue = audio_queue
         self.text_queue = text_queue
-        self.history_text_queue = history_text_queue
-        self.history_audio_queue = history_audio_queue
+        self.data_storage = data_storage
         self.send_text_queue = send_text_queue
+        self.turns = turns or TurnTracker()
         # self.asr = VITAMM()
         # self.llm = VITAMM()
         # self.asr = Qwen2AudioMM()
@@ -27,23 +41,133 @@ class AudioProcessingModule:
         self.asr = SenseASR()
         self.llm = DeepSeekLLM()
         self.tasks = set()
+        self.scheduler = TurnScheduler(self.turns, max_concurrent_turns, admission)
         self.reset_lock = asyncio.Lock()
+        self.speculation_stable_ms = speculation_stable_ms
+        self.speculation = None
+        self.speculation_stats = SpeculationStats()
+        self._partial = None       # (turn_id, 文本)：最近一次的中间结果
+        self._stable_timer = None
+        self._segments = {}        # turn_id -> 超长语音前段的识别任务
 
-    async def post_audio(self, combined_audio: bytes, lang: str = "auto") -> str:
+    async def post_audio(self, combined_audio, lang: str = "auto") -> str:
+        # 检测模块传来的是 PCM 音频，只在这里按需编码为 WAV
+        if isinstance(combined_audio, PCMAudio):
+            combined_audio = combined_audio.to_wav()
         return await self.asr.post_audio(combined_audio, lang)
 
-    async def post_text(self, text: str):
-        await self.llm.post_text(text, self.text_queue, self.history_text_queue)
+    async def post_text(self, text: str, turn_id: int):
+        # LLM 客户端放入的文本块和结束标志都封装为该轮次的消息
+        await self.llm.post_text(text, TurnChannel(self.text_queue, turn_id), self.data_storage)
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    def _discard_speculation(self, reason: str):
+        """放弃当前的投机请求，计入浪费的 token。"""
+        speculation, self.speculation = self.speculation, None
+        if speculation is None or speculation.committed:
+            return
+        speculation.cancel()
+        self.speculation_stats.misses += 1
+        self.speculation_stats.wasted_tokens += speculation.tokens
+        logging.info(f"放弃投机请求（{reason}）: {speculation.text}，已生成约 {speculation.tokens} token")
+
+    async def on_partial(self, turn_id: int, text: str):
+        """
+        接收流式识别的中间结果。结果变化时重新计时并放弃基于旧结果的投机请求，
+        保持 speculation_stable_ms 不变后发起新的投机请求。
+        """
+        if self.speculation_stable_ms is None or self.turns.current != turn_id:
+            return
+        # 超长语音被切分时中间结果只覆盖最后一段，不用于投机
+        if turn_id in self._segments:
+            return
+        if self._partial is not None and self._partial[0] == turn_id and self._partial[1] == text:
+            return
+        self._partial = (turn_id, text)
+        if self._stable_timer is not None:
+            self._stable_timer.cancel()
+        if self.speculation is not None and not self.speculation.matches(text):
+            self._discard_speculation('中间结果变化')
+        if self.speculation is None:
+            self._stable_timer = self._spawn(self._speculate_when_stable(turn_id, text))
+
+    async def _speculate_when_stable(self, turn_id: int, text: str):
+        await asyncio.sleep(self.speculation_stable_ms / 1000)
+        if self.turns.current != turn_id:
+            return
+        speculation = Speculation(text, TurnChannel(self.text_queue, turn_id), self.data_storage)
+        speculation.task = self._spawn(self._run_speculation(speculation))
+        self.speculation = speculation
+        self.speculation_stats.speculations += 1
+        logging.info(f"中间结果已稳定 {self.speculation_stable_ms} 毫秒，投机请求 LLM: {text}")
+
+    async def _run_speculation(self, speculation: Speculation):
+        # 投机请求同样占用后端连接，计入全局准入限制
+        async with self.scheduler.admission.slot():
+            speculation.admitted = True
+            await self.llm.post_text(speculation.text, speculation, speculation)
 
-    async def process_audio(self, combined_audio: bytes, lang: str = "auto"):
+    async def respond(self, text: str, turn_id: int):
+        """
+        以最终识别结果请求 LLM：同一轮次的投机请求文本一致时直接采用其回复，否则放弃后重新请求。
+        本方法在轮次的准入名额内运行；投机请求仍在排队等待名额时不再等待它，
+        直接放弃并用本轮次已持有的名额请求，避免各会话互相等待对方释放名额。
+        """
+        self.speculation_stats.turns += 1
+        if self._stable_timer is not None:
+            self._stable_timer.cancel()
+            self._stable_timer = None
+        self._partial = None
+        speculation = self.speculation
+        if speculation is not None and not speculation.admitted:
+            self._discard_speculation('尚未获得准入名额')
+            speculation = None
+        if speculation is not None and speculation.turn_id == turn_id and speculation.matches(text):
+            self.speculation = None
+            self.speculation_stats.hits += 1
+            logging.info(f"投机请求命中: {text}")
+            await speculation.commit()
+            await asyncio.gather(speculation.task, return_exceptions=True)
+        else:
+            self._discard_speculation('最终结果不一致')
+            await self.post_text(text, turn_id)
+        logging.info(f"投机执行统计: {self.speculation_stats.as_dict()}")
+
+    async def transcribe(self, utterance, lang: str = "auto") -> str:
+        """
+        获取一句话的识别结果：说话期间已开始流式识别时等待其最终结果，
+        流式识别失败或没有结果时退回整句识别。
+        """
+        if utterance.transcript is not None:
+            try:
+                text = await utterance.transcript
+                if text:
+                    return text
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"流式识别失败，改用整句识别: {e}")
+        return await self.post_audio(utterance.audio, lang)
+
+    async def process_audio(self, message: Message, lang: str = "auto"):
         """
         处理音频，将其转换为文本，然后流式传输文本。
         """
         try:
-            transcribed_text = await self.post_audio(combined_audio, lang)
-            if transcribed_text:
+            # 超长语音被切分的前段已先行识别，与最后一段的结果按顺序合并
+            segments = self._segments.pop(message.turn_id, [])
+            texts = await asyncio.gather(*segments, return_exceptions=True)
+            texts = [text for text in texts if isinstance(text, str)]
+            texts.append(await self.transcribe(message.payload, lang))
+            transcribed_text = ''.join(texts)
+            if transcribed_text and not self.turns.is_stale(message):
                 await self.send_text_queue.put('ASR结果：' + transcribed_text + '\n' + '开始post')
-                await self.post_text(transcribed_text)
+                await self.respond(transcribed_text, message.turn_id)
                 # logging.info()
                 
         except asyncio.CancelledError:
@@ -71,16 +195,23 @@ class AudioProcessingModule:
 
         try:
             while True:
-                combined_audio = await self.audio_queue.get()
+                message = await self.audio_queue.get()
+                if self.turns.is_stale(message):
+                    logging.info(f'AudioProcessingModule: 丢弃过期轮次 {message.turn_id} 的音频')
+                    if message.payload is not None and message.payload.transcript is not None:
+                        message.payload.transcript.cancel()
+                    self.audio_queue.task_done()
+                    continue
+                if not message.end_of_turn:
+                    # 超长语音的前段：先行识别，等本轮最后一段到达后合并回复
+                    task = self._spawn(self.transcribe(message.payload))
+                    self._segments.setdefault(message.turn_id, []).append(task)
+                    self.audio_queue.task_done()
+                    continue
                 logging.info('AudioProcessingModule: 成功获取一块音频')
                 
-                # 为每个音频处理创建一个独立的任务
-                task = asyncio.create_task(self.process_audio(combined_audio, lang="auto"))
-                self.tasks.add(task)
-                
-                # 任务完成后移除
-                task.add_done_callback(self.tasks.discard)
-                
+                # 交给轮次调度：取消旧轮次，受会话内并发上限和全局准入限制约束
+                self.scheduler.submit(message.turn_id, self.process_audio(message, lang="auto"))
                 self.audio_queue.task_done()
         except asyncio.CancelledError:
             logging.info("run 任务被取消")
@@ -98,6 +229,12 @@ class AudioProcessingModule:
         async with self.reset_lock:
             logging.info("开始重置 AudioProcessingModule")
             
+            # 被打断的投机请求同样计为放弃
+            self._discard_speculation('被打断')
+            self._partial = None
+            self._stable_timer = None
+            self._segments.clear()
+
             # 取消所有任务
             tasks = list(self.tasks)
             for task in tasks:
@@ -106,5 +243,6 @@ class AudioProcessingModule:
             # 等待所有任务取消完成
             await asyncio.gather(*tasks, return_exceptions=True)
             self.tasks.clear()
+            await self.scheduler.cancel_all()
             
             logging.info("AudioProcessingModule 重置完成")
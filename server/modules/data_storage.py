@@ -1,6 +1,17 @@
 import asyncio
+import itertools
+import json
 import logging
+import mmap
+import os
+import re
+import struct
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Any, Iterable, List, Optional
 
 logging.basicConfig(
     filename=Path('./log.txt'),
@@ -8,11 +19,391 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+# 中日韩字符大致一个字一个 token，其余字符大致四个一个 token
+_CJK_PATTERN = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯]')
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的 token 数。"""
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+@dataclass
+class Turn:
+    """
+    对话中的一轮消息。
+
+    role: 'user' 或 'assistant'
+    kind: 'text' 为纯文本，'audio' 为音频（PCMAudio、WAV 字节或 AudioRef），其他值由具体模型客户端自定义
+    """
+    role: str
+    content: Any
+    kind: str = 'text'
+    turn_id: int = 0
+    tokens: int = 0
+    timestamp: float = field(default_factory=time.time)
+
+
+@dataclass
+class AudioRef:
+    """指向 TurnLog 中音频负载的引用，音频数据留在磁盘上，需要时再读取。"""
+    log: 'TurnLog'
+    segment: int
+    offset: int
+    length: int
+
+    def __len__(self):
+        return self.length
+
+    async def load(self) -> bytes:
+        return await self.log.read_payload(self.segment, self.offset, self.length)
+
+
+class TurnLog:
+    """
+    进程级的追加写入对话日志，所有会话共享。
+    - 分段文件 segment_XXXXX.log：每条记录为 记录头 + kind + 负载，只追加不修改，达到 segment_size 后切换新分段；
+    - 索引文件 index/<session_id>.idx：每条为定长的 (turn_id, 分段号, 偏移, 长度)，
+      恢复会话时只需读取索引末尾的 k 条，再通过内存映射读取对应记录。
+    append() 在调用线程中只分配位置，文件写入按顺序交给单个后台线程，不阻塞事件循环；
+    读取同样在该线程中进行，排在已提交的写入之后，无需等待写入完成。索引文件句柄保持打开（LRU 上限 MAX_OPEN_INDEXES）。
+    切换分段时按 max_bytes / max_age_days 删除最旧的分段和长期不活跃的会话索引。
+    """
+    MAGIC = b'TURN'
+    # magic, timestamp, tokens, role, encoding, kind 长度, 负载长度
+    HEADER = struct.Struct('<4sdIBBHI')
+    INDEX = struct.Struct('<QIQI')
+
+    ROLES = ('user', 'assistant', 'system')
+    ENCODING_TEXT = 0
+    ENCODING_BYTES = 1
+    ENCODING_JSON = 2
+
+    MAX_OPEN_INDEXES = 128
+
+    _SESSION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+    def __init__(self,
+                 directory,
+                 segment_size: int = 64 * 1024 * 1024,
+                 max_bytes: Optional[int] = None,
+                 max_age_days: Optional[float] = None):
+        """
+        :param directory: 日志目录。
+        :param segment_size: 单个分段文件的大小上限（字节）。
+        :param max_bytes: 所有分段的总大小上限（字节），超出时删除最旧的分段，None 表示不限。
+        :param max_age_days: 分段和会话索引的保留天数，None 表示不限。
+        """
+        self.directory = Path(directory)
+        self.segment_size = segment_size
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 86400 if max_age_days is not None else None
+        self.index_dir = self.directory / 'index'
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+
+        segments = sorted(self.directory.glob('segment_*.log'))
+        self._segment = self._segment_number(segments[-1]) if segments else 0
+        self._first_segment = self._segment_number(segments[0]) if segments else 0
+        path = self._segment_path(self._segment)
+        self._offset = path.stat().st_size if path.exists() else 0
+        # 内存映射只在写入线程中访问
+        self._maps = {}
+
+        # 以下状态只在写入线程中访问
+        self._writer = open(path, 'ab')
+        self._writer_segment = self._segment
+        self._indexes = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='turn_log')
+        self._enforce_retention()
+        logging.info(f'对话日志已打开: {self.directory}，当前分段: {self._segment}')
+
+    @staticmethod
+    def _segment_number(path: Path) -> int:
+        return int(path.stem.split('_')[1])
+
+    @classmethod
+    def valid_session_id(cls, session_id) -> bool:
+        return bool(session_id) and bool(cls._SESSION_ID_PATTERN.match(session_id))
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.directory / f'segment_{segment:05d}.log'
+
+    def _index_path(self, session_id: str) -> Path:
+        return self.index_dir / f'{session_id}.idx'
+
+    def append(self, session_id: str, turn: Turn):
+        """
+        追加一条记录并写入会话索引。
+
+        :return: (分段号, 负载偏移, 负载长度)
+        """
+        content = turn.content
+        if isinstance(content, str):
+            encoding, chunks = self.ENCODING_TEXT, [content.encode('utf-8')]
+        elif isinstance(content, (bytes, bytearray, memoryview)):
+            encoding, chunks = self.ENCODING_BYTES, [content]
+        elif hasattr(content, 'header') and hasattr(content, 'pcm'):
+            # PCMAudio：头和 PCM 分开写入，不拼接整段数据
+            encoding, chunks = self.ENCODING_BYTES, [content.header, content.pcm]
+        else:
+            encoding, chunks = self.ENCODING_JSON, [json.dumps(content, ensure_ascii=False).encode('utf-8')]
+
+        kind = turn.kind.encode('utf-8')
+        payload_length = sum(len(memoryview(chunk).cast('B')) for chunk in chunks)
+        role = self.ROLES.index(turn.role) if turn.role in self.ROLES else 0
+        header = self.HEADER.pack(self.MAGIC, turn.timestamp, turn.tokens, role, encoding, len(kind), payload_length)
+
+        # 位置在调用线程中分配，写入线程按提交顺序落盘，两者一致
+        record_length = len(header) + len(kind) + payload_length
+        if self._offset + record_length > self.segment_size and self._offset > 0:
+            self._segment += 1
+            self._offset = 0
+        segment, record_offset = self._segment, self._offset
+        self._offset += record_length
+
+        entry = self.INDEX.pack(turn.turn_id, segment, record_offset, record_length)
+        self._executor.submit(self._write, session_id, segment, [header, kind, *chunks], entry)
+        return segment, record_offset + len(header) + len(kind), payload_length
+
+    def _write(self, session_id: str, segment: int, chunks: list, entry: bytes):
+        """在写入线程中追加一条记录和对应的索引项。"""
+        try:
+            if segment != self._writer_segment:
+                self._writer.close()
+                self._writer = open(self._segment_path(segment), 'ab')
+                self._writer_segment = segment
+                logging.info(f'对话日志切换到新分段: {segment}')
+                self._enforce_retention()
+            for chunk in chunks:
+                self._writer.write(chunk)
+            self._writer.flush()
+            index = self._index_file(session_id)
+            index.write(entry)
+            index.flush()
+        except Exception as e:
+            logging.error(f'写入对话日志时出错: {e}')
+
+    def _index_file(self, session_id: str):
+        index = self._indexes.pop(session_id, None)
+        if index is None:
+            index = open(self._index_path(session_id), 'ab')
+            if len(self._indexes) >= self.MAX_OPEN_INDEXES:
+                _, oldest = self._indexes.popitem(last=False)
+                oldest.close()
+        self._indexes[session_id] = index
+        return index
+
+    def _enforce_retention(self):
+        """删除超出总大小或保留天数的最旧分段（当前分段除外），以及长期不活跃的会话索引。"""
+        if self.max_bytes is None and self.max_age is None:
+            return
+        now = time.time()
+        segments = [(self._segment_number(path), path, path.stat())
+                    for path in sorted(self.directory.glob('segment_*.log'))]
+        total = sum(stat.st_size for _, _, stat in segments)
+        for number, path, stat in segments:
+            if number >= self._writer_segment:
+                break
+            too_big = self.max_bytes is not None and total > self.max_bytes
+            too_old = self.max_age is not None and now - stat.st_mtime > self.max_age
+            if not (too_big or too_old):
+                break
+            path.unlink()
+            total -= stat.st_size
+            self._first_segment = number + 1
+            logging.info(f'对话日志已删除过期分段: {number}')
+        if self.max_age is not None:
+            for path in self.index_dir.glob('*.idx'):
+                if path.stem not in self._indexes and now - path.stat().st_mtime > self.max_age:
+                    path.unlink()
+
+    def _map(self, segment: int, end: int):
+        if segment < self._first_segment:
+            raise FileNotFoundError(f'对话日志分段 {segment} 已按保留策略删除')
+        for removed in [number for number in self._maps if number < self._first_segment]:
+            self._maps.pop(removed).close()
+        mapped = self._maps.get(segment)
+        if mapped is None or len(mapped) < end:
+            if mapped is not None:
+                mapped.close()
+            with open(self._segment_path(segment), 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment] = mapped
+        return mapped
+
+    async def _run(self, fn, *args):
+        """在写入线程中执行读取，排在已提交的写入之后。"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _read_payload(self, segment: int, offset: int, length: int) -> bytes:
+        return bytes(self._map(segment, offset + length)[offset:offset + length])
+
+    async def read_payload(self, segment: int, offset: int, length: int) -> bytes:
+        return await self._run(self._read_payload, segment, offset, length)
+
+    def _read_turn(self, turn_id: int, segment: int, offset: int, length: int) -> Turn:
+        mapped = self._map(segment, offset + length)
+        magic, timestamp, tokens, role, encoding, kind_length, payload_length = self.HEADER.unpack_from(mapped, offset)
+        if magic != self.MAGIC:
+            raise ValueError(f'对话日志记录损坏: 分段 {segment}，偏移 {offset}')
+        kind_start = offset + self.HEADER.size
+        payload_start = kind_start + kind_length
+        kind = mapped[kind_start:payload_start].decode('utf-8')
+
+        if encoding == self.ENCODING_BYTES:
+            # 二进制负载（音频）不读入内存，只保留引用
+            content = AudioRef(self, segment, payload_start, payload_length)
+        else:
+            raw = mapped[payload_start:payload_start + payload_length].decode('utf-8')
+            content = raw if encoding == self.ENCODING_TEXT else json.loads(raw)
+        return Turn(role=self.ROLES[role], content=content, kind=kind, turn_id=turn_id, tokens=tokens, timestamp=timestamp)
+
+    def _load_recent(self, session_id: str, k: int) -> List[Turn]:
+        path = self._index_path(session_id)
+        if k <= 0 or not path.exists():
+            return []
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell() - f.tell() % self.INDEX.size
+            start = max(0, size - k * self.INDEX.size)
+            f.seek(start)
+            data = f.read(size - start)
+        # 已按保留策略删除的分段中的记录跳过
+        return [self._read_turn(*entry) for entry in self.INDEX.iter_unpack(data) if entry[1] >= self._first_segment]
+
+    async def load_recent(self, session_id: str, k: int) -> List[Turn]:
+        """读取会话最近的 k 条记录，只访问索引末尾和对应的记录。"""
+        return await self._run(self._load_recent, session_id, k)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._writer.close()
+        for index in self._indexes.values():
+            index.close()
+        self._indexes.clear()
+        for mapped in self._maps.values():
+            mapped.close()
+        self._maps.clear()
+
+
 class DataStorageModule:
-    def __init__(self, history_text_queue: asyncio.Queue, history_audio_queue: asyncio.Queue):
-        self.history_text_queue = history_text_queue
-        self.history_audio_queue = history_audio_queue
+    """
+    单个会话的对话历史存储。
+    以有界 deque 保存按时间排序的 Turn：追加为 O(1)，读取最近 k 条为 O(k)，
+    并可按 token 预算从最新一轮向前截断构造模型上下文。
+    配置 TurnLog 后每条消息同时写入磁盘日志，音频负载只在磁盘上保存，内存中仅保留 AudioRef；
+    重连时通过 resume() 载入最近的 k 条消息。
+    """
+    def __init__(self, max_turns: int = 64, token_budget: int = 2048, session_id: str = None, turn_log: TurnLog = None):
+        """
+        :param max_turns: 最多保留的消息条数，超出时丢弃最旧的消息。
+        :param token_budget: messages() 默认的 token 预算。
+        :param session_id: 会话 ID，持久化时用于索引。
+        :param turn_log: 进程级对话日志，None 表示只保存在内存中。
+        """
+        self.turns = deque(maxlen=max_turns)
+        self.token_budget = token_budget
+        self.session_id = session_id
+        self.turn_log = turn_log if session_id else None
+        self._next_turn_id = 0
+
+    async def resume(self, k: int) -> int:
+        """
+        从对话日志中载入该会话最近的 k 条消息。
+
+        :return: 载入的消息条数。
+        """
+        if not self.turn_log:
+            return 0
+        turns = await self.turn_log.load_recent(self.session_id, k)
+        self.turns.clear()
+        self.turns.extend(turns)
+        if turns:
+            self._next_turn_id = turns[-1].turn_id + 1
+        logging.info(f'会话 {self.session_id} 已恢复 {len(turns)} 条历史消息')
+        return len(turns)
+
+    def __len__(self):
+        return len(self.turns)
+
+    def append(self, role: str, content: Any, kind: str = 'text', tokens: Optional[int] = None) -> Turn:
+        """追加一条消息并返回对应的 Turn。"""
+        if tokens is None:
+            tokens = estimate_tokens(content) if isinstance(content, str) else 0
+        turn = Turn(role=role, content=content, kind=kind, turn_id=self._next_turn_id, tokens=tokens)
+        self._next_turn_id += 1
+        if self.turn_log:
+            try:
+                segment, offset, length = self.turn_log.append(self.session_id, turn)
+                if kind == 'audio':
+                    # 音频已写入磁盘，内存中只保留引用
+                    turn.content = AudioRef(self.turn_log, segment, offset, length)
+            except Exception as e:
+                logging.error(f'写入对话日志时出错: {e}')
+        self.turns.append(turn)
+        logging.debug(f'对话历史追加 {role}/{kind} 消息，当前共 {len(self.turns)} 条')
+        return turn
+
+    def add_user_text(self, text: str) -> Turn:
+        return self.append('user', text)
+
+    def add_assistant_text(self, text: str) -> Turn:
+        return self.append('assistant', text)
+
+    def add_user_audio(self, audio) -> Turn:
+        return self.append('user', audio, kind='audio')
+
+    def add_assistant_audio(self, audio) -> Turn:
+        return self.append('assistant', audio, kind='audio')
+
+    def window(self, k: Optional[int] = None, kinds: Optional[Iterable[str]] = None) -> List[Turn]:
+        """
+        按时间顺序返回最近 k 条消息，只从尾部遍历所需的部分。
+
+        :param k: 条数，None 表示全部。
+        :param kinds: 只返回这些类型的消息，None 表示不过滤。
+        """
+        if k is not None and k <= 0:
+            return []
+        turns = reversed(self.turns)
+        if kinds is not None:
+            kinds = set(kinds)
+            turns = (turn for turn in turns if turn.kind in kinds)
+        result = list(itertools.islice(turns, k))
+        result.reverse()
+        return result
+
+    def messages(self,
+                 max_turns: Optional[int] = None,
+                 token_budget: Optional[int] = None,
+                 kinds: Iterable[str] = ('text',)) -> List[dict]:
+        """
+        构造 OpenAI 格式的历史消息列表：从最新一轮向前取，直到达到条数上限或 token 预算。
 
+        :param max_turns: 最多使用的消息条数，None 表示不限。
+        :param token_budget: token 预算，None 表示使用默认预算。
+        :param kinds: 参与构造的消息类型。
+        """
+        if token_budget is None:
+            token_budget = self.token_budget
+        kinds = set(kinds)
+        selected = []
+        used = 0
+        for turn in reversed(self.turns):
+            if max_turns is not None and len(selected) >= max_turns:
+                break
+            if turn.kind not in kinds:
+                continue
+            if used + turn.tokens > token_budget:
+                break
+            used += turn.tokens
+            selected.append({"role": turn.role, "content": turn.content})
+        selected.reverse()
+        return selected
 
-        
-    
\ No newline at end of file
+    def clear(self):
+        """清空内存中的历史，磁盘日志保留以便会话恢复。"""
+        self.turns.clear()
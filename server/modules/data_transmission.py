@@ -1,6 +1,9 @@
 import asyncio
 import logging
 from pathlib import Path
+from data_storage import DataStorageModule
+from messages import Filler, Message, TurnTracker
+from audio_format import PCMAudio
 
 logging.basicConfig(
     filename=Path('./log.txt'),
@@ -10,11 +13,16 @@ logging.basicConfig(
 
 class DataTransmissionModule:
     def __init__(self, send_audio_queue: asyncio.Queue, send_text_queue: asyncio.Queue,
-                 history_audio_queue: asyncio.Queue, history_text_queue: asyncio.Queue):
+                 data_storage: DataStorageModule, turns: TurnTracker = None, filler_delay: float = 0.3):
+        """
+        :param filler_delay: 说完话后等待多久（秒）仍没有回复音频才播放填充音频。
+        """
         self.send_audio_queue = send_audio_queue
         self.send_text_queue = send_text_queue
-        self.history_audio_queue = history_audio_queue
-        self.history_text_queue = history_text_queue
+        self.data_storage = data_storage
+        self.turns = turns or TurnTracker()
+        self.filler_delay = filler_delay
+        self.filler_task: asyncio.Task = None
         self.websocket = None
 
         self.audio_task: asyncio.Task = None
@@ -48,34 +56,58 @@ class DataTransmissionModule:
         )
 
     async def _send_audio(self):
+        """
+        发送 TTS 音频消息，并缓存当前轮次已发送的音频；
+        收到轮次结束消息时把该轮次的完整回复存入对话历史。过期轮次的音频直接丢弃。
+        填充音频只在该轮次的回复音频开始发送之前发送，不存入缓存。
+        """
         logging.info("开始运行 _send_audio")
         audio_cache = []
+        cache_turn_id = None
+        # 当前轮次的回复音频是否已开始发送
+        replied = False
 
         try:
             while True:
-                audio_chunk = await self.send_audio_queue.get()
+                message: Message = await self.send_audio_queue.get()
                 logging.debug("从队列中获取到音频消息")
 
-                if audio_chunk is not None:
+                if self.turns.is_stale(message):
+                    logging.debug(f"丢弃过期轮次 {message.turn_id} 的音频")
+                    self.send_audio_queue.task_done()
+                    continue
+                if message.turn_id != cache_turn_id:
+                    # 新轮次开始，上一轮次未结束的缓存作废
+                    audio_cache.clear()
+                    cache_turn_id = message.turn_id
+                    replied = False
+
+                audio_chunk = message.payload
+                if isinstance(audio_chunk, Filler):
+                    # 回复音频已开始发送时不再插入填充音频
+                    if not replied:
+                        await self._send_bytes(audio_chunk.audio)
+                        logging.debug(f'成功发送填充音频，时长：{audio_chunk.audio.duration:.2f}秒')
+                elif not message.end_of_turn:
+                    # 真正的回复音频已到达，尚未播放的填充音频不再需要
+                    self.cancel_filler()
+                    replied = True
                     # 添加音频块到缓存
                     audio_cache.append(audio_chunk)
 
-                    async with self.websocket_lock:
-                        if self.websocket:
-                            try:
-                                await self.websocket.send_bytes(audio_chunk)
-                                logging.debug(f'成功发送音频，音频长度：{len(audio_chunk)}字节')
-                            except Exception as e:
-                                logging.error(f"WebSocket 发送音频错误: {e}")
+                    await self._send_bytes(audio_chunk)
+                    logging.debug(f'成功发送音频，音频长度：{len(audio_chunk)}字节')
                 else:
                     if audio_cache:
-                        merged_audio = b''.join(audio_cache)
+                        # 每段都是自包含的 WAV，存入历史时只拼接 PCM 并重新生成头部
+                        first = audio_cache[0]
+                        merged_audio = PCMAudio(b''.join(audio.pcm for audio in audio_cache), first.sample_rate, first.channels)
 
                         try:
-                            await self.history_audio_queue.put(merged_audio)
-                            logging.debug(f"将合并后的音频存储到 history_audio_queue，长度：{len(merged_audio)}字节")
+                            self.data_storage.add_assistant_audio(merged_audio)
+                            logging.debug(f"将合并后的音频存入对话历史，长度：{len(merged_audio)}字节")
                         except Exception as e:
-                            logging.error(f"存储合并后的音频到 history_audio_queue 错误: {e}")
+                            logging.error(f"存储合并后的音频到对话历史错误: {e}")
 
                         audio_cache.clear()
                     else:
@@ -89,18 +121,50 @@ class DataTransmissionModule:
         except Exception as e:
             logging.error(f"_send_audio 遇到异常: {e}")
 
+    async def _send_bytes(self, audio: PCMAudio):
+        async with self.websocket_lock:
+            if self.websocket:
+                try:
+                    await self.websocket.send_bytes(audio.to_wav())
+                except Exception as e:
+                    logging.error(f"WebSocket 发送音频错误: {e}")
+
+    def play_filler(self, turn_id: int, audio):
+        """
+        在 filler_delay 秒后把一条填充音频作为该轮次的消息放入 send_audio_queue。
+        期间该轮次的回复音频已到达、或用户开始新的轮次时不再放入；
+        经由发送队列与回复音频保持顺序，被打断时随轮次一起丢弃，不计入对话历史。
+        """
+        self.cancel_filler()
+        if audio is not None:
+            self.filler_task = asyncio.create_task(self._send_filler(turn_id, audio))
+
+    def cancel_filler(self):
+        if self.filler_task and not self.filler_task.done():
+            self.filler_task.cancel()
+            logging.debug("已取消待播放的填充音频")
+        self.filler_task = None
+
+    async def _send_filler(self, turn_id: int, audio):
+        await asyncio.sleep(self.filler_delay)
+        if turn_id != self.turns.current:
+            return
+        await self.send_audio_queue.put(Message(turn_id, -1, Filler(audio)))
+
     async def _send_text(self):
         logging.info("开始运行 _send_text")
-        text_cache = []
 
         try:
             while True:
                 text_message = await self.send_text_queue.get()
                 logging.debug(f"从队列中获取到文本消息: {text_message}")
 
-                if text_message is not None:
-                    text_cache.append(text_message)
+                # 轮次内的回复文本封装为消息，过期轮次的丢弃；状态和控制消息为 str，直接发送
+                if isinstance(text_message, Message):
+                    text_message = None if self.turns.is_stale(text_message) else text_message.payload
 
+                # 助手的文本回复由 LLM 客户端写入对话历史，这里只负责发送
+                if text_message is not None:
                     async with self.websocket_lock:
                         if self.websocket:
                             try:
@@ -108,14 +172,6 @@ class DataTransmissionModule:
                                 logging.debug(f'成功发送文本：{text_message}')
                             except Exception as e:
                                 logging.error(f"WebSocket 发送文本错误: {e}")
-                else:
-                    if text_cache:
-                        merged_text = ''.join(text_cache)
-                        await self.history_text_queue.put(merged_text)
-                        logging.debug(f"已将合并后的文本存储到 history_text_queue: {merged_text}")
-                        text_cache.clear()
-                    else:
-                        logging.debug("缓存为空，无需合并和存储。")
 
                 self.send_text_queue.task_done()
 
@@ -128,10 +184,13 @@ class DataTransmissionModule:
     async def set_websocket(self, websocket):
         """
         设置新的 WebSocket 连接。
-        立即取消任何正在进行的发送任务，并使用新的 WebSocket 重新启动它们。
+        发送任务尚未启动时只记录连接，由 run() 启动；
+        已在运行时立即取消正在进行的发送任务，并使用新的 WebSocket 重新启动它们。
         """
         async with self.websocket_lock:
             self.websocket = websocket
+        if self.audio_task is None and self.text_task is None:
+            return
 
         # 取消旧的发送任务
         if self.audio_task and not self.audio_task.done():
@@ -0,0 +1,59 @@
+import asyncio
+import itertools
+import logging
+from pathlib import Path
+from typing import List, Optional
+from audio_format import PCMAudio, WavStreamReframer
+
+logging.basicConfig(
+    filename=Path('./log.txt'),
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+DEFAULT_FILLER_PHRASES = ['嗯，', '好的，', '我想想。', '稍等一下。']
+
+
+class FillerAudio:
+    """
+    进程级的填充音频：启动时在后台通过配置的 TTS 预先合成一组简短的应答语，
+    用户说完话后先播放其中一条，掩盖 ASR、LLM 和 TTS 的等待时间。加载完成前 pick 返回 None。
+    """
+    def __init__(self, engine, phrases: Optional[List[str]] = None, sample_rate: int = 16000, timeout: float = 10.0):
+        """
+        :param engine: BaseTTS 实例，用于合成填充音频。
+        :param phrases: 应答语列表，None 时使用 DEFAULT_FILLER_PHRASES。
+        :param sample_rate: TTS 返回裸 PCM 时使用的采样率。
+        :param timeout: 单条应答语的合成超时（秒）。
+        """
+        self.engine = engine
+        self.phrases = phrases or DEFAULT_FILLER_PHRASES
+        self.sample_rate = sample_rate
+        self.timeout = timeout
+        self.clips: List[PCMAudio] = []
+        self._order = None
+
+    async def _synthesize(self, phrase: str) -> Optional[PCMAudio]:
+        reframer = WavStreamReframer(None, self.sample_rate)
+        async for data in self.engine.stream(phrase):
+            reframer.feed(data)
+        return reframer.flush()
+
+    async def _load_one(self, phrase: str) -> Optional[PCMAudio]:
+        try:
+            return await asyncio.wait_for(self._synthesize(phrase), timeout=self.timeout)
+        except Exception as e:
+            logging.error(f'合成填充音频 "{phrase}" 失败: {e}')
+            return None
+
+    async def load(self):
+        """并发合成所有应答语，总耗时不超过单条的超时；合成失败的跳过，不影响服务启动。"""
+        results = await asyncio.gather(*(self._load_one(phrase) for phrase in self.phrases))
+        clips = [clip for clip in results if clip is not None]
+        self.clips = clips
+        self._order = itertools.cycle(clips) if clips else None
+        logging.info(f'填充音频已加载 {len(clips)}/{len(self.phrases)} 条')
+
+    def pick(self) -> Optional[PCMAudio]:
+        """依次返回一条填充音频，没有可用的音频时返回 None。"""
+        return next(self._order) if self._order else None
@@ -0,0 +1,92 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Optional
+
+
+@dataclass
+class Message:
+    """
+    流水线各阶段之间传递的消息。
+
+    turn_id: 所属轮次，用户每开始说一句话递增一次
+    seq: 同一轮次内该阶段输出的序号，从 0 开始
+    payload: 文本、音频等数据，轮次结束消息为 None
+    end_of_turn: 是否为该轮次的结束消息
+    """
+    turn_id: int
+    seq: int
+    payload: Any = None
+    end_of_turn: bool = False
+
+    def merge(self, other):
+        """与同一轮次的后续文本消息合并，无法合并时返回 None。"""
+        if (isinstance(other, Message) and other.turn_id == self.turn_id
+                and not self.end_of_turn and not other.end_of_turn
+                and isinstance(self.payload, str) and isinstance(other.payload, str)):
+            return Message(self.turn_id, self.seq, self.payload + other.payload)
+        return None
+
+
+class TurnTracker:
+    """
+    会话级的轮次计数器。
+    用户开始说话时开启新轮次，之前轮次的消息都视为过期，各阶段按 turn_id 丢弃，无需清空队列。
+    """
+    def __init__(self):
+        self.current = 0
+
+    def begin(self) -> int:
+        """开启新轮次并返回其 ID。"""
+        self.current += 1
+        return self.current
+
+    def is_stale(self, message: Message) -> bool:
+        return message.turn_id != self.current
+
+
+class TurnChannel:
+    """
+    把一个轮次的输出封装为 Message 放入下游队列，自动编号。
+    put(None) 表示该轮次结束，因此可以直接作为 text_queue 传给 LLM 客户端。
+    """
+    def __init__(self, queue: asyncio.Queue, turn_id: int):
+        self.queue = queue
+        self.turn_id = turn_id
+        self.seq = 0
+
+    def _wrap(self, payload) -> Message:
+        message = Message(self.turn_id, self.seq, payload, end_of_turn=payload is None)
+        self.seq += 1
+        return message
+
+    async def put(self, payload):
+        await self.queue.put(self._wrap(payload))
+
+    def put_nowait(self, payload):
+        self.queue.put_nowait(self._wrap(payload))
+
+    async def end(self):
+        """放入该轮次的结束消息。"""
+        await self.put(None)
+
+
+@dataclass
+class Utterance:
+    """
+    检测到的一句话。
+
+    audio: 整句音频（PCMAudio）
+    transcript: 流式识别的最终结果任务，未使用流式识别时为 None
+    """
+    audio: Any
+    transcript: Optional[asyncio.Task] = None
+
+
+@dataclass
+class Filler:
+    """
+    填充音频消息的载荷。
+
+    audio: 应答语音频（PCMAudio），与回复音频经同一发送队列按顺序发送，不计入对话历史
+    """
+    audio: Any
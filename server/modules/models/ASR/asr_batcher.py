@@ -0,0 +1,137 @@
+import asyncio
+import logging
+from pathlib import Path
+from typing import Optional
+
+current_dir = Path(__file__).resolve().parent
+log_dir = current_dir.parents[2]
+log_file_path = log_dir / 'log.txt'
+logging.basicConfig(
+    filename=log_file_path,
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+
+class ASRBatcher:
+    """
+    跨会话的 ASR 微批调度器。
+    在 window_ms 时间窗内收集所有会话提交的整句音频，按 (服务地址, 语言) 分组后以一次多文件请求识别，
+    识别结果按顺序返回给各自的调用方。批量已满时立即发送；各批请求并发进行，不阻塞下一个时间窗的收集。
+    提交音频的 ASR 客户端需提供 url 属性和 post_batch(audios, lang) 方法，如 SenseASR。
+    """
+    def __init__(self, window_ms: Optional[float] = None, max_batch: int = 8):
+        """
+        :param window_ms: 收集音频的时间窗（毫秒），None 表示不合批，客户端直接请求。
+        :param max_batch: 单次请求最多包含的音频数，达到后立即发送。
+        """
+        self.configure(window_ms, max_batch)
+        self._pending = []
+        self._wakeup = None
+        self._full = None
+        self._task = None
+        self._requests = set()
+        self.batches = 0
+        self.items = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window is not None
+
+    def configure(self, window_ms: Optional[float] = None, max_batch: int = 8):
+        self.window = window_ms / 1000 if window_ms is not None else None
+        self.max_batch = max_batch
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._full = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+            logging.info(f'ASR 微批调度器已启动，时间窗: {self.window * 1000:.1f} 毫秒，最大批量: {self.max_batch}')
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for request in list(self._requests):
+            request.cancel()
+        await asyncio.gather(*self._requests, return_exceptions=True)
+        for _, _, _, future in self._pending:
+            if not future.done():
+                future.cancel()
+        self._pending.clear()
+
+    async def transcribe(self, asr, audio: bytes, lang: str = "auto") -> str:
+        """
+        提交一段 WAV 音频，等待所在批次识别完成后返回识别文本。
+
+        :param asr: 提交音频的 ASR 客户端，用于确定服务地址并发送批量请求。
+        """
+        if self._task is None:
+            self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((asr, audio, lang, future))
+        self._wakeup.set()
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+        return await future
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            # 等待时间窗结束或批量已满
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.window)
+            except asyncio.TimeoutError:
+                pass
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            if len(self._pending) < self.max_batch:
+                self._full.clear()
+            if not self._pending:
+                self._wakeup.clear()
+
+            groups = {}
+            for item in batch:
+                asr, _, lang, future = item
+                # 排队期间调用方已取消的音频不再发送
+                if not future.done():
+                    groups.setdefault((asr.url, lang), []).append(item)
+            for group in groups.values():
+                request = asyncio.create_task(self._dispatch(group))
+                self._requests.add(request)
+                request.add_done_callback(self._requests.discard)
+
+    async def _dispatch(self, group):
+        asr, _, lang, _ = group[0]
+        futures = [future for _, _, _, future in group]
+        try:
+            texts = await asr.post_batch([audio for _, audio, _, _ in group], lang)
+        except asyncio.CancelledError:
+            # 调度器停止时请求被取消，等待结果的调用方随之取消，不会一直等待
+            for future in futures:
+                future.cancel()
+            raise
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.items += len(group)
+        logging.info(f'ASR 批量识别 {len(group)} 条音频')
+        for future, text in zip(futures, texts):
+            if not future.done():
+                future.set_result(text)
+
+    def stats(self) -> dict:
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'mean_batch': round(self.items / self.batches, 2) if self.batches else 0.0,
+            'pending': len(self._pending),
+        }
+
+
+# 所有 ASR 客户端共享的微批调度器，启动时按配置开启
+asr_batcher = ASRBatcher()
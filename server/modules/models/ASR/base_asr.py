@@ -1,4 +1,44 @@
 from abc import ABC, abstractmethod
+from audio_format import wav_header
+
+
+class ASRStream(ABC):
+    """
+    一次流式识别会话：说话期间不断追加音频，结束时返回最终识别结果。
+    on_partial 为可选的协程函数，收到中间结果时以识别文本为参数调用。
+    """
+    def __init__(self, on_partial=None):
+        self.on_partial = on_partial
+
+    @abstractmethod
+    def feed(self, pcm):
+        """追加一段 16 位 PCM 音频，不阻塞调用方。"""
+        pass
+
+    @abstractmethod
+    async def finish(self) -> str:
+        """音频结束，等待并返回最终识别结果。"""
+        pass
+
+    async def cancel(self):
+        """放弃本次识别。"""
+        pass
+
+
+class BufferedASRStream(ASRStream):
+    """不支持流式识别的 ASR 的默认实现：缓存音频，结束时整句识别，没有中间结果。"""
+    def __init__(self, asr: 'BaseASR', sample_rate: int, lang: str = "auto", on_partial=None):
+        super().__init__(on_partial)
+        self.asr = asr
+        self.sample_rate = sample_rate
+        self.lang = lang
+        self.pcm = bytearray()
+
+    def feed(self, pcm):
+        self.pcm.extend(pcm)
+
+    async def finish(self) -> str:
+        return await self.asr.post_audio(wav_header(len(self.pcm), self.sample_rate) + bytes(self.pcm), self.lang)
 
 
 class BaseASR(ABC):
@@ -6,5 +46,9 @@ class BaseASR(ABC):
     async def post_audio(self, combined_audio: bytes, lang: str = "auto") -> str:
         pass
 
+    def open_stream(self, sample_rate: int = 16000, lang: str = "auto", on_partial=None) -> ASRStream:
+        """开始一次流式识别，默认退化为整句识别，支持流式的 ASR 重写此方法。"""
+        return BufferedASRStream(self, sample_rate, lang, on_partial)
+
     async def close(self):
-        pass
\ No newline at end of file
+        pass
@@ -1,6 +1,10 @@
 import aiohttp
 import logging
+from typing import List
+from models.ASR.asr_batcher import asr_batcher
 from models.ASR.base_asr import BaseASR
+from models.http_client import http_clients
+from models.router import routers
 import logging
 from pathlib import Path
 
@@ -15,33 +19,57 @@ logging.basicConfig(
 
 
 class SenseASR(BaseASR):
-    def __init__(self):
-        self.session = aiohttp.ClientSession()
+    def __init__(self, url: str = 'XXX/api/v1/asr'):
+        self.url = url
+
+    @property
+    def session(self):
+        # 使用进程级共享会话，复用连接
+        return http_clients.session('asr')
+
+    async def post_batch(self, audios: List[bytes], lang: str = "auto") -> List[str]:
+        """
+        以一次多文件请求识别多段音频，按顺序返回各段的转录文本。
+        """
+        keys = [f'audio{i}' for i in range(len(audios))]
+        form = aiohttp.FormData()
+        for key, audio in zip(keys, audios):
+            form.add_field('files', audio, filename=f'{key}.wav', content_type='audio/wav')
+        form.add_field('keys', ','.join(keys))
+        form.add_field('lang', lang)
+
+        async with routers.route('asr', self.url) as route:
+            async with self.session.post(route.url, data=form) as resp:
+                if resp.status != 200:
+                    error_text = await resp.text()
+                    raise Exception(f"ASR API 错误 {resp.status}: {error_text}")
+                # 以响应头的到达时间作为该副本的延迟，不含读取响应体
+                route.first_byte()
+                json_resp = await resp.json()
+
+        results = json_resp.get("result") or []
+        if not results:
+            logging.warning("ASR API 返回结果为空或格式不正确。")
+        # 优先按 key 对应结果，服务端未返回 key 时按顺序对应
+        by_key = {result.get("key"): result for result in results}
+        texts = []
+        for i, key in enumerate(keys):
+            result = by_key.get(key) or (results[i] if i < len(results) else {})
+            texts.append(result.get("text", "").strip())
+        return texts
 
     async def post_audio(self, combined_audio: bytes, lang: str = "auto") -> str:
         """
         发送音频到Sense ASR API并返回转录文本。
+        开启了 asr_batcher 时与其他会话同一时间窗内的音频合并为一次请求。
         """
-        url = 'XXX/api/v1/asr'
         try:
-            form = aiohttp.FormData()
-            form.add_field('files', combined_audio, filename='audio.wav', content_type='audio/wav')
-            form.add_field('keys', 'audio.wav')
-            form.add_field('lang', lang)
-
-            async with self.session.post(url, data=form) as resp:
-                if resp.status == 200:
-                    json_resp = await resp.json()
-                    if "result" in json_resp and json_resp["result"]:
-                        transcribed_text = json_resp["result"][0].get("text", "").strip()
-                        logging.info(f"ASR 回复文本: {transcribed_text}")
-                        return transcribed_text
-                    else:
-                        logging.warning("ASR API 返回结果为空或格式不正确。")
-                        return ""
-                else:
-                    error_text = await resp.text()
-                    raise Exception(f"ASR API 错误 {resp.status}: {error_text}")
+            if asr_batcher.enabled:
+                transcribed_text = await asr_batcher.transcribe(self, combined_audio, lang)
+            else:
+                transcribed_text = (await self.post_batch([combined_audio], lang))[0]
+            logging.info(f"ASR 回复文本: {transcribed_text}")
+            return transcribed_text
         except Exception as e:
             logging.error(f"SenseASR.post_audio 错误: {e}")
             return ""
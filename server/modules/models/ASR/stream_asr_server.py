@@ -0,0 +1,93 @@
+"""
+本地流式 ASR 替身服务，实现 WebSocketStreamingASR 使用的协议，便于在没有真实流式 ASR 时联调。
+- 每收到 partial_interval 秒的音频返回一次中间结果；
+- 收到 {"type": "end"} 后返回最终结果：配置了 --batch-url 时把整句音频转发给 SenseVoice 等整句 ASR 识别，
+  否则返回按音频时长生成的占位文本。
+占位文本只取决于音频时长（向上取整到秒），同一秒内的中间结果保持不变，最终结果与最后一次中间结果一致，
+可用于测试和联调投机执行。
+
+运行：python stream_asr_server.py --port 8765 [--batch-url http://host:port/api/v1/asr]
+"""
+import argparse
+import json
+import math
+import logging
+import aiohttp
+from aiohttp import web
+from audio_format import wav_header
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def placeholder_text(pcm_size: int, sample_rate: int) -> str:
+    return f'<{math.ceil(pcm_size / (2 * sample_rate))}秒语音>'
+
+
+async def recognize(app: web.Application, pcm: bytes, sample_rate: int, lang: str) -> str:
+    batch_url = app['batch_url']
+    if not batch_url:
+        return placeholder_text(len(pcm), sample_rate)
+    form = aiohttp.FormData()
+    form.add_field('files', wav_header(len(pcm), sample_rate) + pcm, filename='audio.wav', content_type='audio/wav')
+    form.add_field('keys', 'audio.wav')
+    form.add_field('lang', lang)
+    async with app['session'].post(batch_url, data=form) as resp:
+        resp.raise_for_status()
+        result = (await resp.json()).get('result') or [{}]
+        return result[0].get('text', '')
+
+
+async def handle_stream(request: web.Request) -> web.WebSocketResponse:
+    ws = web.WebSocketResponse()
+    await ws.prepare(request)
+    sample_rate = int(request.query.get('sample_rate', 16000))
+    lang = request.query.get('lang', 'auto')
+    partial_bytes = int(request.app['partial_interval'] * sample_rate) * 2
+
+    pcm = bytearray()
+    next_partial = partial_bytes
+    async for msg in ws:
+        if msg.type == aiohttp.WSMsgType.BINARY:
+            pcm.extend(msg.data)
+            if len(pcm) >= next_partial:
+                next_partial = len(pcm) + partial_bytes
+                await ws.send_str(json.dumps({'text': placeholder_text(len(pcm), sample_rate), 'final': False}, ensure_ascii=False))
+        elif msg.type == aiohttp.WSMsgType.TEXT and json.loads(msg.data).get('type') == 'end':
+            try:
+                text = await recognize(request.app, bytes(pcm), sample_rate, lang)
+            except Exception as e:
+                logging.error(f'整句识别失败: {e}')
+                text = ''
+            await ws.send_str(json.dumps({'text': text, 'final': True}, ensure_ascii=False))
+            logging.info(f'识别完成，音频 {len(pcm)} 字节: {text}')
+            break
+    await ws.close()
+    return ws
+
+
+async def on_startup(app: web.Application):
+    app['session'] = aiohttp.ClientSession()
+
+
+async def on_cleanup(app: web.Application):
+    await app['session'].close()
+
+
+def create_app(batch_url: str = None, partial_interval: float = 0.5) -> web.Application:
+    app = web.Application()
+    app['batch_url'] = batch_url
+    app['partial_interval'] = partial_interval
+    app.router.add_get('/asr/stream', handle_stream)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='本地流式 ASR 替身服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--batch-url', default=None, help='整句 ASR 地址，如 SenseVoice 的 /api/v1/asr')
+    parser.add_argument('--partial-interval', type=float, default=0.5, help='中间结果间隔（秒）')
+    args = parser.parse_args()
+    web.run_app(create_app(args.batch_url, args.partial_interval), host=args.host, port=args.port)
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import logging
+from pathlib import Path
+import aiohttp
+from audio_format import WavStreamReframer
+from models.ASR.base_asr import ASRStream, BaseASR
+from models.http_client import http_clients
+from models.router import routers
+
+current_dir = Path(__file__).resolve().parent
+log_dir = current_dir.parents[2]
+log_file_path = log_dir / 'log.txt'
+logging.basicConfig(
+    filename=log_file_path,
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+
+class WebSocketASRStream(ASRStream):
+    """
+    基于 WebSocket 的流式识别会话，协议：
+    - 连接 URL 携带 sample_rate 和 lang 查询参数；
+    - 客户端以二进制消息发送 16 位 PCM，结束时发送文本消息 {"type": "end"}；
+    - 服务端以文本消息返回 {"text": "...", "final": false} 的中间结果，最终结果 final 为 true。
+    """
+    def __init__(self, url: str, sample_rate: int, lang: str = "auto", on_partial=None, final_timeout: float = 10.0):
+        super().__init__(on_partial)
+        self.url = url
+        self.sample_rate = sample_rate
+        self.lang = lang
+        self.final_timeout = final_timeout
+        self._audio = asyncio.Queue()
+        self._final = asyncio.get_running_loop().create_future()
+        self._task = asyncio.create_task(self._run())
+
+    def feed(self, pcm):
+        self._audio.put_nowait(bytes(pcm))
+
+    async def finish(self) -> str:
+        self._audio.put_nowait(None)
+        try:
+            return await asyncio.wait_for(asyncio.shield(self._final), timeout=self.final_timeout)
+        finally:
+            self._task.cancel()
+
+    async def cancel(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+    def _set_final(self, text: str = None, error: Exception = None):
+        if self._final.done():
+            return
+        if error is not None:
+            self._final.set_exception(error)
+        else:
+            self._final.set_result(text)
+
+    async def _read(self, ws):
+        async for msg in ws:
+            if msg.type != aiohttp.WSMsgType.TEXT:
+                continue
+            data = json.loads(msg.data)
+            text = data.get("text", "").strip()
+            if data.get("final"):
+                self._set_final(text)
+                return
+            if self.on_partial and text:
+                try:
+                    await self.on_partial(text)
+                except Exception as e:
+                    logging.error(f"处理 ASR 中间结果时出错: {e}")
+        self._set_final(error=ConnectionError("流式 ASR 连接在返回最终结果前关闭"))
+
+    async def _run(self):
+        reader = None
+        try:
+            async with routers.route('asr_stream', self.url) as route:
+                session = http_clients.session('asr')
+                params = {'sample_rate': str(self.sample_rate), 'lang': self.lang}
+                async with session.ws_connect(route.url, params=params) as ws:
+                    # 连接时长取决于用户说话的长度，以握手完成的时间作为该副本的延迟
+                    route.first_byte()
+                    reader = asyncio.create_task(self._read(ws))
+                    while (pcm := await self._audio.get()) is not None:
+                        await ws.send_bytes(pcm)
+                    await ws.send_str(json.dumps({"type": "end"}))
+                    await reader
+        except asyncio.CancelledError:
+            if not self._final.done():
+                self._final.cancel()
+            raise
+        except Exception as e:
+            logging.error(f"流式 ASR 出错: {e}")
+            self._set_final(error=e)
+        finally:
+            if reader is not None and not reader.done():
+                reader.cancel()
+
+
+class WebSocketStreamingASR(BaseASR):
+    """
+    流式 ASR 客户端：说话期间通过 WebSocket 持续发送音频，服务端边听边返回中间结果。
+    本地调试可使用 models/ASR/stream_asr_server.py 作为替身服务。
+    """
+    def __init__(self, url: str = 'ws://127.0.0.1:8765/asr/stream', final_timeout: float = 10.0):
+        """
+        :param url: 流式识别服务的 WebSocket 地址。
+        :param final_timeout: 音频结束后等待最终结果的超时时间（秒）。
+        """
+        self.url = url
+        self.final_timeout = final_timeout
+
+    def open_stream(self, sample_rate: int = 16000, lang: str = "auto", on_partial=None) -> ASRStream:
+        return WebSocketASRStream(self.url, sample_rate, lang, on_partial, self.final_timeout)
+
+    async def post_audio(self, combined_audio: bytes, lang: str = "auto") -> str:
+        """整句识别：把 WAV 音频一次送入流式会话。"""
+        reframer = WavStreamReframer(None)
+        reframer.feed(combined_audio)
+        audio = reframer.flush()
+        if audio is None:
+            return ""
+        stream = self.open_stream(audio.sample_rate, lang)
+        stream.feed(audio.pcm)
+        try:
+            return await stream.finish()
+        except Exception as e:
+            logging.error(f"WebSocketStreamingASR.post_audio 错误: {e}")
+            return ""
@@ -1,10 +1,12 @@
 from abc import ABC, abstractmethod
 import asyncio
+from data_storage import DataStorageModule
 
 
 class BaseLLM(ABC):
     @abstractmethod
-    async def post_text(self, text: str, text_queue: asyncio.Queue, history_queue: asyncio.Queue):
+    async def post_text(self, text: str, text_queue: asyncio.Queue, history: DataStorageModule):
+        """流式放入回复文本，回复结束（包括出错）时放入 None 作为结束标志。"""
         pass
 
     async def close(self):
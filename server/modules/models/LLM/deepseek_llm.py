@@ -1,6 +1,9 @@
 import aiohttp
-import json
 from models.LLM.base_llm import BaseLLM
+from models.LLM.sse import iter_deltas
+from models.http_client import http_clients
+from models.router import routers
+from data_storage import DataStorageModule
 import asyncio
 from pathlib import Path
 import logging
@@ -15,50 +18,45 @@ logging.basicConfig(
 
 class DeepSeekLLM(BaseLLM):
     def __init__(self):
-        self.session = aiohttp.ClientSession()
         self.api_key = ""
         self.base_url = "XXXX"
 
-    async def post_text(self, text: str, text_queue: asyncio.Queue, history_queue: asyncio.Queue, max_history: int = 0):
+    @property
+    def session(self):
+        # 使用进程级共享会话，复用连接
+        return http_clients.session('llm')
+
+    @staticmethod
+    def build_messages(text: str, history: DataStorageModule, max_history: int = 0) -> list:
+        """
+        构建请求的消息列表：系统提示、历史对话和当前用户消息。
+        max_history 为 0 时不限轮数，只受 history 的 token 预算限制。
+        """
+        messages = [{"role": "system", "content": "You are a helpful assistant."}]
+        # 添加历史消息到messages列表（每轮包括用户和助手的消息）
+        messages.extend(history.messages(max_turns=(2 * max_history) or None))
+        # 添加当前用户的消息
+        messages.append({"role": "user", "content": text})
+        return messages
+
+    async def post_text(self, text: str, text_queue: asyncio.Queue, history: DataStorageModule, max_history: int = 0):
         """
         发送文本到DeepSeek LLM API并将生成的文本块加入队列。
-        支持多轮对话，通过history_queue维护对话历史。
+        支持多轮对话，通过history维护对话历史。
 
         参数:
             text (str): 用户输入的文本。
             text_queue (asyncio.Queue): 用于存储LLM回复的队列。
-            history_queue (asyncio.Queue): 用于存储对话历史的队列。
-            max_history (int): 最大使用的历史对话轮数。
+            history (DataStorageModule): 会话的对话历史。
+            max_history (int): 最大使用的历史对话轮数，0 表示不限，实际条数还受 history 的 token 预算限制。
         """
-        url = f"{self.base_url}/chat/completions"
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
 
         # 构建消息列表，包括历史对话
-        messages = [{"role": "system", "content": "You are a helpful assistant."}]
-        
-        # 提取并维护history_queue的原始状态
-        temp_history = []
-        while not history_queue.empty():
-            msg = await history_queue.get()
-            temp_history.append(msg)
-        
-        # 重新放回history_queue
-        for msg in temp_history:
-            await history_queue.put(msg)
-        
-        # 计算实际使用的历史轮数（每轮包括用户和助手的消息）
-        actual_history = temp_history[-2 * max_history:]  # 每轮两条消息
-        
-        # 添加历史消息到messages列表
-        for i, msg in enumerate(actual_history):
-            role = "user" if i % 2 == 0 else "assistant"
-            messages.append({"role": role, "content": msg})
-        
-        # 添加当前用户的消息
-        messages.append({"role": "user", "content": text})
+        messages = self.build_messages(text, history, max_history)
 
         payload = {
             "model": "lg-people-hospital",
@@ -68,41 +66,33 @@ class DeepSeekLLM(BaseLLM):
 
         try:
             logging.info("开始请求LLM")
-            async with self.session.post(url, json=payload, headers=headers) as resp:
-                if resp.status == 200:
-                    logging.info("LLM 请求成功")
-                    response_text = ""
-                    async for line in resp.content:
-                        line_decoded = line.decode('utf-8').strip()
-
-                        if line_decoded == "data: [DONE]":
-                            logging.info("收到所有LLM回复文本")
-                            break
-
-                        if line_decoded.startswith("data: "):
-                            json_data = line_decoded[6:]
-                            try:
-                                json_resp = json.loads(json_data)
-                                choices = json_resp.get("choices", [])
-                                for choice in choices:
-                                    if content := choice.get("delta", {}).get("content"):
-                                        chunk = content.strip()
-                                        if chunk:
-                                            response_text += chunk
-                                            await text_queue.put(chunk)
-                                            logging.info(f"LLM 回复文本: {chunk}")
-                            except json.JSONDecodeError as parse_exception:
-                                logging.error(f"SSE 解析错误: {parse_exception}")
+            async with routers.route('llm', self.base_url) as route:
+                async with self.session.post(f"{route.url}/chat/completions", json=payload, headers=headers) as resp:
+                    if resp.status == 200:
+                        logging.info("LLM 请求成功")
+                        # 按字节块增量解析 SSE，文本块原样放入队列，保留英文单词之间的空格
+                        response_parts = []
+                        async for chunk in iter_deltas(resp):
+                            # 以第一个文本块的到达时间作为该副本的延迟
+                            route.first_byte()
+                            response_parts.append(chunk)
+                            await text_queue.put(chunk)
+                            logging.debug(f"LLM 回复文本: {chunk}")
+                        response_text = "".join(response_parts)
+                        logging.info("收到所有LLM回复文本")
                     
-                    # 将用户输入和LLM回复加入history_queue
-                    await history_queue.put(text)
-                    await history_queue.put(response_text)
-                else:
-                    error_text = await resp.text()
-                    raise Exception(f"DeepSeek LLM API 错误 {resp.status}: {error_text}")
+                        # 将用户输入和LLM回复加入对话历史
+                        history.add_user_text(text)
+                        history.add_assistant_text(response_text)
+                    else:
+                        error_text = await resp.text()
+                        raise Exception(f"DeepSeek LLM API 错误 {resp.status}: {error_text}")
         except Exception as e:
             logging.error(f"DeepSeekLLM.post_text 错误: {e}")
 
+        # 放入结束标志，文本处理模块据此输出剩余文本
+        await text_queue.put(None)
+
     async def reset(self):
         pass
 
@@ -112,7 +102,7 @@ if __name__ == '__main__':
         async with aiohttp.ClientSession() as session:
             llm = DeepSeekLLM(session)
             text_queue = asyncio.Queue()
-            history_queue = asyncio.Queue()
+            history = DataStorageModule()
 
             user_inputs = [
                 "你好，LLM！",
@@ -121,12 +111,13 @@ if __name__ == '__main__':
             ]
 
             for user_input in user_inputs:
-                await llm.post_text(user_input, text_queue, history_queue, max_history=5)
+                await llm.post_text(user_input, text_queue, history, max_history=5)
                 # 处理 LLM 的回复
                 response = ""
                 while not text_queue.empty():
                     chunk = await text_queue.get()
-                    response += chunk
+                    if chunk is not None:
+                        response += chunk
                 print(f"用户: {user_input}")
                 print(f"LLM: {response}")
 
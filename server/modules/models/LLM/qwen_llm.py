@@ -3,6 +3,7 @@ from typing import List, Dict, Any
 from openai import OpenAI
 from typing_extensions import TypedDict, NotRequired, Required
 from models.LLM.base_llm import BaseLLM
+from data_storage import DataStorageModule
 import logging
 from pathlib import Path
 
@@ -56,11 +57,13 @@ class QwenLLM(BaseLLM):
         except Exception as e:
             return "<|wrong data|>"
     
-    async def post_text(self, text: str, text_queue: asyncio.Queue, history_queue: asyncio.Queue):
+    async def post_text(self, text: str, text_queue: asyncio.Queue, history: DataStorageModule):
         system_prompt = 'You are a helpful assistant.'
         logging.info('开始发送qwen llm请求...')
-        response_text = self.request_qwen(text, system_prompt=system_prompt, history=[])
+        response_text = self.request_qwen(text, system_prompt=system_prompt, history=history.messages())
         logging.info(f'成功得到qwen llm请求结果：{response_text}')
+        history.add_user_text(text)
+        history.add_assistant_text(response_text)
         # 将响应文本按字符逐个放入队列中
         for char in response_text:
             await text_queue.put(char)
@@ -86,7 +89,7 @@ if __name__ == '__main__':
                 print(f"第 {count} 个取出来的值为: {char}")
         
         await asyncio.gather(
-            qwen_llm.post_text("Hello, Qwen!", text_queue),
+            qwen_llm.post_text("Hello, Qwen!", text_queue, DataStorageModule()),
             consume_queue()
         )
 
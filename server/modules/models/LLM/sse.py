@@ -0,0 +1,123 @@
+import json
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, List
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+current_dir = Path(__file__).resolve().parent
+log_dir = current_dir.parents[2]
+log_file_path = log_dir / 'log.txt'
+logging.basicConfig(
+    filename=log_file_path,
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+
+def loads(data):
+    """解析 JSON，安装了 orjson 时使用 orjson。解析失败抛出 ValueError。"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+@dataclass
+class SSEEvent:
+    """
+    一个 SSE 事件。
+
+    event: 事件类型，未指定时为 'message'
+    data: 各 data 行以换行连接后的原始字节
+    """
+    event: str
+    data: bytes
+
+
+class SSEParser:
+    """
+    增量 SSE 解析器，直接处理网络读到的字节块，不要求按行读取。
+    支持多行 data、\\r\\n 换行，注释行（包括 ': keep-alive' 心跳）直接忽略；
+    id 和 retry 字段不使用。
+    """
+    def __init__(self):
+        self._buffer = bytearray()
+        self._event = None
+        self._data = []
+
+    def feed(self, chunk: bytes) -> List[SSEEvent]:
+        """追加一块字节，返回其中已完整的事件。"""
+        self._buffer.extend(chunk)
+        events = []
+        start = 0
+        while (end := self._buffer.find(b'\n', start)) >= 0:
+            line = bytes(self._buffer[start:end])
+            start = end + 1
+            if line.endswith(b'\r'):
+                line = line[:-1]
+            self._process_line(line, events)
+        # 不完整的最后一行留到下一块
+        del self._buffer[:start]
+        return events
+
+    def flush(self) -> List[SSEEvent]:
+        """流结束时返回缺少结尾空行的最后一个事件。"""
+        events = []
+        if self._buffer:
+            line = bytes(self._buffer).rstrip(b'\r')
+            self._buffer.clear()
+            self._process_line(line, events)
+        self._dispatch(events)
+        return events
+
+    def _process_line(self, line: bytes, events: List[SSEEvent]):
+        if not line:
+            self._dispatch(events)
+            return
+        if line.startswith(b':'):
+            return
+        field, _, value = line.partition(b':')
+        if value.startswith(b' '):
+            value = value[1:]
+        if field == b'data':
+            self._data.append(value)
+        elif field == b'event':
+            self._event = value.decode('utf-8')
+
+    def _dispatch(self, events: List[SSEEvent]):
+        if self._data:
+            data = self._data[0] if len(self._data) == 1 else b'\n'.join(self._data)
+            events.append(SSEEvent(self._event or 'message', data))
+        self._event = None
+        self._data = []
+
+
+async def iter_events(response) -> AsyncIterator[SSEEvent]:
+    """按网络到达的字节块读取 aiohttp 响应，逐个返回 SSE 事件。"""
+    parser = SSEParser()
+    async for chunk in response.content.iter_any():
+        for event in parser.feed(chunk):
+            yield event
+    for event in parser.flush():
+        yield event
+
+
+async def iter_deltas(response) -> AsyncIterator[str]:
+    """
+    逐个返回 OpenAI 兼容流式接口中 choices[].delta.content 的文本块，原样保留空白，收到 [DONE] 时结束。
+    """
+    async for event in iter_events(response):
+        if event.data == b'[DONE]':
+            return
+        try:
+            json_resp = loads(event.data)
+        except ValueError as parse_exception:
+            logging.error(f"SSE 解析错误: {parse_exception}")
+            continue
+        for choice in json_resp.get("choices") or ():
+            if content := (choice.get("delta") or {}).get("content"):
+                yield content
@@ -8,7 +8,9 @@ import io
 import logging
 from pathlib import Path
 from transformers import AutoProcessor
+from models.LLM.sse import iter_deltas
 from models.MM_A2T.base_mm import BaseMM
+from data_storage import DataStorageModule
 
 # 配置日志记录
 current_dir = Path(__file__).resolve().parent
@@ -87,7 +89,7 @@ class Qwen2AudioMM(BaseMM):
         :param new_message: 新的用户消息，包含文本和音频。
         :return: 构建好的payload字典。
         """
-        # 从history_queue重建对话历史
+        # 从对话历史重建消息列表
         messages = []
         for msg in conversation:
             if isinstance(msg["content"], list):
@@ -135,19 +137,17 @@ class Qwen2AudioMM(BaseMM):
         }
         return payload
         
-    async def post_text(self, wav_path, text_queue: asyncio.Queue, history_queue: asyncio.Queue, max_history_num=0):
+    async def post_text(self, wav_path, text_queue: asyncio.Queue, history: DataStorageModule, max_history_num=0):
         """
-        使用构建的payload与模型进行通信，处理模型的响应并更新队列。
+        使用构建的payload与模型进行通信，处理模型的响应并更新对话历史。
 
         :param new_message: 新的用户消息。
         :param text_queue: 用于存储模型响应文本的异步队列。
-        :param history_queue: 用于存储对话历史的异步队列，最多保留最新的max_history_num条记录。
-        :param max_history_num: 历史记录的最大数量，默认为0。
+        :param history: 会话的对话历史，最多使用最新的max_history_num条记录。
+        :param max_history_num: 历史记录的最大数量，默认为0，表示不限。
         """
-        # 从history_queue重建对话历史
-        conversation = []
-        while not history_queue.empty():
-            conversation.append(history_queue.get_nowait())
+        # 从对话历史重建对话
+        conversation = history.messages(max_turns=max_history_num or None, kinds=('text', 'qwen2_audio'))
         
         # 构建payload
         # new_message = [{"type": "audio", "audio_url": wav_path}, {"type": "text", "text": "这段音频内容是什么？"}]
@@ -168,33 +168,18 @@ class Qwen2AudioMM(BaseMM):
                 start_time = time.time()
                 first_few = 10  # 控制打印前几个回复的时间
                 count = 0
-                async for line in response.content:
-                    if not line:
-                        continue
-                    decoded_line = line.decode('utf-8').strip()
-                    if decoded_line.startswith("data: "):
-                        decoded_line = decoded_line[len("data: "):]
-                    if decoded_line == "[DONE]":
-                        break
-                    try:
-                        json_data = json.loads(decoded_line)
-                        content = json_data.get("choices", [{}])[0].get("delta", {}).get("content", "")
-                        if content:
-                            result += content
-                            count += 1
-                            await text_queue.put(content)
-                            if count <= first_few:
-                                elapsed_time = time.time() - start_time
-                                logging.info(f"从发送请求到第{count}个回复消耗时间: {elapsed_time:.4f} 秒")
-                    except json.JSONDecodeError:
-                        logging.error(f"无法解析的JSON: {decoded_line}")
+                async for content in iter_deltas(response):
+                    result += content
+                    count += 1
+                    await text_queue.put(content)
+                    if count <= first_few:
+                        elapsed_time = time.time() - start_time
+                        logging.info(f"从发送请求到第{count}个回复消耗时间: {elapsed_time:.4f} 秒")
                 # await text_queue.put(result)
-                # 更新history_queue
-                conversation.append({"role": "assistant", "content": result})
-                if max_history_num > 0:
-                    conversation = conversation[-max_history_num:]
-                for msg in conversation:
-                    await history_queue.put(msg)
+                # 更新对话历史
+                history.append('user', new_message, kind='qwen2_audio')
+                history.add_assistant_text(result)
+                await text_queue.put(None)
         except Exception as e:
             logging.error(f"请求失败: {e}")
             await text_queue.put(None)
@@ -224,9 +209,9 @@ if __name__ == "__main__":
             #     "content": "Yes, I can."
             # }
         ]
-        history_queue = asyncio.Queue()
+        history_store = DataStorageModule()
         for msg in history:
-            await history_queue.put(msg)
+            history_store.append(msg["role"], msg["content"], kind='qwen2_audio')
         ##################################################
         # 测试post_audio
         # wav_file_path = "/mnt/pfs-guan-ssai/nlu/zhaojiale/3oa-text-voice-data-generate/gpto/server/output.wav"
@@ -249,7 +234,7 @@ if __name__ == "__main__":
         ]
         text_queue = asyncio.Queue()
         print('start')
-        await client.post_text(new_message, text_queue, history_queue)
+        await client.post_text(new_message, text_queue, history_store)
         
         # 获取响应
         response = await text_queue.get()
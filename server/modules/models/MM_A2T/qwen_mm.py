@@ -6,7 +6,9 @@ import uuid
 import io
 from typing import List, Optional, Dict
 from pydub import AudioSegment
+from models.LLM.sse import loads
 from models.MM_A2T.base_mm import BaseMM
+from data_storage import DataStorageModule
 import logging
 from pathlib import Path
 
@@ -53,43 +55,22 @@ class QwenMM(BaseMM):
             logging.error(f"qwen_mm：音频转换错误: {e}")
             raise
 
-    async def post_text(self, text: str, text_queue: asyncio.Queue, history_queue: asyncio.Queue, max_history_num=6):
+    async def post_text(self, text: str, text_queue: asyncio.Queue, history: DataStorageModule, max_history_num=6):
         """
-        使用WAV路径与模型进行通信，处理模型的响应并更新队列。
+        使用WAV路径与模型进行通信，处理模型的响应并更新对话历史。
 
         :param text: WAV文件的路径。
         :param text_queue: 用于存储模型响应文本的异步队列。
-        :param history_queue: 用于存储对话历史的异步队列，最多保留最新的6条记录。
+        :param history: 会话的对话历史，本模型的历史记录以 'qwen_mm' 类型保存。
         :param max_history_num: 历史记录的最大数量，默认为6。
         """
-        history = []
-        temp_storage = []
-
-        # 从 history_queue 中取出所有历史记录
-        while not history_queue.empty():
-            try:
-                item = history_queue.get_nowait()
-                temp_storage.append(item)  # 存储到临时列表
-                if isinstance(item, list):
-                    history.extend(item)
-                else:
-                    history.append(item)
-            except asyncio.QueueEmpty:
-                break
-
-        logging.info(f'qwen_mm：history加载完毕，当前历史记录数：{len(history)}')
-
-        # 将历史记录重新放回 history_queue
-        for item in temp_storage:
-            await history_queue.put(item)
-
-        # 仅保留最新的 max_history_num 条历史记录
-        if len(history) > max_history_num:
-            history = history[-max_history_num:]
+        # 只读取最新的 max_history_num 条历史记录
+        recent = [turn.content for turn in history.window(max_history_num, kinds=('qwen_mm',))]
+        logging.info(f'qwen_mm：history加载完毕，当前历史记录数：{len(recent)}')
 
         payload = {
             "wav_path": text,
-            "history": history
+            "history": recent
         }
 
         headers = {
@@ -108,7 +89,7 @@ class QwenMM(BaseMM):
                         message=f"HTTP错误: {response.status} - {text_resp}"
                     )
 
-                data = await response.json()
+                data = loads(await response.read())
 
                 # 验证响应数据结构
                 if "response" not in data or "history" not in data:
@@ -120,9 +101,10 @@ class QwenMM(BaseMM):
                 # 逐字符放入 text_queue
                 for char in response_text:
                     await text_queue.put(char)
+                await text_queue.put(None)
 
-                # 将最新的历史记录放入 history_queue
-                await history_queue.put(updated_history[-1])
+                # 将最新的历史记录存入对话历史
+                history.append('assistant', updated_history[-1], kind='qwen_mm')
 
                 logging.info(f'qwen_mm：得到API返回值response_text：{response_text}')
                 logging.info(f'qwen_mm：得到API返回值updated_history最后一条：{updated_history[-1]}')
@@ -168,7 +150,7 @@ if __name__ == "__main__":
 
         # 初始化队列
         text_queue = asyncio.Queue()
-        history_queue = asyncio.Queue()
+        history = DataStorageModule()
 
         # 添加初始对话历史
         initial_history = [{
@@ -176,9 +158,9 @@ if __name__ == "__main__":
             'response': '「中性」\n\n人山人海，<strong>形容</strong>的是一片热闹的场景，人多得像山一样，像海一样，[breath]挤得水泄不通，通常用来形容人多的地方，或者大规模的群众活动。你是不是遇到了啥人多得不得了的情况啊？'
         }]
 
-        # 将每个历史条目单独放入队列
+        # 将每个历史条目存入对话历史
         for item in initial_history:
-            await history_queue.put(item)
+            history.append('assistant', item, kind='qwen_mm')
 
         try:
             # 处理音频
@@ -186,7 +168,7 @@ if __name__ == "__main__":
             print(f"WAV文件路径: {wav_path}")
 
             # 发送文本（WAV路径）到模型
-            await qwen_mm.post_text(wav_path, text_queue, history_queue)
+            await qwen_mm.post_text(wav_path, text_queue, history)
 
             # 读取模型响应
             response_text = ""
@@ -196,9 +178,7 @@ if __name__ == "__main__":
             print("模型响应:", response_text)
 
             # 读取更新后的历史记录
-            updated_history = []
-            while not history_queue.empty():
-                updated_history.append(await history_queue.get())
+            updated_history = [turn.content for turn in history.window(kinds=('qwen_mm',))]
             print("更新后的历史记录:", updated_history)
 
         except Exception as e:
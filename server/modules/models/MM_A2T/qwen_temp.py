@@ -11,6 +11,7 @@ from pydub import AudioSegment
 from pathlib import Path
 from transformers import AutoProcessor
 from models.MM_A2T.base_mm import BaseMM
+from data_storage import DataStorageModule
 import base64
 from openai import OpenAI
 
@@ -61,7 +62,7 @@ class Qwen2AudioMM(BaseMM):
             logging.error(f"qwen_mm：音频转换错误: {e}")
             raise
 
-    async def post_text(self, wav_path, text_queue: asyncio.Queue, history_queue: asyncio.Queue, max_history_num=0):
+    async def post_text(self, wav_path, text_queue: asyncio.Queue, history: DataStorageModule, max_history_num=0):
         conversation = []
         try:
             start_time = time.time()
@@ -92,11 +93,9 @@ class Qwen2AudioMM(BaseMM):
                     if count <= first_few:
                         elapsed_time = time.time() - start_time
                         logging.info(f"self.client 返回值： {content}: {elapsed_time:.4f} seconds")
-            conversation.append({"role": "assistant", "content": result})
-            if max_history_num > 0:
-                conversation = conversation[-max_history_num:]
-            for msg in conversation:
-                await history_queue.put(msg)
+            history.append('user', new_messages['content'], kind='qwen2_audio')
+            history.add_assistant_text(result)
+            await text_queue.put(None)
 
         except Exception as e:
             logging.error(f"Request failed: {e}")
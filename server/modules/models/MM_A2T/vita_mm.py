@@ -1,4 +1,6 @@
 from models.MM_A2T.base_mm import BaseMM
+from models.http_client import http_clients
+from data_storage import DataStorageModule
 import asyncio
 import aiohttp
 import os
@@ -26,28 +28,30 @@ class VITAMM(BaseMM):
         with open(file_path, 'wb') as f:
             f.write(data)
 
-    async def post_text(self, audio_path: str, text_queue: asyncio.Queue, history_queue: asyncio.Queue):
-        async with aiohttp.ClientSession() as session:
-            data = {
-                "text": None,
-                "audio": audio_path,
-                "image": None,
-                "video": None
-            }
+    async def post_text(self, audio_path: str, text_queue: asyncio.Queue, history: DataStorageModule):
+        # 使用进程级共享会话，复用连接
+        session = http_clients.session('mm')
+        data = {
+            "text": None,
+            "audio": audio_path,
+            "image": None,
+            "video": None
+        }
 
-            try:
-                async with session.post(self.api_url, json=data) as response:
-                    if response.status == 200:
-                        async for line in response.content:
-                            decoded_line = line.decode('utf-8').strip()
-                            if decoded_line:
-                                await text_queue.put(decoded_line)
-                    else:
-                        error_text = f"请求失败，状态码: {response.status}"
-                        print(error_text)
-            except aiohttp.ClientError as e:
-                error_text = f"请求异常: {e}"
-                print(error_text)
+        try:
+            async with session.post(self.api_url, json=data) as response:
+                if response.status == 200:
+                    async for line in response.content:
+                        decoded_line = line.decode('utf-8').strip()
+                        if decoded_line:
+                            await text_queue.put(decoded_line)
+                else:
+                    error_text = f"请求失败，状态码: {response.status}"
+                    print(error_text)
+        except aiohttp.ClientError as e:
+            error_text = f"请求异常: {e}"
+            print(error_text)
+        await text_queue.put(None)
 
     async def reset(self):
         # 目前不需要实现
@@ -66,8 +70,8 @@ if __name__ == "__main__":
         
         
         text_queue = asyncio.Queue()
-        history_queue = asyncio.Queue()
-        await vitam.post_text(str(audio_file_path), text_queue, history_queue)
+        history = DataStorageModule()
+        await vitam.post_text(str(audio_file_path), text_queue, history)
 
 
         while not text_queue.empty():
@@ -0,0 +1,196 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import AsyncGenerator, Optional
+from models.TTS.base_tts import BaseTTS
+
+current_dir = Path(__file__).resolve().parent
+log_dir = current_dir.parents[2]
+log_file_path = log_dir / 'log.txt'
+logging.basicConfig(
+    filename=log_file_path,
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# 文本开头的情感标签，如「快乐」
+_EMOTION_PATTERN = re.compile(r'^\s*(「[^」]*」)')
+_SPACE_PATTERN = re.compile(r'\s+')
+
+
+class CachedTTS(BaseTTS):
+    """
+    带结果缓存的 TTS，包装任意 BaseTTS。
+    以 (规范化文本, 音色, 情感标签, 输出格式) 为键：
+    - 内存层：按字节数限制的 LRU；
+    - 磁盘层（可选）：每个结果一个文件，总大小超出上限时删除最久未使用的文件。
+    命中时直接以流的形式返回缓存的音频，不请求后端；未命中时边转发边缓存，完整合成后写入缓存。
+    """
+    def __init__(self,
+                 engine: BaseTTS,
+                 voice: Optional[str] = None,
+                 memory_bytes: int = 64 * 1024 * 1024,
+                 disk_dir=None,
+                 disk_bytes: int = 1024 * 1024 * 1024,
+                 max_entry_bytes: int = 4 * 1024 * 1024,
+                 chunk_size: int = 8192):
+        """
+        :param engine: 实际的 TTS 后端。
+        :param voice: 音色/参考音频 ID，None 时依次从后端的 voice、reference_id 或 spk_id 属性获取，
+                      FishSpeechTTS 的 voice 由参考音色 ID 和参考音频/文本共同决定。
+        :param memory_bytes: 内存层的容量（字节）。
+        :param disk_dir: 磁盘层目录，None 表示不使用磁盘层。
+        :param disk_bytes: 磁盘层的容量（字节）。
+        :param max_entry_bytes: 单条结果的大小上限，超过的不缓存。
+        :param chunk_size: 命中时按此大小分块返回。
+        """
+        self.engine = engine
+        self.voice = voice if voice is not None else next(
+            (str(getattr(engine, attr)) for attr in ('voice', 'reference_id', 'spk_id') if getattr(engine, attr, None)),
+            ''
+        )
+        self.output_format = getattr(engine, 'output_format', 'wav')
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.chunk_size = chunk_size
+
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self.hits = 0
+        self.misses = 0
+
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self._disk = OrderedDict()
+        self._disk_size = 0
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            # 按修改时间恢复磁盘层的 LRU 顺序
+            for path in sorted(self.disk_dir.glob('*.bin'), key=lambda p: p.stat().st_mtime):
+                size = path.stat().st_size
+                self._disk[path.stem] = size
+                self._disk_size += size
+            logging.info(f'TTS 磁盘缓存已加载 {len(self._disk)} 条，共 {self._disk_size} 字节')
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """规范化文本：全角半角统一，去除首尾空白，合并连续空白。"""
+        return _SPACE_PATTERN.sub(' ', unicodedata.normalize('NFKC', text)).strip()
+
+    def cache_key(self, text: str) -> str:
+        # NFKC 会改变「」，先在原文上提取情感标签
+        match = _EMOTION_PATTERN.match(text)
+        emotion = match.group(1) if match else ''
+        if match:
+            text = text[match.end():]
+        raw = json.dumps([self.normalize(text), self.voice, emotion, self.output_format], ensure_ascii=False)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / f'{key}.bin'
+
+    def _memory_put(self, key: str, data: bytes):
+        if len(data) > self.memory_bytes:
+            return
+        if key in self._memory:
+            self._memory_size -= len(self._memory.pop(key))
+        self._memory[key] = data
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    def _disk_get(self, key: str) -> Optional[bytes]:
+        path = self._disk_path(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+            return data
+        except OSError:
+            return None
+
+    def _disk_put(self, key: str, data: bytes):
+        """原子地写入磁盘层文件，在工作线程中执行。"""
+        path = self._disk_path(key)
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+    def _disk_evict(self):
+        evicted = []
+        while self._disk_size > self.disk_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_size -= size
+            evicted.append(self._disk_path(key))
+        return evicted
+
+    async def lookup(self, text: str) -> Optional[bytes]:
+        """查询缓存，依次查找内存层和磁盘层，磁盘层命中时提升到内存层。"""
+        key = self.cache_key(text)
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+            return data
+        if self.disk_dir and key in self._disk:
+            data = await asyncio.to_thread(self._disk_get, key)
+            if data is None:
+                self._disk_size -= self._disk.pop(key)
+                return None
+            self._disk.move_to_end(key)
+            self._memory_put(key, data)
+            return data
+        return None
+
+    async def store(self, text: str, data: bytes):
+        """写入缓存，超过单条上限的结果不缓存。"""
+        if not data or len(data) > self.max_entry_bytes:
+            return
+        key = self.cache_key(text)
+        self._memory_put(key, data)
+        if self.disk_dir and key not in self._disk:
+            try:
+                await asyncio.to_thread(self._disk_put, key, data)
+            except OSError as e:
+                logging.error(f'写入 TTS 磁盘缓存失败: {e}')
+                return
+            self._disk[key] = len(data)
+            self._disk_size += len(data)
+            for path in self._disk_evict():
+                await asyncio.to_thread(path.unlink, True)
+
+    async def stream(self, text: str) -> AsyncGenerator[bytes, None]:
+        data = await self.lookup(text)
+        if data is not None:
+            self.hits += 1
+            logging.info(f'TTS 缓存命中: {text}')
+            for start in range(0, len(data), self.chunk_size):
+                yield data[start:start + self.chunk_size]
+            return
+
+        self.misses += 1
+        buffer = bytearray()
+        async for chunk in self.engine.stream(text):
+            if len(buffer) <= self.max_entry_bytes:
+                buffer.extend(chunk)
+            yield chunk
+        # 只缓存完整合成的结果，中途取消或出错时不会执行到这里
+        await self.store(text, bytes(buffer))
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'memory_entries': len(self._memory),
+            'memory_bytes': self._memory_size,
+            'disk_entries': len(self._disk),
+            'disk_bytes': self._disk_size,
+        }
+
+    async def close(self):
+        await self.engine.close()
@@ -5,6 +5,8 @@ import subprocess
 import sys
 from typing import AsyncGenerator
 from models.TTS.base_tts import BaseTTS
+from models.http_client import http_clients
+from models.router import routers
 import logging
 from pathlib import Path
 
@@ -43,9 +45,13 @@ class CosyTTS(BaseTTS):
         """
         self.spk_id = spk_id
         self.api_url = api_url
-        self.session = aiohttp.ClientSession()
         self.current_emo_tag = self.default_emo_tag  # 初始化当前情感标签为默认值
 
+    @property
+    def session(self):
+        # 使用进程级共享会话，复用连接
+        return http_clients.session('cosy_tts')
+
     async def stream(self, text: str) -> AsyncGenerator[bytes, None]:
         emo_tag, tts_text = self._parse_text(text)
 
@@ -56,51 +62,53 @@ class CosyTTS(BaseTTS):
         }
 
         try:
-            logging.info(f"发送 POST 请求到 {self.api_url}")
-            async with self.session.post(self.api_url, data=form_data) as response:
-                logging.info(f"收到响应状态码: {response.status}")
-                if response.status != 200:
-                    error_text = await response.text()
-                    logging.error(f"请求失败，状态码: {response.status}, 响应: {error_text}")
-                    return
-
-                # 收集所有PCM数据
-                pcm_data = bytearray()
-                async for chunk in response.content.iter_chunked(1024):
-                    if chunk:
-                        logging.debug("收到TTS返回的音频块")
-                        pcm_data.extend(chunk)
-
-                logging.info("所有PCM数据已接收，开始转换为WAV格式")
-
-                # 使用FFmpeg将PCM转换为WAV
-                process = await asyncio.create_subprocess_exec(
-                    'ffmpeg',
-                    '-f', 's16le',        # 输入格式
-                    '-ar', '22050',       # 采样率
-                    '-ac', '1',           # 声道数
-                    '-i', 'pipe:0',       # 输入来自stdin
-                    '-f', 'wav',          # 输出格式
-                    'pipe:1',             # 输出到stdout
-                    stdin=asyncio.subprocess.PIPE,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
-                )
-
-                # 发送PCM数据到FFmpeg的stdin并获取WAV数据
-                stdout, stderr = await process.communicate(input=pcm_data)
-
-                if process.returncode != 0:
-                    error_message = stderr.decode()
-                    logging.error(f"FFmpeg转换失败: {error_message}")
-                    return
-
-                logging.info("PCM数据已成功转换为WAV格式，开始流式传输WAV数据")
-
-                # 以块的形式返回WAV数据
-                chunk_size = 1024
-                for i in range(0, len(stdout), chunk_size):
-                    yield stdout[i:i + chunk_size]
+            async with routers.route('cosy_tts', self.api_url) as route:
+                logging.info(f"发送 POST 请求到 {route.url}")
+                async with self.session.post(route.url, data=form_data) as response:
+                    logging.info(f"收到响应状态码: {response.status}")
+                    if response.status != 200:
+                        error_text = await response.text()
+                        # 以异常结束请求，路由层据此统计失败并摘除故障副本
+                        raise aiohttp.ClientError(f"请求失败，状态码: {response.status}, 响应: {error_text}")
+
+                    # 收集所有PCM数据
+                    pcm_data = bytearray()
+                    async for chunk in response.content.iter_chunked(1024):
+                        if chunk:
+                            route.first_byte()
+                            logging.debug("收到TTS返回的音频块")
+                            pcm_data.extend(chunk)
+
+                    logging.info("所有PCM数据已接收，开始转换为WAV格式")
+
+                    # 使用FFmpeg将PCM转换为WAV
+                    process = await asyncio.create_subprocess_exec(
+                        'ffmpeg',
+                        '-f', 's16le',        # 输入格式
+                        '-ar', '22050',       # 采样率
+                        '-ac', '1',           # 声道数
+                        '-i', 'pipe:0',       # 输入来自stdin
+                        '-f', 'wav',          # 输出格式
+                        'pipe:1',             # 输出到stdout
+                        stdin=asyncio.subprocess.PIPE,
+                        stdout=asyncio.subprocess.PIPE,
+                        stderr=asyncio.subprocess.PIPE
+                    )
+
+                    # 发送PCM数据到FFmpeg的stdin并获取WAV数据
+                    stdout, stderr = await process.communicate(input=pcm_data)
+
+                    if process.returncode != 0:
+                        error_message = stderr.decode()
+                        logging.error(f"FFmpeg转换失败: {error_message}")
+                        return
+
+                    logging.info("PCM数据已成功转换为WAV格式，开始流式传输WAV数据")
+
+                    # 以块的形式返回WAV数据
+                    chunk_size = 1024
+                    for i in range(0, len(stdout), chunk_size):
+                        yield stdout[i:i + chunk_size]
 
         except aiohttp.ClientError as e:
             logging.error(f"发送 POST 请求到 {self.api_url} 时发生错误: {e}")
@@ -123,9 +131,9 @@ class CosyTTS(BaseTTS):
 
     async def close(self):
         """
-        关闭 aiohttp 会话以释放资源。
+        共享会话由 http_clients 在服务关闭时统一关闭，这里无需处理。
         """
-        await self.session.close()
+        pass
 
 if __name__ == "__main__":
     async def main():
@@ -1,9 +1,12 @@
 import ormsgpack
-import aiohttp
 from models.TTS.base_tts import BaseTTS
+from models.http_client import http_clients
+from models.router import routers
 from pydantic import BaseModel, Field, conint
 from typing import Annotated, Literal, Optional, List
 from pathlib import Path
+import hashlib
+import json
 import logging
 
 current_dir = Path(__file__).resolve().parent
@@ -51,7 +54,15 @@ class FishSpeechTTS(BaseTTS):
         top_p: float = 0.7,
         repetition_penalty: float = 1.2,
         temperature: float = 0.7,
+        reference_id: Optional[str] = None,
+        reference_audio: Optional[List[str]] = None,
+        reference_text: Optional[List[str]] = None,
     ):
+        """
+        :param reference_id: 服务端预置的参考音色 ID。
+        :param reference_audio: 参考音频路径列表，与 reference_text 一一对应。
+        :param reference_text: 参考音频对应的文本列表。
+        """
         self.url = url
         self.api_key = api_key
         self.output_format = output_format
@@ -64,23 +75,33 @@ class FishSpeechTTS(BaseTTS):
         self.top_p = top_p
         self.repetition_penalty = repetition_penalty
         self.temperature = temperature
-        self.session = aiohttp.ClientSession()
+        self.reference_id = reference_id
+        self.reference_audio = reference_audio if reference_audio is not None else ["/XXXX/demo2.mp3"]
+        self.reference_text = reference_text if reference_text is not None else ["XXXX。"]
+
+    @property
+    def voice(self) -> str:
+        """当前音色配置的标识，由参考音色 ID 和参考音频/文本决定，供结果缓存区分音色。"""
+        raw = json.dumps([self.reference_id, self.reference_audio, self.reference_text], ensure_ascii=False)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    @property
+    def session(self):
+        # 使用进程级共享会话，复用连接
+        return http_clients.session('fish_tts')
     
     async def stream(self, text: str, references: Optional[List[ServeReferenceAudio]] = None):
         """Stream audio data using FishSpeech."""
         if references is None:
-            references = []
-
-        reference_audio = ["/XXXX/demo2.mp3"]
-        reference_text = ["XXXX。"]
-        references = [
-            ServeReferenceAudio(audio=ref_audio, text=ref_text)
-            for ref_text, ref_audio in zip(reference_text, reference_audio)
-        ]
+            references = [
+                ServeReferenceAudio(audio=ref_audio, text=ref_text)
+                for ref_text, ref_audio in zip(self.reference_text, self.reference_audio)
+            ]
 
         request_data = ServeTTSRequest(
             text=text,
             references=references,
+            reference_id=self.reference_id,
             format=self.output_format,
             chunk_length=self.chunk_length,
             mp3_bitrate=self.mp3_bitrate,
@@ -101,19 +122,22 @@ class FishSpeechTTS(BaseTTS):
         }
         logging.info(f"开始准备向fishAPI发送请求")
         try:
-            async with self.session.post(self.url, data=packed_data, headers=headers) as response:
-                if response.status != 200:
-                    error = await response.json()
-                    logging.error(f"请求失败: {error}")
-                    raise Exception(f"Request failed with status {response.status}: {error}")
+            async with routers.route('fish_tts', self.url) as route:
+                async with self.session.post(route.url, data=packed_data, headers=headers) as response:
+                    if response.status != 200:
+                        error = await response.json()
+                        logging.error(f"请求失败: {error}")
+                        raise Exception(f"Request failed with status {response.status}: {error}")
                 
-                num = 0
-                async for chunk in response.content.iter_chunked(1024):
-                    if chunk:
-                        yield chunk
-                    if num < 2:
-                        num = num + 1
-                        logging.info(f"已收到第{str(num)}块音频")
+                    num = 0
+                    async for chunk in response.content.iter_chunked(1024):
+                        if chunk:
+                            # 以第一块音频的到达时间作为该副本的延迟
+                            route.first_byte()
+                            yield chunk
+                        if num < 2:
+                            num = num + 1
+                            logging.info(f"已收到第{str(num)}块音频")
         
         except Exception as e:
             logging.error(f"请求失败: {e}")
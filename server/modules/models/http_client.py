@@ -0,0 +1,81 @@
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+import aiohttp
+
+current_dir = Path(__file__).resolve().parent
+log_dir = current_dir.parents[1]
+log_file_path = log_dir / 'log.txt'
+logging.basicConfig(
+    filename=log_file_path,
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+
+@dataclass
+class BackendConfig:
+    """
+    单个后端的连接池与超时配置。
+
+    limit / limit_per_host: 连接池总连接数与单主机连接数上限
+    keepalive_timeout: 空闲连接保持时间（秒）
+    ttl_dns_cache: DNS 缓存时间（秒）
+    total_timeout / connect_timeout / sock_read_timeout: 请求总超时、建连超时、两次读取之间的超时（秒），None 表示不限
+    """
+    limit: int = 100
+    limit_per_host: int = 32
+    keepalive_timeout: float = 30
+    ttl_dns_cache: int = 300
+    total_timeout: Optional[float] = None
+    connect_timeout: Optional[float] = 5
+    sock_read_timeout: Optional[float] = 60
+
+
+class HTTPClientRegistry:
+    """
+    进程级的 HTTP 会话注册表。
+    每个后端（asr、llm、tts 等）一个 ClientSession，所有连接共享，复用 keep-alive 连接，跳过每轮的 TCP/TLS 握手。
+    会话在第一次使用时于当前事件循环中创建，服务关闭时统一关闭。
+    """
+    def __init__(self):
+        self.configs: Dict[str, BackendConfig] = {}
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+
+    def configure(self, name: str, config: BackendConfig = None, **kwargs):
+        """设置后端的配置，已创建的会话保持不变，关闭后按新配置重建。"""
+        self.configs[name] = config or BackendConfig(**kwargs)
+
+    def session(self, name: str) -> aiohttp.ClientSession:
+        """返回后端的共享会话，不存在或已关闭时创建。"""
+        session = self._sessions.get(name)
+        if session is None or session.closed:
+            config = self.configs.get(name) or BackendConfig()
+            connector = aiohttp.TCPConnector(
+                limit=config.limit,
+                limit_per_host=config.limit_per_host,
+                keepalive_timeout=config.keepalive_timeout,
+                ttl_dns_cache=config.ttl_dns_cache,
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=config.total_timeout,
+                connect=config.connect_timeout,
+                sock_read=config.sock_read_timeout,
+            )
+            session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+            self._sessions[name] = session
+            logging.info(f'已创建 {name} 后端的 HTTP 会话，连接上限: {config.limit}')
+        return session
+
+    async def close(self):
+        """关闭所有会话。"""
+        for name, session in self._sessions.items():
+            if not session.closed:
+                await session.close()
+                logging.info(f'已关闭 {name} 后端的 HTTP 会话')
+        self._sessions.clear()
+
+
+# 所有模型客户端共享的注册表
+http_clients = HTTPClientRegistry()
@@ -0,0 +1,254 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+import aiohttp
+from models.http_client import http_clients
+
+current_dir = Path(__file__).resolve().parent
+log_dir = current_dir.parents[1]
+log_file_path = log_dir / 'log.txt'
+logging.basicConfig(
+    filename=log_file_path,
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+
+class Endpoint:
+    """一个后端副本及其负载、延迟和健康状态。"""
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0       # 正在进行的请求数
+        self.ewma_ms = None        # 首字节延迟的指数移动平均（毫秒），用于选择副本
+        self.stream_ewma_ms = None # 完整请求（含流式传输）耗时的指数移动平均（毫秒），只用于统计
+        self.failures = 0          # 连续失败次数
+        self.ejected_until = 0.0   # 摘除截止时间（time.monotonic），0 表示未摘除
+
+    def available(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def stats(self) -> dict:
+        return {
+            'url': self.url,
+            'outstanding': self.outstanding,
+            'ewma_ms': self.ewma_ms,
+            'stream_ewma_ms': self.stream_ewma_ms,
+            'failures': self.failures,
+            'ejected': self.ejected_until > time.monotonic(),
+        }
+
+
+class Route:
+    """
+    一次路由得到的请求：url 为选中副本的地址。
+    调用方收到响应头或第一个数据块时调用 first_byte()，以首字节延迟更新副本的延迟 EWMA，
+    流式响应的持续时间不计入；未调用时在请求结束时以总耗时代替。
+    """
+    def __init__(self, url: str, router=None, endpoint: Endpoint = None):
+        self.url = url
+        self.router = router
+        self.endpoint = endpoint
+        self.start = time.perf_counter()
+        self.first_byte_ms = None
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.start) * 1000
+
+    def first_byte(self):
+        """记录首字节延迟，只有第一次调用生效。"""
+        if self.first_byte_ms is None:
+            self.first_byte_ms = self.elapsed_ms()
+            if self.router is not None:
+                self.router.record_latency(self.endpoint, self.first_byte_ms)
+
+
+class BackendRouter:
+    """
+    同一类后端多个副本之间的负载均衡。
+    - least_outstanding：选择正在进行的请求最少的副本，相同时选延迟较低的；
+    - ewma：选择 延迟 EWMA × (进行中请求数 + 1) 最小的副本，没有延迟数据的副本优先。
+    延迟取首字节延迟，流式响应的传输时长单独统计，不影响副本选择。
+    连续失败 eject_after 次的副本摘除 eject_seconds 秒；配置了 health_path 时后台定期主动检查，
+    检查通过立即恢复，失败则摘除。所有副本都被摘除时仍在全部副本中选择，避免请求直接失败。
+    """
+    STRATEGIES = ('least_outstanding', 'ewma')
+
+    def __init__(self,
+                 name: str,
+                 endpoints: List[str],
+                 strategy: str = 'least_outstanding',
+                 health_path: Optional[str] = None,
+                 health_method: str = 'POST',
+                 health_interval: float = 5.0,
+                 health_timeout: float = 2.0,
+                 eject_after: int = 3,
+                 eject_seconds: float = 30.0,
+                 ewma_alpha: float = 0.3):
+        """
+        :param name: 后端名称，同时作为共享 HTTP 会话的名称。
+        :param endpoints: 各副本的完整请求 URL。
+        :param strategy: 'least_outstanding' 或 'ewma'。
+        :param health_path: 健康检查路径（相对于副本的 scheme://host:port），None 表示只做被动摘除。
+        :param health_method: 健康检查的 HTTP 方法。
+        :param health_interval: 健康检查间隔（秒）。
+        :param health_timeout: 健康检查超时（秒）。
+        :param eject_after: 连续失败多少次后摘除。
+        :param eject_seconds: 摘除时长（秒），到期后重新参与选择。
+        :param ewma_alpha: 延迟 EWMA 和传输耗时 EWMA 的平滑系数。
+        """
+        if not endpoints:
+            raise ValueError(f'{name} 后端没有配置任何副本')
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f'不支持的负载均衡策略: {strategy}')
+        self.name = name
+        self.endpoints = [Endpoint(url) for url in endpoints]
+        self.strategy = strategy
+        self.health_path = health_path
+        self.health_method = health_method
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.ewma_alpha = ewma_alpha
+        self._health_task = None
+
+    def _score(self, endpoint: Endpoint):
+        if self.strategy == 'ewma':
+            if endpoint.ewma_ms is None:
+                return (0, endpoint.outstanding)
+            return (endpoint.ewma_ms * (endpoint.outstanding + 1), 0)
+        return (endpoint.outstanding, endpoint.ewma_ms or 0)
+
+    def pick(self) -> Endpoint:
+        now = time.monotonic()
+        candidates = [endpoint for endpoint in self.endpoints if endpoint.available(now)] or self.endpoints
+        return min(candidates, key=self._score)
+
+    def _ewma(self, current: Optional[float], sample: float) -> float:
+        if current is None:
+            return sample
+        return current + self.ewma_alpha * (sample - current)
+
+    def record_latency(self, endpoint: Endpoint, first_byte_ms: float):
+        endpoint.ewma_ms = self._ewma(endpoint.ewma_ms, first_byte_ms)
+
+    def record_success(self, endpoint: Endpoint, elapsed_ms: float):
+        endpoint.failures = 0
+        endpoint.stream_ewma_ms = self._ewma(endpoint.stream_ewma_ms, elapsed_ms)
+
+    def record_failure(self, endpoint: Endpoint):
+        endpoint.failures += 1
+        if endpoint.failures >= self.eject_after:
+            self.eject(endpoint)
+
+    def eject(self, endpoint: Endpoint):
+        if endpoint.ejected_until <= time.monotonic():
+            logging.warning(f'{self.name} 副本 {endpoint.url} 已摘除 {self.eject_seconds} 秒')
+        endpoint.ejected_until = time.monotonic() + self.eject_seconds
+
+    @asynccontextmanager
+    async def request(self):
+        """
+        选择一个副本并返回其 Route，统计进行中请求数、首字节延迟与总耗时；上下文内抛出异常视为失败。
+        """
+        endpoint = self.pick()
+        endpoint.outstanding += 1
+        route = Route(endpoint.url, self, endpoint)
+        try:
+            yield route
+        except Exception:
+            self.record_failure(endpoint)
+            raise
+        else:
+            # 调用方未标记首字节时以总耗时作为延迟
+            route.first_byte()
+            self.record_success(endpoint, route.elapsed_ms())
+        finally:
+            endpoint.outstanding -= 1
+
+    def _health_url(self, endpoint: Endpoint) -> str:
+        parts = urlsplit(endpoint.url)
+        return f'{parts.scheme}://{parts.netloc}{self.health_path}'
+
+    async def check_health(self):
+        """对所有副本做一次主动健康检查。"""
+        session = http_clients.session(self.name)
+        timeout = aiohttp.ClientTimeout(total=self.health_timeout)
+
+        async def check(endpoint: Endpoint):
+            try:
+                async with session.request(self.health_method, self._health_url(endpoint), timeout=timeout) as response:
+                    healthy = response.status == 200
+            except Exception:
+                healthy = False
+            if healthy:
+                if endpoint.ejected_until > time.monotonic():
+                    logging.info(f'{self.name} 副本 {endpoint.url} 健康检查通过，已恢复')
+                endpoint.failures = 0
+                endpoint.ejected_until = 0.0
+            else:
+                self.eject(endpoint)
+
+        await asyncio.gather(*(check(endpoint) for endpoint in self.endpoints))
+
+    async def _health_loop(self):
+        while True:
+            await self.check_health()
+            await asyncio.sleep(self.health_interval)
+
+    def start(self):
+        if self.health_path and self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def stop(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+
+    def stats(self) -> list:
+        return [endpoint.stats() for endpoint in self.endpoints]
+
+
+class RouterRegistry:
+    """
+    进程级的后端路由注册表。
+    模型客户端通过 route(name, default_url) 获取 Route，请求 route.url，收到首字节时调用 route.first_byte()；
+    没有为该后端配置副本时直接使用客户端自身的 URL。
+    """
+    def __init__(self):
+        self.routers: Dict[str, BackendRouter] = {}
+
+    def configure(self, name: str, endpoints: List[str], **kwargs) -> BackendRouter:
+        router = BackendRouter(name, endpoints, **kwargs)
+        self.routers[name] = router
+        logging.info(f'{name} 后端已配置 {len(endpoints)} 个副本，策略: {router.strategy}')
+        return router
+
+    @asynccontextmanager
+    async def route(self, name: str, default_url: str):
+        router = self.routers.get(name)
+        if router is None:
+            yield Route(default_url)
+            return
+        async with router.request() as route:
+            yield route
+
+    def start(self):
+        for router in self.routers.values():
+            router.start()
+
+    async def stop(self):
+        for router in self.routers.values():
+            await router.stop()
+
+    def stats(self) -> dict:
+        return {name: router.stats() for name, router in self.routers.items()}
+
+
+# 所有模型客户端共享的路由注册表
+routers = RouterRegistry()
@@ -0,0 +1,114 @@
+import re
+from collections import deque
+from dataclasses import dataclass
+from data_storage import estimate_tokens
+from messages import TurnChannel
+
+_IGNORED_CHARS = re.compile(r'[\s，。！？、；：,.!?;:…~～]+')
+
+
+def normalize_transcript(text: str) -> str:
+    """比较识别结果时忽略空白和标点。"""
+    return _IGNORED_CHARS.sub('', text or '').lower()
+
+
+@dataclass
+class SpeculationStats:
+    """
+    投机执行的统计。
+
+    turns: 处理的轮次数
+    speculations: 发起投机请求的次数
+    hits: 最终识别结果与投机文本一致、直接采用投机回复的次数
+    misses: 投机回复被放弃的次数（结果不一致、中间结果变化或被打断）
+    wasted_tokens: 被放弃的投机回复已生成的 token 数（估算）
+    """
+    turns: int = 0
+    speculations: int = 0
+    hits: int = 0
+    misses: int = 0
+    wasted_tokens: int = 0
+
+    @property
+    def speculation_rate(self) -> float:
+        return self.speculations / self.turns if self.turns else 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.speculations if self.speculations else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            'turns': self.turns,
+            'speculations': self.speculations,
+            'hits': self.hits,
+            'misses': self.misses,
+            'wasted_tokens': self.wasted_tokens,
+            'speculation_rate': round(self.speculation_rate, 3),
+            'hit_rate': round(self.hit_rate, 3),
+        }
+
+
+class Speculation:
+    """
+    基于稳定中间结果提前发起的 LLM 请求。
+    同时作为 LLM 客户端的 text_queue 和 history 传入：确认前回复文本和历史写入都暂存在这里，
+    commit() 后按顺序放入下游并写入历史，之后直接透传；放弃时取消 task 即可，不影响下游和历史。
+    """
+    def __init__(self, text: str, channel: TurnChannel, history):
+        """
+        :param text: 投机使用的中间识别结果。
+        :param channel: 该轮次的下游通道。
+        :param history: 会话的 DataStorageModule。
+        """
+        self.text = text
+        self.turn_id = channel.turn_id
+        self.channel = channel
+        self.history = history
+        self.task = None
+        self.committed = False
+        # 是否已获得全局准入名额并开始请求 LLM
+        self.admitted = False
+        self.tokens = 0
+        self._pending = deque()
+        self._pending_history = []
+
+    def matches(self, text: str) -> bool:
+        return normalize_transcript(self.text) == normalize_transcript(text)
+
+    async def put(self, payload):
+        if payload is not None:
+            self.tokens += estimate_tokens(payload)
+        if self.committed:
+            await self.channel.put(payload)
+        else:
+            self._pending.append(payload)
+
+    def messages(self, *args, **kwargs):
+        return self.history.messages(*args, **kwargs)
+
+    def add_user_text(self, text: str):
+        self._record(self.history.add_user_text, text)
+
+    def add_assistant_text(self, text: str):
+        self._record(self.history.add_assistant_text, text)
+
+    def _record(self, add, text: str):
+        if self.committed:
+            add(text)
+        else:
+            self._pending_history.append((add, text))
+
+    async def commit(self):
+        """确认投机结果：暂存的回复放入下游，暂存的历史写入会话。"""
+        # 放入下游时 LLM 可能继续追加，循环到暂存为空后才切换为透传，保证顺序
+        while self._pending:
+            await self.channel.put(self._pending.popleft())
+        for add, text in self._pending_history:
+            add(text)
+        self._pending_history.clear()
+        self.committed = True
+
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancel()
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+from enum import Enum
+from pathlib import Path
+
+logging.basicConfig(
+    filename=Path('./log.txt'),
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+class OverflowPolicy(Enum):
+    BLOCK = 'block'              # 队列满时生产者等待
+    DROP_OLDEST = 'drop_oldest'  # 队列满时丢弃最旧的一项
+    COALESCE = 'coalesce'        # 队列满时与队尾一项合并，无法合并时 put 等待、put_nowait 丢弃最旧的一项
+
+
+def concat_items(tail, item):
+    """默认合并函数：同为 str 或 bytes 时拼接，带 merge 方法的消息交给消息自身合并，否则返回 None 表示无法合并。"""
+    if hasattr(tail, 'merge'):
+        return tail.merge(item)
+    if isinstance(tail, str) and isinstance(item, str):
+        return tail + item
+    if isinstance(tail, (bytes, bytearray)) and isinstance(item, (bytes, bytearray)):
+        return bytes(tail) + bytes(item)
+    return None
+
+
+class StageQueue(asyncio.Queue):
+    """
+    带容量上限和溢出策略的流水线队列，并统计队列深度、丢弃和合并次数。
+    """
+    def __init__(self, name: str, maxsize: int = 0, policy: OverflowPolicy = OverflowPolicy.BLOCK, coalesce=None):
+        """
+        :param name: 队列名称，用于日志和统计。
+        :param maxsize: 最大长度，0 表示不限。
+        :param policy: 队列满时的处理策略。
+        :param coalesce: COALESCE 策略使用的合并函数 (队尾项, 新项) -> 合并结果或 None。
+        """
+        super().__init__(maxsize)
+        self.name = name
+        self.policy = policy
+        self.coalesce = coalesce or concat_items
+        self.puts = 0
+        self.drops = 0
+        self.coalesced = 0
+        self.max_depth = 0
+
+    def _drop_oldest(self):
+        self.get_nowait()
+        self.task_done()
+        self.drops += 1
+        if self.drops % 100 == 1:
+            logging.warning(f'{self.name} 已满，丢弃最旧的数据，累计丢弃 {self.drops} 项')
+
+    def put_nowait(self, item):
+        if self.full() and self.policy != OverflowPolicy.BLOCK:
+            if self.policy == OverflowPolicy.COALESCE:
+                merged = self.coalesce(self._queue[-1], item)
+                if merged is not None:
+                    self._queue[-1] = merged
+                    self.puts += 1
+                    self.coalesced += 1
+                    return
+            self._drop_oldest()
+        super().put_nowait(item)
+        self.puts += 1
+        self.max_depth = max(self.max_depth, self.qsize())
+
+    async def put(self, item):
+        if self.policy == OverflowPolicy.BLOCK:
+            return await super().put(item)
+        if self.policy == OverflowPolicy.COALESCE and self.full():
+            merged = self.coalesce(self._queue[-1], item)
+            if merged is None:
+                # 结束标志等无法合并的项不能丢弃，等待空位；入队经由 put_nowait，计数在其中完成
+                return await super().put(item)
+        return self.put_nowait(item)
+
+    def stats(self) -> dict:
+        """返回队列的当前深度和累计计数。"""
+        return {
+            'name': self.name,
+            'depth': self.qsize(),
+            'maxsize': self.maxsize,
+            'max_depth': self.max_depth,
+            'puts': self.puts,
+            'drops': self.drops,
+            'coalesced': self.coalesced,
+        }
@@ -2,6 +2,9 @@ import asyncio
 import logging
 from pathlib import Path
 import re  # 引入正则表达式模块
+from dataclasses import dataclass
+from typing import Optional
+from messages import TurnChannel, TurnTracker
 
 logging.basicConfig(
     filename=Path('./log.txt'),
@@ -9,41 +12,148 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+@dataclass
+class SegmentationPolicy:
+    """
+    分段策略：第一段尽快输出，之后的分段长度按几何级数增长，让 TTS 始终有活可干。
+
+    first_min_chars: 第一段的最少字符数，达到后在任一分句符（含逗号）处切分
+    min_chars: 第二段的最少字符数，之后每段乘以 growth，最多为 max_chars
+    idle_timeout: 等待 LLM 文本的超时时间（秒），None 表示只在 LLM 结束标志处输出剩余文本
+    """
+    first_min_chars: int = 4
+    min_chars: int = 8
+    growth: float = 2.0
+    max_chars: int = 128
+    idle_timeout: Optional[float] = None
+
+    def min_length(self, index: int) -> int:
+        """第 index 段（从 0 开始）的最少字符数。"""
+        if index == 0:
+            return self.first_min_chars
+        return min(self.max_chars, int(self.min_chars * self.growth ** (index - 1)))
+
+
+class SentenceSegmenter:
+    """
+    流式分句器。
+    未输出的文本按块保存在列表中，每次只扫描新追加的块，切分时才拼接一次，整体为线性开销；
+    文本末尾可能是禁止词前缀的部分暂存为尾巴，与下一块拼接后再过滤，处理跨块的禁止词。
+    分段长度由 SegmentationPolicy 控制，短于最少字符数的终止字符不切分。
+    """
+    def __init__(self, initial_termination_chars, subsequent_termination_chars, ban_list=None, policy: SegmentationPolicy = None):
+        """
+        :param initial_termination_chars: 一个批次第一句使用的终止字符。
+        :param subsequent_termination_chars: 之后使用的终止字符。
+        :param ban_list: 要从文本中移除的字符或字符串列表（不区分大小写）。
+        :param policy: 分段策略。
+        """
+        self.policy = policy or SegmentationPolicy()
+        self.initial_pattern = re.compile('[' + ''.join(re.escape(c) for c in initial_termination_chars) + ']')
+        self.subsequent_pattern = re.compile('[' + ''.join(re.escape(c) for c in subsequent_termination_chars) + ']')
+
+        if ban_list:
+            self.ban_pattern = re.compile('(' + '|'.join(re.escape(term) for term in ban_list) + ')', re.IGNORECASE)
+            # 所有禁止词的真前缀，用于判断文本末尾是否需要暂存
+            self.ban_prefixes = {term[:i].lower() for term in ban_list for i in range(1, len(term))}
+            self.max_tail = max(len(term) for term in ban_list) - 1
+        else:
+            self.ban_pattern = None
+            self.ban_prefixes = set()
+            self.max_tail = 0
+        self.reset()
+
+    def reset(self):
+        self.parts = []        # 已过滤、已扫描、尚未输出的文本块
+        self.length = 0        # parts 的总字符数
+        self.tail = ''         # 可能是禁止词前缀的未过滤尾巴
+        self.index = 0         # 当前批次已输出的分段数
+
+    def _filter(self, chunk: str) -> str:
+        text = self.tail + chunk
+        if self.ban_pattern:
+            text = self.ban_pattern.sub('', text)
+        self.tail = ''
+        for length in range(min(self.max_tail, len(text)), 0, -1):
+            if text[-length:].lower() in self.ban_prefixes:
+                self.tail = text[-length:]
+                return text[:-length]
+        return text
+
+    def feed(self, chunk: str) -> list:
+        """
+        追加一块文本，返回新切分出的完整句子。
+        """
+        if not chunk:
+            return []
+        text = self._filter(chunk)
+        segments = []
+        while text:
+            # 一个批次的第一段在任一分句符处切分，之后只在句末切分
+            pattern = self.initial_pattern if self.index == 0 else self.subsequent_pattern
+            # 之前的块已扫描过；位于最少字符数之前的终止字符不切分，直接从该位置开始查找
+            start = max(0, self.policy.min_length(self.index) - 1 - self.length)
+            match = pattern.search(text, start)
+            if match is None:
+                self.parts.append(text)
+                self.length += len(text)
+                break
+            split_point = match.end()  # 包含终止字符
+            self.parts.append(text[:split_point])
+            segments.append(''.join(self.parts))
+            self.parts = []
+            self.length = 0
+            self.index += 1
+            text = text[split_point:]
+        return segments
+
+    def flush(self) -> str:
+        """返回剩余的全部文本，并重置为新批次的初始状态。"""
+        rest = ''.join(self.parts) + self.tail
+        self.reset()
+        return rest
+
+
 class TextProcessingModule:
     def __init__(
         self, 
         text_queue: asyncio.Queue, 
         tts_queue: asyncio.Queue, 
         send_text_queue: asyncio.Queue, 
-        ban_list=None  # 添加ban_list作为可选参数
+        ban_list=None,  # 添加ban_list作为可选参数
+        policy: SegmentationPolicy = None,
+        turns: TurnTracker = None
     ):
         """
         初始化TextProcessingModule。
         :param text_queue: 从中消费文本的队列。
         :param tts_queue: 处理后的文本放入的队列。
         :param send_text_queue: 发送文本放入的队列。
-        :param termination_timeout: 等待新文本的超时时间（秒）。
         :param ban_list: 要从文本中移除的字符或字符串列表。
+        :param policy: 分段策略，None 时使用默认策略。
+        :param turns: 会话的轮次计数器，用于丢弃过期轮次的文本。
         """
         self.text_queue = text_queue
         self.tts_queue = tts_queue
         self.send_text_queue = send_text_queue
+        self.turns = turns or TurnTracker()
+        # 当前轮次及其输出通道
+        self.turn_id = None
+        self.tts_channel = None
+        self.send_text_channel = None
         self.initial_termination_chars = ['.', '!', '?', '，', '。', '！', '~', '？', '；', ';', ',']
         self.subsequent_termination_chars = ['.', '!', '?', '。', '！', '~', '？', '；', ';']
-        self.use_initial_chars = True
-        self.current_text = []
         self.ban_list = ban_list or ["<strong>", "</strong>", "[laughter]", "[breath]", "「中性」","「快乐」","「悲伤」","「惊讶」","「恐惧」","「厌恶」","「愤怒」"]
 
-        # 预编译ban_list的正则模式以提高性能
-        if self.ban_list:
-            # 转义每个禁止项以处理任何特殊的正则字符
-            escaped_terms = [re.escape(term) for term in self.ban_list]
-            # 使用单词边界确保只匹配完整的单词（可选）
-            # 如果不需要单词边界，可以移除 r'\b' 和 r'\b'
-            pattern = r'(' + '|'.join(escaped_terms) + r')'
-            self.ban_pattern = re.compile(pattern, re.IGNORECASE)  # 添加不区分大小写的标志
-        else:
-            self.ban_pattern = None
+        self.policy = policy or SegmentationPolicy()
+
+        # 流式分句器，只扫描新到达的文本
+        self.segmenter = SentenceSegmenter(
+            self.initial_termination_chars,
+            self.subsequent_termination_chars,
+            self.ban_list,
+            self.policy
+        )
             
     async def periodic_logger(self):
         """每隔5秒记录一次日志，表明 run 函数仍在运行。"""
@@ -55,91 +165,68 @@ class TextProcessingModule:
             # 处理任务取消时的清理工作（如果需要）
             pass
 
+    def begin_turn(self, turn_id: int):
+        """切换到新轮次，丢弃上一轮次未输出的文本。"""
+        self.segmenter.reset()
+        self.turn_id = turn_id
+        self.tts_channel = TurnChannel(self.tts_queue, turn_id)
+        self.send_text_channel = TurnChannel(self.send_text_queue, turn_id)
+
+    async def emit(self, segment: str):
+        await self.tts_channel.put(segment)
+        await self.send_text_channel.put('我的文本回复：' + segment)
+
+    async def flush(self):
+        """输出剩余的文本，并重置为新批次。"""
+        rest = self.segmenter.flush()
+        # 回复文本保留了原始空白，只剩空白时不再送入 TTS
+        if rest.strip():
+            await self.emit(rest)
+            logging.info(f'处理剩余数据：{rest}')
+
     async def run(self):
         """
         持续处理来自text_queue的文本。
-        在开始一个新批次时使用初始终止字符，
-        然后切换到后续的终止字符，直到队列空闲。
-        处理文本中存在的终止字符时，进行适当的拆分。
+        按分段策略切分：第一段达到最少字符数后在任一分句符处尽快输出，之后的分段逐渐变长。
+        收到轮次结束消息时输出剩余文本，并向 TTS 传递轮次结束；
+        配置了 idle_timeout 时，等待超时也会输出剩余文本。
+        过期轮次的消息直接丢弃。
         """
         # 启动定期日志记录协程
         logger_task = asyncio.create_task(self.periodic_logger())
         while True:
             try:
-                # text = await self.text_queue.get()
-                text = await asyncio.wait_for(self.text_queue.get(), timeout=2)
-                
-                self.current_text.append(text)
-                logging.info(f'接收到文本：{text}')
-
-                while True:
-                    merged_text = ''.join(self.current_text)
-                    
-                    # 应用禁止词汇替换（在合并后进行）
-                    if self.ban_pattern:
-                        original_merged_text = merged_text
-                        merged_text = self.ban_pattern.sub('', merged_text)
-
-                    # 根据当前状态选择终止字符
-                    termination_chars = self.initial_termination_chars if self.use_initial_chars else self.subsequent_termination_chars
-
-                    # 查找任一终止字符的最早出现位置
-                    termination_index = self.find_first_termination_char(merged_text, termination_chars)
-
-                    if termination_index != -1:
-                        # 在终止字符处分割文本
-                        split_point = termination_index + 1  # 包含终止字符
-                        before_termination = merged_text[:split_point]
-                        after_termination = merged_text[split_point:]
-
-                        # 将终止前的部分添加到current_text
-                        self.current_text = [after_termination]  # 保留剩余部分
-
-                        # 处理before_termination
-                        await self.tts_queue.put(before_termination)
-                        await self.send_text_queue.put('我的文本回复：' + before_termination)
-                        logging.info(f'成功切割一条数据：{before_termination}')
-
-                        # 如果是一个批次的第一次终止，切换终止字符
-                        if self.use_initial_chars:
-                            self.use_initial_chars = False
-                    else:
-                        # 未找到终止字符，等待更多文本
-                        break
+                if self.policy.idle_timeout:
+                    message = await asyncio.wait_for(self.text_queue.get(), timeout=self.policy.idle_timeout)
+                else:
+                    message = await self.text_queue.get()
+                if self.turns.is_stale(message):
+                    logging.info(f'丢弃过期轮次 {message.turn_id} 的文本')
+                    self.text_queue.task_done()
+                    continue
+                if message.turn_id != self.turn_id:
+                    self.begin_turn(message.turn_id)
+                logging.info(f'接收到文本：{message.payload}')
+
+                if message.end_of_turn:
+                    # LLM 回复结束
+                    await self.flush()
+                    await self.tts_channel.end()
+                    self.text_queue.task_done()
+                    logging.info('收到结束标志，已重置处理状态。')
+                    continue
+
+                for segment in self.segmenter.feed(message.payload):
+                    await self.emit(segment)
+                    logging.info(f'成功切割一条数据：{segment}')
 
                 self.text_queue.task_done()
             
             except asyncio.TimeoutError:
-                # 达到超时，表示队列空闲
-                if self.current_text:
-                    # 合并并处理剩余的文本
-                    merged_text = ''.join(self.current_text)
-                    
-                    # 再次应用禁止词汇替换（以确保完整的禁止词汇被移除）
-                    if self.ban_pattern:
-                        original_merged_text = merged_text
-                        merged_text = self.ban_pattern.sub('', merged_text)
-                    
-                    await self.tts_queue.put(merged_text)
-                    await self.send_text_queue.put('我的文本回复：' + merged_text)
-                    logging.info(f'处理剩余数据：{merged_text}')
-                    self.current_text = []
-                
-                # 重置终止字符为初始状态以准备下一批次
-                if not self.use_initial_chars:
-                    self.use_initial_chars = True
-                
+                # 达到超时，表示队列空闲，处理剩余的文本并重置为新批次
+                if self.tts_channel:
+                    await self.flush()
                 logging.info('队列空闲，已重置处理状态。')
-
-    def find_first_termination_char(self, text: str, termination_chars: list) -> int:
-        """
-        查找文本中任一终止字符的第一个出现位置。
-        :param text: 要搜索的文本。
-        :param termination_chars: 终止字符列表。
-        :return: 第一个终止字符的索引，若未找到则返回-1。
-        """
-        indices = [text.find(char) for char in termination_chars if char in text]
-        return min(indices) if indices else -1
     
     def reset(self):
-        self.current_text = []
+        self.segmenter.reset()
@@ -4,6 +4,9 @@ import logging
 from pathlib import Path
 import aiofiles
 from models.TTS.fish_speech_tts import FishSpeechTTS
+from models.TTS.cached_tts import CachedTTS
+from messages import TurnChannel, TurnTracker
+from audio_format import WavStreamReframer
 
 logging.basicConfig(
     filename=Path('./log.txt'),
@@ -12,17 +15,35 @@ logging.basicConfig(
 )
 
 class TTSModule:
-    def __init__(self, tts_queue: asyncio.Queue, send_audio_queue: asyncio.Queue):
+    def __init__(self, tts_queue: asyncio.Queue, send_audio_queue: asyncio.Queue, turns: TurnTracker = None, lookahead: int = 3,
+                 jitter_ms: float = 200, tts_engine=None):
+        """
+        :param tts_queue: 待合成文本消息的队列。
+        :param send_audio_queue: 合成音频消息放入的队列。
+        :param turns: 会话的轮次计数器，用于丢弃过期轮次。
+        :param lookahead: 同时合成的最大分段数，1 表示逐段合成。
+        :param jitter_ms: 流式模式下每个发送片段的最短时长（毫秒），攒够即发送。
+        :param tts_engine: 进程级共享的 TTS 引擎（通常为 CachedTTS），None 时单独创建。
+        """
         self.tts_queue = tts_queue
         self.send_audio_queue = send_audio_queue
+        self.turns = turns or TurnTracker()
+        self.lookahead = max(1, lookahead)
+        self.jitter_ms = jitter_ms
+        # 当前轮次的音频输出通道
+        self.channel = None
         self._sample_rate = 16000
         self._sample_width = 2
         self._channels = 1
         self._cache_duration_seconds = 1
-        self.tts_engine = FishSpeechTTS()
+        # 常用回复的合成结果缓存在内存中，命中时不再请求后端；缓存由所有连接共享
+        self.tts_engine = tts_engine or CachedTTS(FishSpeechTTS())
         self.tasks = set()
         self.reset_lock = asyncio.Lock()
-        self.cache = bytearray()  # 添加全局缓存属性
+        # 按分段顺序排列的待播放项：(合成任务, 音频块队列, 输出通道)，合成任务为 None 表示轮次结束
+        self.playback = asyncio.Queue()
+        # 合成名额：创建合成任务前获取，该分段播放完后释放，同时合成的分段不超过 lookahead
+        self.slots = asyncio.Semaphore(self.lookahead)
 
     async def periodic_logger(self):
         """每隔60秒记录一次日志，表明 run 函数仍在运行。"""
@@ -34,28 +55,55 @@ class TTSModule:
             logging.info("periodic_logger 任务被取消")
             pass
 
-    async def run(self, streaming: bool = False):
-        """主 TTS 处理循环，支持流式和非流式选项。"""
+    async def run(self, streaming: bool = True):
+        """
+        主 TTS 处理循环，支持流式（默认）和非流式选项。
+        流式模式下后端返回的音频攒够 jitter_ms 就发送，不等待整句合成完成。
+        最多同时合成 lookahead 个分段，合成结果由 play_in_order 严格按分段顺序放入发送队列，
+        当前分段播放时后续分段已在合成。
+        合成的音频封装为所属轮次的消息，轮次结束消息原样传给发送模块，过期轮次的文本直接丢弃。
+        """
         logging.info("tts_module 开始运行")
         # 启动定期日志记录协程
         logger_task = asyncio.create_task(self.periodic_logger())
         self.tasks.add(logger_task)
         logger_task.add_done_callback(self.tasks.discard)
+        player_task = asyncio.create_task(self.play_in_order())
         try:
             while True:
-                text = await self.tts_queue.get()
+                message = await self.tts_queue.get()
+                if self.turns.is_stale(message):
+                    logging.info(f'tts_module 丢弃过期轮次 {message.turn_id} 的文本')
+                    self.tts_queue.task_done()
+                    continue
+                if self.channel is None or self.channel.turn_id != message.turn_id:
+                    self.channel = TurnChannel(self.send_audio_queue, message.turn_id)
+                if message.end_of_turn:
+                    await self.playback.put((None, None, self.channel))
+                    self.tts_queue.task_done()
+                    continue
+                text = message.payload
                 logging.info("tts_module 成功拿到一条文本")
 
                 file_name = "/xxxx/generate.wav" ## 保存TTS合成后的语音片段
 
-                try:
-                    if streaming:
-                        await self.process_audio_stream(text, file_name)
-                    else:
-                        await self.process_audio(text, file_name)
-                    logging.info(f'成功合成一条音频：{text}')
-                except Exception as e:
-                    logging.error(f'处理文本 "{text}" 时发生错误: {e}')
+                # 先获取合成名额再开始合成，限制同时合成的分段数
+                await self.slots.acquire()
+                # 等待名额期间轮次可能已过期
+                if self.turns.is_stale(message):
+                    self.slots.release()
+                    self.tts_queue.task_done()
+                    continue
+                chunks = asyncio.Queue()
+                if streaming:
+                    task = asyncio.create_task(self.process_audio_stream(text, file_name, chunks))
+                else:
+                    task = asyncio.create_task(self.process_audio(text, file_name, chunks))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+                # 任务结束时（包括尚未开始就被取消）放入结束标记，播放端不会一直等待
+                task.add_done_callback(lambda _, chunks=chunks: chunks.put_nowait(None))
+                self.playback.put_nowait((task, chunks, self.channel))
 
                 self.tts_queue.task_done()
         except asyncio.CancelledError:
@@ -64,39 +112,69 @@ class TTSModule:
         except Exception as e:
             logging.error(f'运行过程中发生错误: {e}')
         finally:
-            # 确保 logger_task 被取消
+            # 确保 logger_task 和 player_task 被取消
+            player_task.cancel()
             logger_task.cancel()
-            await logger_task
+            await asyncio.gather(player_task, logger_task, return_exceptions=True)
+
+    async def play_in_order(self):
+        """
+        按分段顺序取出合成结果放入发送队列，前一分段的音频全部放入后才处理下一分段，
+        处理完一个分段后释放其合成名额。
+        """
+        while True:
+            task, chunks, channel = await self.playback.get()
+            if task is None:
+                if not self.turns.is_stale(channel):
+                    await channel.end()
+                continue
+            try:
+                while (data := await chunks.get()) is not None:
+                    if not self.turns.is_stale(channel):
+                        await channel.put(data)
+            finally:
+                self.slots.release()
+            logging.info('成功放入一个分段的音频')
 
-    async def process_audio_stream(self, text: str, file_path: Path):
-        """Streams audio data directly to the send_audio_queue without using a cache."""
+    async def process_audio_stream(self, text: str, file_path: Path, chunks: asyncio.Queue):
+        """
+        流式合成，音频每攒够 jitter_ms 就作为一段自包含的 PCMAudio 放入 chunks，结束标记由任务的完成回调放入。
+        后端只在流的开头返回 WAV 头，后续的每一段都重新生成头部，客户端可以逐段独立播放。
+        """
+        reframer = WavStreamReframer(self.jitter_ms, self._sample_rate, self._channels)
         try:
             async for data in self.tts_engine.stream(text):
-                await self.send_audio_queue.put(data)
-                logging.info('成功流式put音频')
+                for audio in reframer.feed(data):
+                    chunks.put_nowait(audio)
+            if (audio := reframer.flush()) is not None:
+                chunks.put_nowait(audio)
+            logging.info(f'成功合成一条音频：{text}')
         except asyncio.CancelledError:
             logging.info("process_audio_stream 被取消")
             raise
         except Exception as e:
             logging.error(f'流式处理音频时发生错误: {e}')
 
-    async def process_audio(self, text: str, file_path):
-        """积累并在流完成后处理音频数据。"""
+    async def process_audio(self, text: str, file_path, chunks: asyncio.Queue):
+        """积累并在流完成后整体放入 chunks，结束标记由任务的完成回调放入。"""
+        reframer = WavStreamReframer(None, self._sample_rate, self._channels)
         try:
             async for data in self.tts_engine.stream(text):
-                self.cache.extend(data)
-
+                reframer.feed(data)
+            if (audio := reframer.flush()) is not None:
+                chunks.put_nowait(audio)
+            logging.info(f'成功合成一条音频：{text}')
         except asyncio.CancelledError:
             logging.info("process_audio 被取消")
             raise
-        finally:
-            if self.cache:
-                await self.send_audio_queue.put(bytes(self.cache))
-                self.cache.clear()  # 确保最终缓存被清空
+        except Exception as e:
+            logging.error(f'处理文本 "{text}" 时发生错误: {e}')
 
     async def reset(self):
         """
         快速重置模块，通过取消所有相关任务并重置 TTS 引擎。
+        被取消的合成任务（包括尚未开始运行的）由完成回调放入结束标记，
+        排队中的过期分段由 play_in_order 丢弃并释放合成名额。
         """
         async with self.reset_lock:
             logging.info("开始重置 TTSModule")
@@ -110,10 +188,6 @@ class TTSModule:
             await asyncio.gather(*tasks, return_exceptions=True)
             self.tasks.clear()
             
-            # 清空全局缓存
-            self.cache.clear()
-            logging.info("全局缓存已清空")
-            
             # 重新初始化 TTS 引擎（如果需要）
             # self.tts_engine = FishSpeechTTS()
             
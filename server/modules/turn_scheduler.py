@@ -0,0 +1,128 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Dict, Optional
+from messages import TurnTracker
+
+logging.basicConfig(
+    filename=Path('./log.txt'),
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+
+class AdmissionLimiter:
+    """
+    进程级的准入限制：所有会话同时进行的 ASR→LLM 请求不超过 limit，超出的在此排队，
+    避免连接数增长时后端被同时打满。limit 为 None 时不限制。
+    """
+    def __init__(self, limit: Optional[int] = None):
+        self.limit = limit
+        self._semaphore = None
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        if self.limit is None:
+            self.active += 1
+            self.admitted += 1
+            try:
+                yield
+            finally:
+                self.active -= 1
+            return
+
+        # 信号量在第一次使用时于当前事件循环中创建
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {'limit': self.limit, 'active': self.active, 'waiting': self.waiting, 'admitted': self.admitted}
+
+
+class TurnScheduler:
+    """
+    会话级的轮次调度：每个检测到的语音片段作为一个轮次任务提交。
+    - 新轮次提交时取消仍在进行的旧轮次，它们的结果会按轮次丢弃，没有必要继续占用后端；
+    - 同一会话同时运行的轮次不超过 max_concurrent，多个回复不会交错流入下游；
+    - 所有会话共享 admission 的全局准入限制。
+    排队期间轮次过期的任务直接跳过。
+    """
+    def __init__(self, turns: TurnTracker, max_concurrent: int = 1, admission: AdmissionLimiter = None):
+        """
+        :param turns: 会话的轮次计数器。
+        :param max_concurrent: 会话内同时运行的轮次上限。
+        :param admission: 进程级准入限制，None 表示不限制。
+        """
+        self.turns = turns
+        self.max_concurrent = max_concurrent
+        self.admission = admission or AdmissionLimiter()
+        self._slots = None
+        self.tasks: Dict[asyncio.Task, int] = {}
+        self.submitted = 0
+        self.superseded = 0
+        self.skipped = 0
+
+    def submit(self, turn_id: int, coro) -> asyncio.Task:
+        """提交一个轮次的协程，返回对应的任务。"""
+        self.supersede(turn_id)
+        task = asyncio.create_task(self._run(turn_id, coro))
+        self.tasks[task] = turn_id
+        task.add_done_callback(lambda t: self.tasks.pop(t, None))
+        self.submitted += 1
+        return task
+
+    def supersede(self, turn_id: int):
+        """取消早于 turn_id 的轮次任务。"""
+        for task, task_turn in list(self.tasks.items()):
+            if task_turn < turn_id and not task.done():
+                task.cancel()
+                self.superseded += 1
+                logging.info(f'轮次 {task_turn} 被轮次 {turn_id} 取代，已取消')
+
+    async def _run(self, turn_id: int, coro):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+        try:
+            async with self._slots:
+                if self.turns.current != turn_id:
+                    self.skipped += 1
+                    return
+                async with self.admission.slot():
+                    if self.turns.current != turn_id:
+                        self.skipped += 1
+                        return
+                    await coro
+        finally:
+            # 排队期间被取消或跳过时协程从未运行，关闭以免告警
+            coro.close()
+
+    async def cancel_all(self):
+        tasks = list(self.tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            'running': len(self.tasks),
+            'submitted': self.submitted,
+            'superseded': self.superseded,
+            'skipped': self.skipped,
+            'admission': self.admission.stats(),
+        }
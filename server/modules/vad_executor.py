@@ -0,0 +1,306 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
+import torch
+from silero_vad import get_speech_timestamps
+from vad_pool import VADModelPool
+
+logging.basicConfig(
+    filename=Path('./log.txt'),
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# 进程池模式下每个工作进程各自持有的模型池
+_worker_pool = None
+
+
+def _init_worker(torch_threads: int, onnx=None):
+    """工作进程初始化：限制本进程的 torch 线程数，并在进程内加载模型。"""
+    global _worker_pool
+    torch.set_num_threads(torch_threads)
+    if onnx is not None:
+        _worker_pool = VADModelPool(size=1, onnx=onnx)
+        _worker_pool.load()
+
+
+def decode_audio(audio_data, resampler=None):
+    """
+    将 16 位 PCM 字节或张量转换为归一化的 float32 张量，必要时重采样。
+    数据格式不支持时抛出 ValueError。
+    """
+    if isinstance(audio_data, bytes):
+        audio_tensor = torch.from_numpy(np.frombuffer(audio_data, dtype=np.int16).astype(np.float32)) / 32768.0
+    elif isinstance(audio_data, torch.Tensor):
+        if audio_data.dtype == torch.int16:
+            audio_tensor = audio_data.float() / 32768.0
+        elif audio_data.dtype == torch.float32:
+            audio_tensor = audio_data
+        else:
+            raise ValueError("不支持的Tensor数据类型")
+    else:
+        raise ValueError("audio_data格式不支持")
+
+    if resampler is not None:
+        audio_tensor = resampler(audio_tensor)
+    return audio_tensor
+
+
+def _call_frames(model, frames: torch.Tensor, sampling_rate: int):
+    """在当前线程中逐帧推理，模型可以是 VADSession 或 silero_vad 模型。"""
+    return [model(frame, sampling_rate).item() for frame in frames]
+
+
+def _run_frames_in_worker(frames: torch.Tensor, sampling_rate: int, state):
+    """进程模式下在工作进程中逐帧推理，会话状态随调用往返传递。"""
+    probs = []
+    for frame in frames:
+        speech_prob, state = _worker_pool.infer(frame, sampling_rate, state)
+        probs.append(speech_prob.item())
+    return probs, state
+
+
+def _speech_timestamps_in_worker(audio: torch.Tensor, sampling_rate: int, threshold: float):
+    return get_speech_timestamps(audio, _worker_pool.session(), sampling_rate=sampling_rate, threshold=threshold)
+
+
+class VADExecutor:
+    """
+    在事件循环之外执行 VAD 推理和音频解码的可插拔执行器。
+    - thread：线程池，使用进程级模型池中的模型；torch 线程数是进程级设置，启动时设置一次，所有工作线程共用；
+    - process：进程池，每个工作进程各自加载模型并限制自身的 torch 线程数，会话状态随调用传递。
+    所有会话共享同一个执行器，max_pending 限制同时排队的任务数，超出时调用方等待，形成背压。
+    """
+    def __init__(self,
+                 pool: VADModelPool,
+                 kind: str = 'thread',
+                 max_workers: int = 2,
+                 torch_threads: int = 1,
+                 max_pending: int = 64):
+        """
+        :param pool: 进程级 VAD 模型池，线程模式下使用。
+        :param kind: 'thread' 或 'process'。
+        :param max_workers: 工作线程/进程数。
+        :param torch_threads: torch 线程数，线程模式下作用于整个服务进程，进程模式下作用于每个工作进程。
+        :param max_pending: 同时提交的最大任务数。
+        """
+        if kind not in ('thread', 'process'):
+            raise ValueError(f'不支持的执行器类型: {kind}')
+        self.pool = pool
+        self.kind = kind
+        self.max_workers = max_workers
+        self.torch_threads = torch_threads
+        self.max_pending = max_pending
+        self._semaphore = asyncio.Semaphore(max_pending)
+        self._executor = None
+
+    def start(self):
+        """创建线程池或进程池。"""
+        if self._executor is not None:
+            return
+        if self.kind == 'thread':
+            # set_num_threads 对整个进程生效，不能按线程设置，只在创建线程池时设置一次
+            torch.set_num_threads(self.torch_threads)
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix='vad'
+            )
+        else:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_worker,
+                initargs=(self.torch_threads, self.pool.onnx)
+            )
+        logging.info(f'VAD 执行器已启动，类型: {self.kind}，工作数: {self.max_workers}')
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            logging.info('VAD 执行器已关闭')
+
+    async def run(self, fn, *args, **kwargs):
+        """在执行器中运行 fn，受 max_pending 限制。"""
+        if self._executor is None:
+            self.start()
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    async def decode(self, audio_data, resampler=None):
+        return await self.run(decode_audio, audio_data, resampler)
+
+    async def speech_probs(self, model, frames: torch.Tensor, sampling_rate: int):
+        """
+        对一批帧依次推理，返回每帧的语音概率。
+
+        :param model: VADSession（进程模式下只使用其 state）或 silero_vad 模型。
+        :param frames: 形状为 (帧数, 帧长) 的张量。
+        """
+        if self.kind == 'process':
+            probs, model.state = await self.run(_run_frames_in_worker, frames, sampling_rate, model.state)
+            return probs
+        return await self.run(_call_frames, model, frames, sampling_rate)
+
+    async def speech_timestamps(self, audio: torch.Tensor, model, sampling_rate: int, threshold: float):
+        if self.kind == 'process':
+            return await self.run(_speech_timestamps_in_worker, audio, sampling_rate, threshold)
+        return await self.run(get_speech_timestamps, audio, model, sampling_rate=sampling_rate, threshold=threshold)
+
+
+def _initial_state(sampling_rate: int):
+    """与 silero_vad reset_states 一致的单会话初始状态，显式给出上下文以便拼接成批。"""
+    context_size = 64 if sampling_rate == 16000 else 32
+    return {
+        '_state': torch.zeros((2, 1, 128), dtype=torch.float32),
+        '_context': torch.zeros((1, context_size), dtype=torch.float32),
+        '_last_sr': sampling_rate,
+        '_last_batch_size': 1,
+    }
+
+
+def _run_batched(pool: VADModelPool, frames_list, states, sampling_rate: int):
+    """
+    对多个会话的帧做批量推理。
+    第 t 步把所有还有第 t 帧的会话拼成一批，循环状态沿 batch 维拼接后一次前向，再按会话拆分。
+
+    :param frames_list: 每个会话形状为 (帧数, 帧长) 的张量。
+    :param states: 每个会话的状态，None 表示初始状态。
+    :return: (每个会话的概率列表, 每个会话的新状态)
+    """
+    states = [state if state is not None else _initial_state(sampling_rate) for state in states]
+    probs = [[] for _ in frames_list]
+    steps = max(len(frames) for frames in frames_list)
+
+    with pool.acquire() as model:
+        for t in range(steps):
+            active = [i for i, frames in enumerate(frames_list) if len(frames) > t]
+            batch = torch.stack([frames_list[i][t] for i in active])
+            model._state = torch.cat([states[i]['_state'] for i in active], dim=1)
+            model._context = torch.cat([states[i]['_context'] for i in active], dim=0)
+            model._last_sr = sampling_rate
+            model._last_batch_size = len(active)
+
+            out = model(batch, sampling_rate).reshape(-1)
+            new_state = model._state
+            new_context = model._context
+            for j, i in enumerate(active):
+                probs[i].append(out[j].item())
+                states[i] = {
+                    '_state': new_state[:, j:j + 1],
+                    '_context': new_context[j:j + 1],
+                    '_last_sr': sampling_rate,
+                    '_last_batch_size': 1,
+                }
+    return probs, states
+
+
+class VADBatchScheduler:
+    """
+    跨会话的批量 VAD 推理调度器。
+    在 window_ms 时间窗内收集所有会话提交的帧，按采样率分组后做一次批量前向，
+    各会话的循环状态分别保存在自己的 VADSession 中，推理结果按会话返回。
+    接口与 VADExecutor 一致，可直接作为 AudioDetectionModule 的 executor 使用；
+    解码等其他任务交给内部的 VADExecutor（需为线程模式）。
+    """
+    def __init__(self, executor: VADExecutor, window_ms: float = 5, max_batch: int = 64):
+        """
+        :param executor: 线程模式的 VADExecutor，批量推理在其中运行。
+        :param window_ms: 收集帧的时间窗（毫秒）。
+        :param max_batch: 单批最多包含的会话请求数，达到后立即推理。
+        """
+        if executor.kind != 'thread':
+            raise ValueError('VADBatchScheduler 需要线程模式的 VADExecutor')
+        self.executor = executor
+        self.kind = executor.kind
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending = []
+        self._wakeup = None
+        self._full = None
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._full = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+            logging.info(f'VAD 批量调度器已启动，时间窗: {self.window * 1000:.1f} 毫秒，最大批量: {self.max_batch}')
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for _, _, _, future in self._pending:
+            if not future.done():
+                future.cancel()
+        self._pending.clear()
+
+    async def decode(self, audio_data, resampler=None):
+        return await self.executor.decode(audio_data, resampler)
+
+    async def speech_timestamps(self, audio, model, sampling_rate: int, threshold: float):
+        return await self.executor.speech_timestamps(audio, model, sampling_rate, threshold)
+
+    async def speech_probs(self, model, frames: torch.Tensor, sampling_rate: int):
+        """
+        提交一个会话的一批连续帧，等待批量推理完成后返回该会话每帧的语音概率。
+
+        :param model: 该会话的 VADSession。
+        """
+        if self._task is None:
+            self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((model, frames, sampling_rate, future))
+        self._wakeup.set()
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+        return await future
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            # 等待时间窗结束或批量已满
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.window)
+            except asyncio.TimeoutError:
+                pass
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            if len(self._pending) < self.max_batch:
+                self._full.clear()
+            if not self._pending:
+                self._wakeup.clear()
+            if batch:
+                await self._infer(batch)
+
+    async def _infer(self, batch):
+        groups = {}
+        for request in batch:
+            groups.setdefault(request[2], []).append(request)
+
+        for sampling_rate, requests in groups.items():
+            sessions = [request[0] for request in requests]
+            try:
+                probs, states = await self.executor.run(
+                    _run_batched,
+                    self.executor.pool,
+                    [request[1] for request in requests],
+                    [session.state for session in sessions],
+                    sampling_rate
+                )
+            except Exception as e:
+                logging.error(f'批量 VAD 推理出错: {e}')
+                for _, _, _, future in requests:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for session, session_probs, state, (_, _, _, future) in zip(sessions, probs, states, requests):
+                session.state = state
+                if not future.done():
+                    future.set_result(session_probs)
+            logging.debug(f'批量 VAD 推理完成，会话数: {len(requests)}')
@@ -0,0 +1,96 @@
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from silero_vad import load_silero_vad
+
+logging.basicConfig(
+    filename=Path('./log.txt'),
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# silero_vad 模型内部保存循环状态的属性（JIT 与 ONNX 实现一致）
+_STATE_ATTRS = ('_state', '_context', '_last_sr', '_last_batch_size')
+
+
+class VADModelPool:
+    """
+    进程级 Silero VAD 模型池。
+    模型权重在应用启动时只加载一次，由所有会话共享；
+    每个会话的循环状态保存在各自的 VADSession 中，推理前写回模型、推理后取出，
+    因此不同会话之间的状态互不干扰。
+    """
+    def __init__(self, size: int = 1, onnx: bool = False):
+        """
+        :param size: 池中模型实例数量，决定可同时进行推理的线程数。
+        :param onnx: 是否加载 ONNX 版本的模型。
+        """
+        self.size = size
+        self.onnx = onnx
+        self.loaded = False
+        self._models = queue.Queue()
+        self._load_lock = threading.Lock()
+
+    def load(self):
+        """加载模型到池中，重复调用不会重复加载。"""
+        with self._load_lock:
+            if self.loaded:
+                return
+            start_time = time.time()
+            for _ in range(self.size):
+                self._models.put(load_silero_vad(onnx=self.onnx))
+            self.loaded = True
+            logging.info(f'VAD 模型池加载完成，实例数: {self.size}，耗时: {time.time() - start_time:.4f} 秒')
+
+    @contextmanager
+    def acquire(self):
+        """从池中借出一个模型实例，用完后归还。"""
+        if not self.loaded:
+            self.load()
+        model = self._models.get()
+        try:
+            yield model
+        finally:
+            self._models.put(model)
+
+    def infer(self, chunk, sampling_rate: int, state=None):
+        """
+        使用给定的会话状态对一帧音频进行推理。
+
+        :param chunk: 音频帧张量。
+        :param sampling_rate: 采样率。
+        :param state: 会话状态，None 表示从初始状态开始。
+        :return: (语音概率, 推理后的会话状态)
+        """
+        with self.acquire() as model:
+            if state is None:
+                model.reset_states()
+            else:
+                for name, value in state.items():
+                    setattr(model, name, value)
+            speech_prob = model(chunk, sampling_rate)
+            return speech_prob, {name: getattr(model, name) for name in _STATE_ATTRS}
+
+    def session(self):
+        """为一个连接创建独立的 VAD 会话。"""
+        return VADSession(self)
+
+
+class VADSession:
+    """
+    单个会话的 VAD 句柄，接口与 silero_vad 模型一致（reset_states / __call__），
+    可以直接传给 get_speech_timestamps 等工具函数。
+    """
+    def __init__(self, pool: VADModelPool):
+        self.pool = pool
+        self.state = None
+
+    def reset_states(self):
+        self.state = None
+
+    def __call__(self, chunk, sampling_rate: int):
+        speech_prob, self.state = self.pool.infer(chunk, sampling_rate, self.state)
+        return speech_prob
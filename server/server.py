@@ -1,12 +1,25 @@
 import asyncio
+import uuid
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from modules.audio_detection import AudioDetectionModule
 from modules.audio_processing import AudioProcessingModule
 from modules.text_processing import TextProcessingModule
 from modules.tts_module import TTSModule
 from modules.data_transmission import DataTransmissionModule
-from modules.data_storage import DataStorageModule
-from silero_vad import load_silero_vad
+from modules.data_storage import DataStorageModule, TurnLog
+from modules.vad_pool import VADModelPool
+from modules.vad_executor import VADExecutor, VADBatchScheduler
+from modules.stage_queue import StageQueue, OverflowPolicy
+from modules.messages import TurnTracker
+from modules.filler_audio import FillerAudio, DEFAULT_FILLER_PHRASES
+from modules.turn_scheduler import AdmissionLimiter
+from modules.models.TTS.fish_speech_tts import FishSpeechTTS
+from modules.models.TTS.cached_tts import CachedTTS
+# 模型客户端以 models.http_client 导入注册表，这里使用同一模块名以共享同一个实例
+from models.http_client import http_clients, BackendConfig
+from models.router import routers
+from models.ASR.streaming_asr import WebSocketStreamingASR
+from models.ASR.asr_batcher import asr_batcher
 from fastapi.middleware.cors import CORSMiddleware
 import aiofiles
 
@@ -21,19 +34,123 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 进程级 VAD 模型池，所有连接共享模型权重
+vad_pool = VADModelPool(size=2)
+# VAD 推理和音频解码在事件循环之外执行，线程数与模型实例数一致
+vad_executor = VADExecutor(vad_pool, kind='thread', max_workers=vad_pool.size, torch_threads=1)
+# 在短时间窗内合并所有连接的 VAD 帧，做一次批量推理
+vad_scheduler = VADBatchScheduler(vad_executor, window_ms=5, max_batch=64)
+# 所有连接同时进行的 ASR→LLM 请求上限，超出的排队等待；每个连接同时处理的轮次上限
+turn_admission = AdmissionLimiter(limit=32)
+MAX_CONCURRENT_TURNS = 1
+
+# 对话日志目录和重连时恢复的历史条数
+HISTORY_DIR = './history'
+RESUME_TURNS = 16
+# 对话日志的总大小上限（字节）和保留天数，超出时删除最旧的分段
+HISTORY_MAX_BYTES = 4 * 1024 ** 3
+HISTORY_MAX_AGE_DAYS = 30
+# 进程级对话日志，在启动时打开
+turn_log = None
+# 进程级 TTS 引擎，合成结果缓存由所有连接共享
+tts_engine = CachedTTS(FishSpeechTTS())
+# 进程级填充音频，在启动时预先合成，用户说完话后先播放一条应答语
+FILLER_PHRASES = DEFAULT_FILLER_PHRASES
+filler_audio = None
+filler_load_task = None
+
+# 各后端的连接池与超时配置，所有连接共享同一组 HTTP 会话
+HTTP_BACKENDS = {
+    'asr': BackendConfig(limit_per_host=16, total_timeout=30),
+    'llm': BackendConfig(limit_per_host=32, sock_read_timeout=60),   # 流式回复，不限制总时长
+    'fish_tts': BackendConfig(limit_per_host=32, sock_read_timeout=30),
+    'cosy_tts': BackendConfig(limit_per_host=32, sock_read_timeout=30),
+    'mm': BackendConfig(limit_per_host=16, sock_read_timeout=60),
+}
+
+# 各后端的副本列表（完整请求 URL）与负载均衡配置，endpoints 为空时使用客户端自身的 URL；
+# 名称同时是共享 HTTP 会话的名称，不同的 TTS 引擎使用各自的名称，副本和延迟统计互不混用
+ROUTER_CONFIG = {
+    'asr': {'endpoints': [], 'strategy': 'least_outstanding'},
+    'asr_stream': {'endpoints': [], 'strategy': 'least_outstanding'},
+    'llm': {'endpoints': [], 'strategy': 'least_outstanding'},
+    'fish_tts': {'endpoints': [], 'strategy': 'ewma', 'health_path': '/v1/health'},  # Fish Speech 服务提供 /v1/health
+    'cosy_tts': {'endpoints': [], 'strategy': 'ewma'},
+}
+
+# 跨连接的 ASR 微批：window_ms 时间窗内所有连接的整句音频合并为一次多文件请求，max_batch 为单批上限；window_ms 为 None 时不合批
+ASR_BATCH = {'window_ms': 20, 'max_batch': 8}
+
+# 流式 ASR 的 WebSocket 地址，配置后说话期间即开始识别；None 表示一句话结束后整句识别
+# 本地联调可运行 modules/models/ASR/stream_asr_server.py，地址为 ws://127.0.0.1:8765/asr/stream
+STREAMING_ASR_URL = None
+# 中间结果保持不变多久（毫秒）后提前请求 LLM，需配置流式 ASR；None 表示不投机执行
+SPECULATION_STABLE_MS = 300
+
+@app.on_event("startup")
+async def load_vad_pool():
+    # 在启动时加载一次模型，避免每个连接都承担加载延迟
+    await asyncio.to_thread(vad_pool.load)
+    vad_executor.start()
+    vad_scheduler.start()
+    global turn_log, filler_audio, filler_load_task
+    for name, config in HTTP_BACKENDS.items():
+        http_clients.configure(name, config)
+    for name, config in ROUTER_CONFIG.items():
+        if config['endpoints']:
+            routers.configure(name, **config)
+    routers.start()
+    asr_batcher.configure(**ASR_BATCH)
+    turn_log = TurnLog(HISTORY_DIR, max_bytes=HISTORY_MAX_BYTES, max_age_days=HISTORY_MAX_AGE_DAYS)
+    filler_audio = FillerAudio(tts_engine, FILLER_PHRASES)
+    # 在后台合成填充音频，不阻塞服务启动
+    filler_load_task = asyncio.create_task(filler_audio.load())
+
+@app.on_event("shutdown")
+async def shutdown_vad_executor():
+    await vad_scheduler.stop()
+    if filler_load_task:
+        filler_load_task.cancel()
+        await asyncio.gather(filler_load_task, return_exceptions=True)
+    vad_executor.shutdown()
+    if turn_log:
+        turn_log.close()
+    await asr_batcher.stop()
+    await routers.stop()
+    await http_clients.close()
+
+# 各阶段队列的容量与溢出策略：(maxsize, policy)
+QUEUE_CONFIG = {
+    'raw_audio_queue': (256, OverflowPolicy.DROP_OLDEST),       # 检测跟不上时丢弃最旧的音频块
+    'detected_audio_queue': (4, OverflowPolicy.BLOCK),          # 用户的每句话（含超长语音的前段）都不能丢弃，满时反压到检测
+    'text_queue': (256, OverflowPolicy.COALESCE),               # LLM 文本块满时合并到队尾，结束标志 None 不合并
+    'send_text_queue': (256, OverflowPolicy.BLOCK),             # 含 $clear$ 等控制消息，不能丢弃或合并
+    'tts_queue': (64, OverflowPolicy.BLOCK),                    # 反压到文本处理
+    'send_audio_queue': (64, OverflowPolicy.BLOCK),             # 客户端过慢时反压到 TTS
+}
+
 class Pipeline:
-    def __init__(self):
-        # 定义各个队列
-        self.raw_audio_queue = asyncio.Queue()
-        self.detected_audio_queue = asyncio.Queue()
-        self.text_queue = asyncio.Queue()
-        self.send_text_queue = asyncio.Queue()
-        self.tts_queue = asyncio.Queue()
-        self.send_audio_queue = asyncio.Queue()
-        self.history_text_queue = asyncio.Queue()
-        self.history_audio_queue = asyncio.Queue()
-
-        self.model = None  # 延迟加载 silero_vad
+    def __init__(self, vad_pool: VADModelPool, vad_executor=None, session_id: str = None):
+        # 定义各个队列，容量与溢出策略见 QUEUE_CONFIG
+        self.queues = {
+            name: StageQueue(name, maxsize=maxsize, policy=policy)
+            for name, (maxsize, policy) in QUEUE_CONFIG.items()
+        }
+        self.raw_audio_queue = self.queues['raw_audio_queue']
+        self.detected_audio_queue = self.queues['detected_audio_queue']
+        self.text_queue = self.queues['text_queue']
+        self.send_text_queue = self.queues['send_text_queue']
+        self.tts_queue = self.queues['tts_queue']
+        self.send_audio_queue = self.queues['send_audio_queue']
+
+        # 会话级对话历史，写入进程级对话日志，重连时按 session_id 恢复
+        self.session_id = session_id
+        self.data_storage = DataStorageModule(session_id=session_id, turn_log=turn_log)
+        # 会话级轮次计数器，各阶段据此丢弃被打断轮次的消息
+        self.turns = TurnTracker()
+
+        self.vad_pool = vad_pool  # 共享的 silero_vad 模型池
+        self.vad_executor = vad_executor  # VADExecutor 或 VADBatchScheduler
 
         # 初始化模块引用为 None
         self.audio_detection = None
@@ -50,42 +167,55 @@ class Pipeline:
         self.data_transmission = DataTransmissionModule(
             send_audio_queue=self.send_audio_queue,
             send_text_queue=self.send_text_queue,
-            history_audio_queue=self.history_audio_queue,
-            history_text_queue=self.history_text_queue,
+            data_storage=self.data_storage,
+            turns=self.turns,
         )
-        self.data_transmission.set_websocket(websocket)
+        await self.data_transmission.set_websocket(websocket)
 
         # 初始化各个模块并发送状态更新
         await self.send_status("Modules initializing.")
+        resumed = await self.data_storage.resume(RESUME_TURNS)
+        await self.send_status(f"Session: {self.session_id}, resumed {resumed} turns.")
         # await self.send_status("Initializing silero_vad model...")
-        self.model = load_silero_vad()
 
         self.audio_detection = AudioDetectionModule(
-            model=self.model,
+            model=self.vad_pool.session(),
             audio_queue=self.raw_audio_queue,
             detected_audio_queue=self.detected_audio_queue,
             send_text_queue=self.send_text_queue,
-            history_audio_queue=self.history_audio_queue,
+            data_storage=self.data_storage,
             reset_callback=self.reset_pipeline,
+            streaming_vad=True,
+            executor=self.vad_executor,
+            turns=self.turns,
+            end_of_speech_callback=self.play_filler,
+            streaming_asr=WebSocketStreamingASR(STREAMING_ASR_URL) if STREAMING_ASR_URL else None,
+            partial_callback=self.on_asr_partial,
         )
         
         self.audio_processing = AudioProcessingModule(
             audio_queue=self.detected_audio_queue,
             text_queue=self.text_queue,
-            history_audio_queue=self.history_audio_queue,
-            history_text_queue=self.history_text_queue,
+            data_storage=self.data_storage,
             send_text_queue=self.send_text_queue,
+            turns=self.turns,
+            speculation_stable_ms=SPECULATION_STABLE_MS,
+            max_concurrent_turns=MAX_CONCURRENT_TURNS,
+            admission=turn_admission,
         )
         
         self.text_processing = TextProcessingModule(
             text_queue=self.text_queue,
             tts_queue=self.tts_queue,
             send_text_queue=self.send_text_queue,
+            turns=self.turns,
         )
         
         self.tts_module = TTSModule(
             tts_queue=self.tts_queue,
             send_audio_queue=self.send_audio_queue,
+            turns=self.turns,
+            tts_engine=tts_engine,
         )
 
         # 启动任务
@@ -102,9 +232,18 @@ class Pipeline:
         if self.websocket:
             await self.websocket.send_text(message)
 
+    async def play_filler(self, turn_id: int):
+        if filler_audio and self.data_transmission:
+            self.data_transmission.play_filler(turn_id, filler_audio.pick())
+
+    async def on_asr_partial(self, turn_id: int, text: str):
+        if self.audio_processing:
+            await self.audio_processing.on_partial(turn_id, text)
+
     async def reset_pipeline(self):
         print("Resetting pipeline...")
-        # 清空除上下文队列之外的所有队列
+        # 新轮次刚开始，各阶段之间的队列中只有被打断轮次的消息，直接清空；
+        # 原始音频队列中是本轮开头的音频，不能清空
         await self.clear_queues()
         # 释放资源（api请求）
         if self.text_processing:
@@ -114,47 +253,62 @@ class Pipeline:
         if self.tts_module:
             await self.tts_module.reset()
         if self.data_transmission:
-            await self.data_transmission.set_websocket(self.websocket)
+            self.data_transmission.cancel_filler()
 
     async def clear_queues(self):
         queues = [
-            self.raw_audio_queue,
             self.detected_audio_queue,
             self.text_queue,
             self.tts_queue,
-            self.send_audio_queue
+            self.send_audio_queue,
         ]
         for q in queues:
             while not q.empty():
                 try:
-                    q.get_nowait()
+                    message = q.get_nowait()
                     q.task_done()
                 except asyncio.QueueEmpty:
                     break
+                # 丢弃的语音片段不再等待其流式识别结果
+                transcript = getattr(message.payload, 'transcript', None)
+                if transcript is not None:
+                    transcript.cancel()
 
-    async def clear_history_queues(self):
-        queues = [
-            self.history_text_queue,
-            self.history_audio_queue
-        ]
-        for q in queues:
-            while not q.empty():
-                try:
-                    q.get_nowait()
-                    q.task_done()
-                except asyncio.QueueEmpty:
-                    break
+    def clear_history(self):
+        # 只清空内存中的历史，对话日志保留以便重连恢复
+        self.data_storage.clear()
+
+    def queue_stats(self):
+        """返回各阶段队列的深度、丢弃和合并计数。"""
+        return [q.stats() for q in self.queues.values()]
+
+    def speculation_stats(self):
+        """返回投机执行的次数、命中率和浪费的 token 数。"""
+        return self.audio_processing.speculation_stats.as_dict() if self.audio_processing else {}
 
     async def shutdown(self):
+        print(f"Queue stats: {self.queue_stats()}")
+        print(f"Speculation stats: {self.speculation_stats()}")
+        print(f"TTS cache stats: {tts_engine.stats()}")
+        if self.audio_processing:
+            print(f"Turn scheduler stats: {self.audio_processing.scheduler.stats()}")
         await self.reset_pipeline()
-        await self.clear_history_queues()
+        self.clear_history()
+        if self.audio_detection:
+            # 客户端在说话中途断开时，关闭仍在进行的流式识别会话
+            await self.audio_detection.close()
         for task in self.tasks:
             task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
-    pipeline = Pipeline()
+    # 客户端通过 ?session_id=... 恢复之前的会话，未提供或不合法时新建会话
+    session_id = websocket.query_params.get('session_id')
+    if not TurnLog.valid_session_id(session_id):
+        session_id = uuid.uuid4().hex
+    pipeline = Pipeline(vad_pool, vad_scheduler, session_id=session_id)
     
     # 初始化 pipeline 并发送状态更新
     await pipeline.initialize_pipeline(websocket)
@@ -0,0 +1,123 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'modules'))
+
+from models.ASR.asr_batcher import ASRBatcher
+
+
+class FakeASR:
+    """记录每次批量请求，按顺序返回各段音频的文本。"""
+    def __init__(self, url='http://asr', error=None, delay=0.0):
+        self.url = url
+        self.error = error
+        self.delay = delay
+        self.batches = []
+
+    async def post_batch(self, audios, lang='auto'):
+        self.batches.append((list(audios), lang))
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return [audio.decode() for audio in audios]
+
+
+def run(coro_fn, **kwargs):
+    async def main():
+        batcher = ASRBatcher(**kwargs)
+        try:
+            return await coro_fn(batcher)
+        finally:
+            await batcher.stop()
+
+    return asyncio.run(main())
+
+
+def test_requests_within_window_share_one_batch():
+    asr = FakeASR()
+
+    async def main(batcher):
+        results = await asyncio.gather(*(batcher.transcribe(asr, f'a{i}'.encode()) for i in range(3)))
+        return results, batcher.stats()
+
+    results, stats = run(main, window_ms=20, max_batch=8)
+
+    assert results == ['a0', 'a1', 'a2']
+    assert asr.batches == [([b'a0', b'a1', b'a2'], 'auto')]
+    assert stats == {'batches': 1, 'items': 3, 'mean_batch': 3.0, 'pending': 0}
+
+
+def test_full_batch_is_sent_without_waiting_for_window():
+    asr = FakeASR()
+
+    async def main(batcher):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await asyncio.gather(*(batcher.transcribe(asr, f'a{i}'.encode()) for i in range(4)))
+        return loop.time() - start
+
+    elapsed = run(main, window_ms=5000, max_batch=2)
+
+    assert elapsed < 1
+    assert [len(audios) for audios, _ in asr.batches] == [2, 2]
+
+
+def test_batches_grouped_by_url_and_language():
+    zh, en = FakeASR('http://zh'), FakeASR('http://en')
+
+    async def main(batcher):
+        return await asyncio.gather(
+            batcher.transcribe(zh, b'z1', 'zh'),
+            batcher.transcribe(en, b'e1', 'en'),
+            batcher.transcribe(zh, b'z2', 'zh'),
+            batcher.transcribe(zh, b'z3', 'auto'),
+        )
+
+    results = run(main, window_ms=20)
+
+    assert results == ['z1', 'e1', 'z2', 'z3']
+    assert sorted(zh.batches) == [([b'z1', b'z2'], 'zh'), ([b'z3'], 'auto')]
+    assert en.batches == [([b'e1'], 'en')]
+
+
+def test_backend_error_fails_every_caller_in_batch():
+    asr = FakeASR(error=RuntimeError('asr down'))
+
+    async def main(batcher):
+        return await asyncio.gather(batcher.transcribe(asr, b'a'), batcher.transcribe(asr, b'b'),
+                                    return_exceptions=True)
+
+    results = run(main, window_ms=10)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_cancelled_caller_is_not_sent():
+    asr = FakeASR()
+
+    async def main(batcher):
+        cancelled = asyncio.create_task(batcher.transcribe(asr, b'gone'))
+        kept = asyncio.create_task(batcher.transcribe(asr, b'kept'))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        return await kept
+
+    assert run(main, window_ms=20) == 'kept'
+    assert asr.batches == [([b'kept'], 'auto')]
+
+
+def test_stop_cancels_pending_and_in_flight_requests():
+    asr = FakeASR(delay=10)
+
+    async def main(batcher):
+        task = asyncio.create_task(batcher.transcribe(asr, b'a'))
+        await asyncio.sleep(0.05)
+        await batcher.stop()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return batcher.stats()
+
+    assert run(main, window_ms=10)['pending'] == 0
@@ -0,0 +1,92 @@
+import struct
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'modules'))
+
+from audio_format import PCMAudio, WavStreamReframer, wav_header
+
+
+def pcm(samples: int, channels: int = 1) -> bytes:
+    return bytes(i % 256 for i in range(samples * 2 * channels))
+
+
+def feed_all(reframer, data, chunk_size):
+    segments = []
+    for start in range(0, len(data), chunk_size):
+        segments.extend(reframer.feed(data[start:start + chunk_size]))
+    return segments
+
+
+def test_pcm_audio_wav_header_matches_data():
+    audio = PCMAudio(pcm(160), 16000)
+
+    wav = audio.to_wav()
+    assert wav[:4] == b'RIFF' and wav[8:12] == b'WAVE'
+    assert struct.unpack_from('<I', wav, 40)[0] == len(audio.pcm) == 320
+    assert audio.duration == pytest.approx(0.01)
+
+
+def test_header_parsed_across_chunks_and_segments_are_self_contained():
+    data = pcm(16000)
+    # 后端的数据长度不可信
+    stream = wav_header(0xFFFFFFFF - 36, 16000) + data
+    reframer = WavStreamReframer(jitter_ms=200, sample_rate=8000)
+
+    segments = feed_all(reframer, stream, 7)
+    rest = reframer.flush()
+
+    assert segments and all(segment.duration >= 0.2 for segment in segments)
+    assert all(segment.sample_rate == 16000 for segment in segments)
+    assert b''.join(segment.pcm for segment in segments) + rest.pcm == data
+    for segment in segments:
+        assert struct.unpack_from('<I', segment.to_wav(), 40)[0] == len(segment.pcm)
+
+
+def test_segments_contain_whole_frames_only():
+    reframer = WavStreamReframer(jitter_ms=10, sample_rate=16000, channels=2)
+    stream = wav_header(0, 16000, channels=2) + pcm(1000, channels=2)
+
+    segments = feed_all(reframer, stream, 333)
+    rest = reframer.flush()
+
+    assert all(len(segment.pcm) % 4 == 0 for segment in segments + [rest])
+    assert sum(len(segment.pcm) for segment in segments + [rest]) == 4000
+
+
+def test_extra_chunks_before_data_are_skipped():
+    fmt = struct.pack('<HHIIHH', 1, 1, 24000, 48000, 2, 16)
+    header = b'RIFF' + struct.pack('<I', 0) + b'WAVE' + b'fmt ' + struct.pack('<I', 16) + fmt
+    header += b'LIST' + struct.pack('<I', 3) + b'abc\x00' + b'data' + struct.pack('<I', 0)
+    reframer = WavStreamReframer(jitter_ms=None)
+
+    assert reframer.feed(header + pcm(100)) == []
+    audio = reframer.flush()
+    assert audio.sample_rate == 24000
+    assert audio.pcm == pcm(100)
+
+
+def test_raw_pcm_uses_configured_format():
+    reframer = WavStreamReframer(jitter_ms=None, sample_rate=22050)
+    reframer.feed(pcm(50))
+
+    audio = reframer.flush()
+    assert audio.sample_rate == 22050
+    assert len(audio.pcm) == 100
+
+
+def test_non_16_bit_wav_is_rejected():
+    fmt = struct.pack('<HHIIHH', 1, 1, 16000, 32000, 1, 8)
+    header = b'RIFF' + struct.pack('<I', 0) + b'WAVE' + b'fmt ' + struct.pack('<I', 16) + fmt
+
+    with pytest.raises(ValueError):
+        WavStreamReframer().feed(header + b'data' + struct.pack('<I', 0))
+
+
+def test_flush_without_data_returns_none():
+    reframer = WavStreamReframer()
+    reframer.feed(wav_header(0, 16000))
+
+    assert reframer.flush() is None
@@ -0,0 +1,36 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'modules'))
+
+pytest.importorskip('aiohttp')
+
+from data_storage import DataStorageModule
+from models.LLM.deepseek_llm import DeepSeekLLM
+
+
+def test_default_max_history_uses_whole_history():
+    history = DataStorageModule()
+    history.add_user_text('你好')
+    history.add_assistant_text('你好，有什么可以帮你？')
+
+    messages = DeepSeekLLM.build_messages('今天天气怎么样', history)
+
+    assert messages[1:] == [
+        {'role': 'user', 'content': '你好'},
+        {'role': 'assistant', 'content': '你好，有什么可以帮你？'},
+        {'role': 'user', 'content': '今天天气怎么样'},
+    ]
+
+
+def test_max_history_limits_turns():
+    history = DataStorageModule()
+    for i in range(3):
+        history.add_user_text(f'问题{i}')
+        history.add_assistant_text(f'回答{i}')
+
+    messages = DeepSeekLLM.build_messages('新问题', history, max_history=1)
+
+    assert [m['content'] for m in messages[1:]] == ['问题2', '回答2', '新问题']
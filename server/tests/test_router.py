@@ -0,0 +1,156 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'modules'))
+
+pytest.importorskip('aiohttp')
+
+from aiohttp import web
+from models.http_client import http_clients
+from models.router import BackendRouter, RouterRegistry
+
+
+def test_least_outstanding_prefers_idle_replica():
+    router = BackendRouter('llm', ['http://a', 'http://b'])
+    router.endpoints[0].outstanding = 2
+
+    assert router.pick().url == 'http://b'
+
+
+def test_ewma_prefers_unmeasured_then_faster_replica():
+    router = BackendRouter('tts', ['http://a', 'http://b'], strategy='ewma')
+    router.endpoints[0].ewma_ms = 50
+    assert router.pick().url == 'http://b'
+
+    router.endpoints[1].ewma_ms = 80
+    assert router.pick().url == 'http://a'
+    # 进行中的请求数计入得分
+    router.endpoints[0].outstanding = 1
+    assert router.pick().url == 'http://b'
+
+
+def test_ewma_uses_first_byte_not_stream_duration():
+    async def main():
+        router = BackendRouter('llm', ['http://a'], strategy='ewma')
+        async with router.request() as route:
+            await asyncio.sleep(0.02)
+            route.first_byte()
+            await asyncio.sleep(0.1)
+        return router.endpoints[0]
+
+    endpoint = asyncio.run(main())
+
+    assert 15 <= endpoint.ewma_ms < 80
+    assert endpoint.stream_ewma_ms >= 100
+
+
+def test_total_duration_used_when_first_byte_not_marked():
+    async def main():
+        router = BackendRouter('asr', ['http://a'])
+        async with router.request():
+            await asyncio.sleep(0.02)
+        return router.endpoints[0]
+
+    endpoint = asyncio.run(main())
+
+    assert endpoint.ewma_ms == pytest.approx(endpoint.stream_ewma_ms, abs=1)
+
+
+def test_ewma_smoothing():
+    router = BackendRouter('llm', ['http://a'], ewma_alpha=0.5)
+    endpoint = router.endpoints[0]
+    router.record_latency(endpoint, 100)
+    router.record_latency(endpoint, 200)
+
+    assert endpoint.ewma_ms == 150
+
+
+def test_consecutive_failures_eject_replica():
+    async def main():
+        router = BackendRouter('llm', ['http://a', 'http://b'], eject_after=2, eject_seconds=60)
+        router.endpoints[1].outstanding = 5
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                async with router.request():
+                    raise RuntimeError('backend down')
+        return router
+
+    router = asyncio.run(main())
+
+    assert router.endpoints[0].stats()['ejected']
+    assert router.pick().url == 'http://b'
+
+
+def test_all_ejected_still_picks_a_replica():
+    router = BackendRouter('llm', ['http://a'], eject_after=1)
+    router.record_failure(router.endpoints[0])
+
+    assert router.pick().url == 'http://a'
+
+
+def test_success_resets_failure_count():
+    router = BackendRouter('llm', ['http://a'], eject_after=2)
+    endpoint = router.endpoints[0]
+    router.record_failure(endpoint)
+    router.record_success(endpoint, 10)
+    router.record_failure(endpoint)
+
+    assert not endpoint.stats()['ejected']
+
+
+def test_health_check_restores_and_ejects():
+    async def main():
+        app = web.Application()
+        app.router.add_post('/healthy/v1/health', lambda request: web.Response())
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            # 检查通过时恢复已摘除的副本，检查失败（404）时摘除
+            router = BackendRouter('health_test', [f'http://127.0.0.1:{port}/a', f'http://127.0.0.1:{port}/b'],
+                                   health_path='/healthy/v1/health')
+            router.eject(router.endpoints[0])
+            await router.check_health()
+            healthy = not router.endpoints[0].stats()['ejected']
+
+            router.health_path = '/missing'
+            await router.check_health()
+            ejected = all(endpoint.stats()['ejected'] for endpoint in router.endpoints)
+            return healthy, ejected
+        finally:
+            await http_clients.close()
+            await runner.cleanup()
+
+    healthy, ejected = asyncio.run(main())
+
+    assert healthy
+    assert ejected
+
+
+def test_registry_falls_back_to_client_url():
+    async def main():
+        registry = RouterRegistry()
+        registry.configure('llm', ['http://replica'])
+        async with registry.route('llm', 'http://default') as configured:
+            configured.first_byte()
+        async with registry.route('tts', 'http://default') as unconfigured:
+            unconfigured.first_byte()
+        return registry, configured.url, unconfigured.url
+
+    registry, configured, unconfigured = asyncio.run(main())
+
+    assert configured == 'http://replica'
+    assert unconfigured == 'http://default'
+    assert registry.stats()['llm'][0]['ewma_ms'] is not None
+
+
+def test_invalid_configuration_raises():
+    with pytest.raises(ValueError):
+        BackendRouter('llm', [])
+    with pytest.raises(ValueError):
+        BackendRouter('llm', ['http://a'], strategy='random')
@@ -0,0 +1,76 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'modules'))
+
+pytest.importorskip('aiohttp')
+
+from audio_processing import AudioProcessingModule
+from data_storage import DataStorageModule
+from turn_scheduler import AdmissionLimiter
+
+
+class FakeLLM:
+    """记录请求文本，立即返回一句回复。"""
+    def __init__(self):
+        self.requests = []
+
+    async def post_text(self, text, text_queue, history):
+        self.requests.append(text)
+        await text_queue.put('回复')
+        await text_queue.put(None)
+
+
+def make_module(limit: int):
+    admission = AdmissionLimiter(limit=limit)
+    module = AudioProcessingModule(asyncio.Queue(), asyncio.Queue(), DataStorageModule(), asyncio.Queue(),
+                                   speculation_stable_ms=10, admission=admission)
+    module.llm = FakeLLM()
+    module.turns.begin()
+    return module, admission
+
+
+def drain(queue):
+    items = []
+    while not queue.empty():
+        items.append(queue.get_nowait())
+    return items
+
+
+def test_queued_speculation_does_not_deadlock_turn():
+    async def main():
+        module, admission = make_module(limit=1)
+        # 本轮次持有唯一的准入名额，投机请求只能排队
+        async with admission.slot():
+            await module.on_partial(1, '你好')
+            await asyncio.sleep(0.05)
+            assert not module.speculation.admitted
+            await asyncio.wait_for(module.respond('你好', 1), timeout=1)
+        return module
+
+    module = asyncio.run(main())
+
+    assert module.llm.requests == ['你好']
+    assert [m.payload for m in drain(module.text_queue)] == ['回复', None]
+    assert module.speculation_stats.hits == 0
+    assert module.speculation_stats.misses == 1
+
+
+def test_admitted_speculation_is_committed():
+    async def main():
+        module, admission = make_module(limit=2)
+        async with admission.slot():
+            await module.on_partial(1, '你好')
+            await asyncio.sleep(0.05)
+            assert module.speculation.admitted
+            await asyncio.wait_for(module.respond('你好。', 1), timeout=1)
+        return module
+
+    module = asyncio.run(main())
+
+    assert module.llm.requests == ['你好']
+    assert [m.payload for m in drain(module.text_queue)] == ['回复', None]
+    assert module.speculation_stats.hits == 1
@@ -0,0 +1,92 @@
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'modules'))
+
+from models.LLM.sse import SSEEvent, SSEParser, iter_deltas
+
+
+def parse(chunks):
+    parser = SSEParser()
+    events = []
+    for chunk in chunks:
+        events.extend(parser.feed(chunk))
+    return events + parser.flush()
+
+
+def test_events_split_across_chunks():
+    events = parse([b'data: {"a"', b': 1}\n', b'\ndata: 2\n\n'])
+
+    assert events == [SSEEvent('message', b'{"a": 1}'), SSEEvent('message', b'2')]
+
+
+def test_crlf_line_endings():
+    events = parse([b'event: delta\r\ndata: hi\r', b'\n\r\n'])
+
+    assert events == [SSEEvent('delta', b'hi')]
+
+
+def test_comments_and_keep_alive_are_ignored():
+    events = parse([b': keep-alive\n\n', b':comment\ndata: x\n\n'])
+
+    assert events == [SSEEvent('message', b'x')]
+
+
+def test_multi_line_data_joined_with_newline():
+    events = parse([b'data: first\ndata: second\ndata:third\n\n'])
+
+    assert events == [SSEEvent('message', b'first\nsecond\nthird')]
+
+
+def test_event_type_resets_after_dispatch():
+    events = parse([b'event: a\ndata: 1\n\ndata: 2\n\n'])
+
+    assert [event.event for event in events] == ['a', 'message']
+
+
+def test_flush_returns_final_event_without_blank_line():
+    parser = SSEParser()
+
+    assert parser.feed(b'data: 1\n\ndata: last') == [SSEEvent('message', b'1')]
+    assert parser.flush() == [SSEEvent('message', b'last')]
+    assert parser.flush() == []
+
+
+class FakeContent:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def iter_any(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+class FakeResponse:
+    def __init__(self, chunks):
+        self.content = FakeContent(chunks)
+
+
+def collect_deltas(chunks):
+    async def main():
+        return [delta async for delta in iter_deltas(FakeResponse(chunks))]
+
+    return asyncio.run(main())
+
+
+def test_iter_deltas_keeps_whitespace_and_stops_at_done():
+    chunks = [
+        b'data: {"choices": [{"delta": {"content": "Hello"}}]}\n\n',
+        b'data: {"choices": [{"delta": {"content": " world"}}]}\n\n',
+        b'data: {"choices": [{"delta": {}}]}\n\n',
+        b'data: [DONE]\n\n',
+        b'data: {"choices": [{"delta": {"content": "ignored"}}]}\n\n',
+    ]
+
+    assert collect_deltas(chunks) == ['Hello', ' world']
+
+
+def test_iter_deltas_skips_malformed_json():
+    chunks = [b'data: {bad json\n\n', b'data: {"choices": [{"delta": {"content": "ok"}}]}\n\n']
+
+    assert collect_deltas(chunks) == ['ok']
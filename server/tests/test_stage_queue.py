@@ -0,0 +1,95 @@
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'modules'))
+
+from messages import Message
+from stage_queue import OverflowPolicy, StageQueue
+
+
+def drain(queue):
+    items = []
+    while not queue.empty():
+        items.append(queue.get_nowait())
+    return items
+
+
+def test_drop_oldest_keeps_newest_and_counts_drops():
+    queue = StageQueue('q', maxsize=2, policy=OverflowPolicy.DROP_OLDEST)
+    for i in range(5):
+        queue.put_nowait(i)
+
+    assert drain(queue) == [3, 4]
+    stats = queue.stats()
+    assert (stats['puts'], stats['drops'], stats['max_depth']) == (5, 3, 2)
+
+
+def test_coalesce_merges_text_messages_into_tail():
+    async def main():
+        queue = StageQueue('q', maxsize=2, policy=OverflowPolicy.COALESCE)
+        await queue.put(Message(1, 0, '你'))
+        await queue.put(Message(1, 1, '好'))
+        await queue.put(Message(1, 2, '啊'))
+        return queue
+
+    queue = asyncio.run(main())
+
+    assert [m.payload for m in drain(queue)] == ['你', '好啊']
+    stats = queue.stats()
+    assert (stats['puts'], stats['coalesced'], stats['drops']) == (3, 1, 0)
+
+
+def test_coalesce_blocks_end_marker_instead_of_dropping():
+    async def main():
+        queue = StageQueue('q', maxsize=1, policy=OverflowPolicy.COALESCE)
+        await queue.put(Message(1, 0, '你好'))
+        put = asyncio.create_task(queue.put(Message(1, 1, None, end_of_turn=True)))
+        await asyncio.sleep(0.01)
+        # 结束标志无法合并，等待空位而不是丢弃队首
+        assert not put.done()
+        first = queue.get_nowait()
+        await asyncio.wait_for(put, timeout=1)
+        return queue, first
+
+    queue, first = asyncio.run(main())
+
+    assert first.payload == '你好'
+    assert [m.end_of_turn for m in drain(queue)] == [True]
+    stats = queue.stats()
+    # 等待后入队的结束标志只计一次
+    assert (stats['puts'], stats['drops']) == (2, 0)
+
+
+def test_coalesce_put_nowait_drops_oldest_when_unmergeable():
+    queue = StageQueue('q', maxsize=1, policy=OverflowPolicy.COALESCE)
+    queue.put_nowait(Message(1, 0, '你好'))
+    queue.put_nowait(Message(1, 1, None, end_of_turn=True))
+
+    assert [m.end_of_turn for m in drain(queue)] == [True]
+    assert queue.stats()['drops'] == 1
+
+
+def test_coalesce_does_not_merge_across_turns():
+    queue = StageQueue('q', maxsize=1, policy=OverflowPolicy.COALESCE)
+    queue.put_nowait(Message(1, 0, '旧'))
+    queue.put_nowait(Message(2, 0, '新'))
+
+    assert [(m.turn_id, m.payload) for m in drain(queue)] == [(2, '新')]
+
+
+def test_block_waits_for_space():
+    async def main():
+        queue = StageQueue('q', maxsize=1, policy=OverflowPolicy.BLOCK)
+        await queue.put(1)
+        put = asyncio.create_task(queue.put(2))
+        await asyncio.sleep(0.01)
+        assert not put.done()
+        assert queue.get_nowait() == 1
+        await asyncio.wait_for(put, timeout=1)
+        return queue
+
+    queue = asyncio.run(main())
+
+    assert drain(queue) == [2]
+    assert queue.stats()['drops'] == 0
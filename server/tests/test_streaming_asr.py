@@ -0,0 +1,64 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'modules'))
+
+pytest.importorskip('aiohttp')
+
+from aiohttp import web
+from models.http_client import http_clients
+from models.ASR.stream_asr_server import create_app
+from models.ASR.streaming_asr import WebSocketASRStream
+
+SAMPLE_RATE = 16000
+# 0.1 秒的 16 位静音
+CHUNK = bytes(int(0.1 * SAMPLE_RATE) * 2)
+
+
+async def run_stream(seconds: float, cancel: bool = False):
+    """启动替身服务，送入 seconds 秒音频，返回 (最终结果, 中间结果列表, 识别会话)。"""
+    runner = web.AppRunner(create_app(partial_interval=0.5))
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    partials = []
+
+    async def on_partial(text):
+        partials.append(text)
+
+    try:
+        stream = WebSocketASRStream(f'http://127.0.0.1:{port}/asr/stream', SAMPLE_RATE, on_partial=on_partial)
+        for _ in range(round(seconds * 10)):
+            stream.feed(CHUNK)
+        if cancel:
+            await stream.cancel()
+            return None, partials, stream
+        return await stream.finish(), partials, stream
+    finally:
+        await http_clients.close()
+        await runner.cleanup()
+
+
+def test_finish_returns_final_text_and_partials():
+    text, partials, _ = asyncio.run(run_stream(2.5))
+
+    assert partials == ['<1秒语音>', '<1秒语音>', '<2秒语音>', '<2秒语音>', '<3秒语音>']
+    # 最终结果与最后一次中间结果一致，投机请求可以命中
+    assert text == partials[-1]
+
+
+def test_partials_are_deterministic():
+    first = asyncio.run(run_stream(1.5))[1]
+    second = asyncio.run(run_stream(1.5))[1]
+
+    assert first == second == ['<1秒语音>', '<1秒语音>', '<2秒语音>']
+
+
+def test_cancel_stops_background_task():
+    _, _, stream = asyncio.run(run_stream(1.0, cancel=True))
+
+    assert stream._task.done()
@@ -0,0 +1,149 @@
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'modules'))
+
+from messages import Message, TurnTracker
+from text_processing import SegmentationPolicy, SentenceSegmenter, TextProcessingModule
+
+INITIAL = ['.', '!', '?', '，', '。', '！', '~', '？', '；', ';', ',']
+SUBSEQUENT = ['.', '!', '?', '。', '！', '~', '？', '；', ';']
+BAN_LIST = ['<strong>', '</strong>', '「快乐」']
+
+
+def make_segmenter(policy=None):
+    return SentenceSegmenter(INITIAL, SUBSEQUENT, BAN_LIST, policy)
+
+
+def feed_all(segmenter, chunks):
+    segments = []
+    for chunk in chunks:
+        segments.extend(segmenter.feed(chunk))
+    return segments
+
+
+def test_policy_min_length_grows_and_is_capped():
+    policy = SegmentationPolicy(first_min_chars=4, min_chars=8, growth=2.0, max_chars=20)
+
+    assert [policy.min_length(i) for i in range(5)] == [4, 8, 16, 20, 20]
+
+
+def test_first_segment_splits_on_comma_after_min_length():
+    segmenter = make_segmenter()
+
+    # 第一个逗号前只有 2 个字符，不足 first_min_chars，不切分
+    assert segmenter.feed('你好，今天天气不错，我们') == ['你好，今天天气不错，']
+
+
+def test_later_segments_only_split_at_sentence_end():
+    segmenter = make_segmenter()
+    assert segmenter.feed('好的好的，') == ['好的好的，']
+
+    # 之后的分段不在逗号处切分，且句号前不足 min_chars 时继续累积
+    assert segmenter.feed('我想想，马上。') == []
+    assert segmenter.feed('这样可以吗？') == ['我想想，马上。这样可以吗？']
+
+
+def test_chunked_feed_matches_whole_feed():
+    text = '你好，今天天气不错，我们出去玩吧。好的，那我们先去公园看看吧！然后再去吃饭。'
+    whole = make_segmenter()
+    by_char = make_segmenter()
+
+    expected = whole.feed(text) + [whole.flush()]
+    actual = feed_all(by_char, text) + [by_char.flush()]
+
+    assert actual == expected
+    assert ''.join(actual) == text
+
+
+def test_ban_tokens_removed_across_chunks():
+    segmenter = make_segmenter()
+
+    segments = feed_all(segmenter, ['「快', '乐」你好啊<str', 'ong>朋友</STRONG>，', '再见。'])
+
+    assert segments == ['你好啊朋友，']
+    assert segmenter.flush() == '再见。'
+
+
+def test_unfinished_ban_prefix_is_kept_on_flush():
+    segmenter = make_segmenter()
+    segmenter.feed('价格<st')
+
+    # 文本末尾像禁止词前缀的部分暂存为尾巴，最终没有构成禁止词时原样输出
+    assert segmenter.flush() == '价格<st'
+
+
+def test_flush_resets_to_first_segment_policy():
+    segmenter = make_segmenter()
+    segmenter.feed('好的好的，我知道')
+    segmenter.flush()
+
+    assert segmenter.feed('好的好的，我知道了') == ['好的好的，']
+
+
+def drain(queue):
+    items = []
+    while not queue.empty():
+        items.append(queue.get_nowait())
+    return items
+
+
+def run_module(messages, policy=None, wait=0.0):
+    async def main():
+        turns = TurnTracker()
+        turns.begin()
+        text_queue, tts_queue, send_text_queue = asyncio.Queue(), asyncio.Queue(), asyncio.Queue()
+        module = TextProcessingModule(text_queue, tts_queue, send_text_queue, policy=policy, turns=turns)
+        task = asyncio.create_task(module.run())
+        for message in messages:
+            if message == 'begin':
+                turns.begin()
+                continue
+            text_queue.put_nowait(message)
+        await asyncio.sleep(wait)
+        await text_queue.join()
+        task.cancel()
+        return drain(tts_queue)
+
+    return asyncio.run(main())
+
+
+def test_end_of_turn_flushes_rest_and_ends_turn():
+    output = run_module([
+        Message(1, 0, '好的好的，今天天气'),
+        Message(1, 1, '不错'),
+        Message(1, 2, None, end_of_turn=True),
+    ])
+
+    assert [(m.turn_id, m.payload, m.end_of_turn) for m in output] == [
+        (1, '好的好的，', False),
+        (1, '今天天气不错', False),
+        (1, None, True),
+    ]
+
+
+def test_whitespace_rest_is_not_sent_to_tts():
+    output = run_module([Message(1, 0, '好的好的，'), Message(1, 1, '  '), Message(1, 2, None, end_of_turn=True)])
+
+    assert [m.payload for m in output] == ['好的好的，', None]
+
+
+def test_idle_timeout_flushes_rest():
+    policy = SegmentationPolicy(idle_timeout=0.05)
+
+    output = run_module([Message(1, 0, '好的好的，今天天气')], policy=policy, wait=0.15)
+
+    assert [m.payload for m in output] == ['好的好的，', '今天天气']
+
+
+def test_stale_turn_text_is_dropped():
+    output = run_module([
+        Message(1, 0, '你好，今天'),
+        'begin',
+        Message(1, 1, '天气。'),
+        Message(2, 0, '好的好的，'),
+        Message(2, 1, None, end_of_turn=True),
+    ])
+
+    assert [(m.turn_id, m.payload) for m in output] == [(2, '好的好的，'), (2, None)]
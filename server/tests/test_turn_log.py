@@ -0,0 +1,111 @@
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'modules'))
+
+from data_storage import AudioRef, DataStorageModule, TurnLog
+
+
+def resume(turn_log, session_id, k=16):
+    async def main():
+        history = DataStorageModule(session_id=session_id, turn_log=turn_log)
+        await history.resume(k)
+        return history
+
+    return asyncio.run(main())
+
+
+def segments(directory):
+    return sorted(path.name for path in Path(directory).glob('segment_*.log'))
+
+
+@pytest.mark.parametrize('session_id', [None, '', '../etc', 'a/b', 'x' * 65, '会话'])
+def test_invalid_session_ids(session_id):
+    assert not TurnLog.valid_session_id(session_id)
+
+
+def test_valid_session_id():
+    assert TurnLog.valid_session_id('abc_DEF-123')
+
+
+def test_resume_restores_recent_turns(tmp_path):
+    turn_log = TurnLog(tmp_path)
+    history = DataStorageModule(session_id='s1', turn_log=turn_log)
+    for i in range(5):
+        history.add_user_text(f'问题{i}')
+        history.add_assistant_text(f'回答{i}')
+    history.add_user_audio(b'\x01\x02\x03\x04')
+    DataStorageModule(session_id='s2', turn_log=turn_log).add_user_text('别的会话')
+    turn_log.close()
+
+    # 重新打开日志，模拟服务重启后重连
+    turn_log = TurnLog(tmp_path)
+    resumed = resume(turn_log, 's1', k=3)
+
+    assert [turn.content for turn in list(resumed.turns)[:2]] == ['问题4', '回答4']
+    audio = resumed.turns[-1].content
+    assert isinstance(audio, AudioRef)
+    assert asyncio.run(audio.load()) == b'\x01\x02\x03\x04'
+    # 新消息的 turn_id 接在恢复的消息之后
+    assert resumed.add_user_text('继续').turn_id == resumed.turns[-2].turn_id + 1
+    turn_log.close()
+
+
+def test_resume_unknown_session_is_empty(tmp_path):
+    turn_log = TurnLog(tmp_path)
+
+    assert len(resume(turn_log, 'missing')) == 0
+    turn_log.close()
+
+
+def test_read_sees_writes_submitted_before_it(tmp_path):
+    turn_log = TurnLog(tmp_path)
+    history = DataStorageModule(session_id='s1', turn_log=turn_log)
+    history.add_user_text('刚写入')
+
+    # 读取与写入在同一线程按顺序执行，无需等待写入完成
+    assert [turn.content for turn in resume(turn_log, 's1').turns] == ['刚写入']
+    turn_log.close()
+
+
+def test_size_retention_deletes_oldest_segments(tmp_path):
+    turn_log = TurnLog(tmp_path, segment_size=256, max_bytes=600)
+    history = DataStorageModule(session_id='s1', turn_log=turn_log)
+    for i in range(40):
+        history.add_user_text(f'第{i:02d}条消息' * 3)
+    turn_log.close()
+
+    remaining = segments(tmp_path)
+    assert 'segment_00000.log' not in remaining
+    assert sum((tmp_path / name).stat().st_size for name in remaining[:-1]) <= 600
+
+    # 已删除分段中的记录在恢复时跳过
+    turn_log = TurnLog(tmp_path, segment_size=256, max_bytes=600)
+    turns = resume(turn_log, 's1', k=40).turns
+    assert 0 < len(turns) < 40
+    assert turns[-1].content == '第39条消息' * 3
+    turn_log.close()
+
+
+def test_age_retention_deletes_old_segments_and_indexes(tmp_path):
+    turn_log = TurnLog(tmp_path, segment_size=64)
+    DataStorageModule(session_id='old', turn_log=turn_log).add_user_text('旧消息' * 10)
+    DataStorageModule(session_id='new', turn_log=turn_log).add_user_text('新消息' * 10)
+    turn_log.close()
+
+    old = time.time() - 10 * 86400
+    os.utime(tmp_path / 'segment_00000.log', (old, old))
+    os.utime(tmp_path / 'index' / 'old.idx', (old, old))
+
+    turn_log = TurnLog(tmp_path, segment_size=64, max_age_days=1)
+    try:
+        assert segments(tmp_path) == ['segment_00001.log']
+        assert not (tmp_path / 'index' / 'old.idx').exists()
+        assert [turn.content for turn in resume(turn_log, 'new').turns] == ['新消息' * 10]
+    finally:
+        turn_log.close()